@@ -4,14 +4,21 @@ from typing import List, Optional
 from uuid import UUID
 from datetime import date
 from app.core.dependencies import AuthCredentialDepend
-from app.database import get_db
-from app.appointments.schemas import AppointmentCreate, AppointmentUpdate, AppointmentResponse
-from app.appointments.services import AppointmentService
+from app.database import get_db, get_read_db
+from app.appointments.schemas import (
+    AppointmentCreate, AppointmentUpdate, AppointmentResponse, AppointmentStatusBatch, AppointmentStatusResult,
+    AppointmentSeriesCreate, AppointmentSeriesResponse, WalkInCreate, WalkInAssignment, WaitingEta,
+)
+from app.appointments.services import AppointmentService, WaitingQueueService
 from app.core.authentication import protected_route
 from app.users.models import UserRoleEnum as RoleEnum
-from app.core.response import PaginationMeta, ResponseBase, PaginatedResponse
+from app.core.response import PaginationMeta, ResponseBase, PaginatedResponse, FastJSONResponse
+from app.core.fieldsets import FieldSet, FIELDS_QUERY_DESCRIPTION
+from app.appointments.models import Appointment
+from app.core.routing import EnvelopeRoute
 
 router = APIRouter(
+    route_class=EnvelopeRoute,  # Serialize nhanh envelope ResponseBase
     prefix="/appointments",
     tags=["appointments"],
     responses={404: {"description": "Not found"}}
@@ -34,11 +41,64 @@ def create_appointment(
     db_appointment = repo.create_appointment(appointment)
     return ResponseBase(message="Lịch hẹn được tạo thành công", data=db_appointment)
 
+@router.post("/series", response_model=ResponseBase[AppointmentSeriesResponse], status_code=status.HTTP_201_CREATED)
+@protected_route([RoleEnum.ADMIN, RoleEnum.STAFF])
+def create_appointment_series(
+    CREDENTIALS: AuthCredentialDepend,
+    series: AppointmentSeriesCreate,
+    DB: Session = Depends(get_db),
+    CURRENT_USER = None,
+):
+    """
+    Tạo chuỗi lịch hẹn định kỳ (tái khám theo liệu trình), tối đa 52 lần
+    - Lặp DAILY/WEEKLY/MONTHLY mỗi `interval` đơn vị, dừng theo `count` hoặc `until`
+    - Lần hẹn trùng giờ với lịch hẹn khác của bác sĩ: bỏ qua và báo CONFLICT (allow_partial=false: 409, không tạo gì)
+    - Xem lại các lịch hẹn của chuỗi: GET /appointments/?series_id=...
+    """
+    repo = AppointmentService(DB)
+    result = repo.create_series(series, created_by=CURRENT_USER.id)
+    return ResponseBase(message="Tạo chuỗi lịch hẹn thành công", data=result)
+
+@router.post("/walk-in", response_model=ResponseBase[WalkInAssignment], status_code=status.HTTP_201_CREATED)
+@protected_route([RoleEnum.ADMIN, RoleEnum.STAFF])
+def assign_walk_in(
+    CREDENTIALS: AuthCredentialDepend,
+    walk_in: WalkInCreate,
+    DB: Session = Depends(get_db),
+    CURRENT_USER = None,
+):
+    """
+    Xếp bệnh nhân vãng lai (không hẹn trước) vào bác sĩ trống sớm nhất hôm nay
+    - Chọn bác sĩ/khung giờ có thời gian chờ ngắn nhất trong giờ làm việc; cùng giờ thì bác sĩ ít lịch hẹn hơn
+    - doctor_ids: chỉ xếp vào các bác sĩ này
+    - Lịch hẹn được tạo ở trạng thái WAITING; 409 nếu không còn khung giờ trống trong hôm nay
+    """
+    repo = AppointmentService(DB)
+    result = repo.assign_walk_in(walk_in, created_by=CURRENT_USER.id)
+    return ResponseBase(message="Xếp bệnh nhân vãng lai thành công", data=result)
+
+@router.get("/waiting", response_model=ResponseBase[List[WaitingEta]])
+def read_waiting_etas(
+    CREDENTIALS: AuthCredentialDepend,
+    doctor_id: Optional[UUID] = Query(None, description="ID bác sĩ (user_id) để lọc"),
+    DB: Session = Depends(get_db),
+    CURRENT_USER = None,
+):
+    """
+    Thời gian chờ dự kiến của các bệnh nhân đang chờ khám (WAITING) hôm nay
+    - Theo thứ tự hàng chờ của từng bác sĩ (position 0: đang khám)
+    - Ước tính từ thời gian khám trung bình của bác sĩ (cập nhật dần từ lịch sử phiên khám -> hóa đơn)
+    - Đọc từ hàng chờ trong bộ nhớ, cập nhật khi trạng thái lịch hẹn/phiên khám thay đổi: làm mới thường xuyên không tốn query
+    """
+    repo = WaitingQueueService(DB)
+    etas = repo.get_waiting_etas(doctor_id=doctor_id)
+    return ResponseBase(message="Lấy thời gian chờ dự kiến thành công", data=etas)
+
 @router.get("/{appointment_id}", response_model=ResponseBase[AppointmentResponse])
 def read_appointment(
     CREDENTIALS: AuthCredentialDepend,
     appointment_id: UUID,
-    DB: Session = Depends(get_db),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     """
@@ -58,17 +118,21 @@ def read_appointments(
     appointment_date: Optional[date] = Query(None, description="Ngày hẹn để lọc (YYYY-MM-DD)"),
     week_start: Optional[date] = Query(None, description="Ngày bắt đầu tuần để lọc (YYYY-MM-DD)"),
     month: Optional[str] = Query(None, description="Tháng để lọc (YYYY-MM)"),
+    series_id: Optional[UUID] = Query(None, description="ID chuỗi lịch hẹn định kỳ để lọc"),
     skip: int = Query(0, ge=0, description="Số bản ghi bỏ qua"),
     limit: int = Query(100, ge=1, le=100, description="Số bản ghi tối đa"),
-    DB: Session = Depends(get_db),
+    fields: Optional[str] = Query(None, description=FIELDS_QUERY_DESCRIPTION),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     """
     Lấy danh sách lịch hẹn với phân trang và bộ lọc
-    - Có thể lọc theo bác sĩ, ngày, tuần hoặc tháng
+    - Có thể lọc theo bác sĩ, ngày, tuần hoặc tháng, chuỗi lịch hẹn định kỳ
     - Bao gồm thông tin bệnh nhân và bác sĩ
+    - fields: chỉ lấy các trường cần thiết (ví dụ: id,appointment_time,status,patient.full_name)
     """
     repo = AppointmentService(DB)
+    field_set = FieldSet.parse(fields, AppointmentResponse, Appointment)
     
     # Kiểm tra nếu có nhiều hơn một bộ lọc thời gian
     time_filters = sum(1 for x in [appointment_date, week_start, month] if x is not None)
@@ -81,18 +145,58 @@ def read_appointments(
         doctor_id=doctor_id,
         appointment_date=appointment_date,
         week_start=week_start,
-        month=month
+        month=month,
+        field_set=field_set,
+        series_id=series_id,
     )
     total = repo.count_appointments(
         doctor_id=doctor_id,
         appointment_date=appointment_date,
         week_start=week_start,
-        month=month
+        month=month,
+        series_id=series_id,
     )
     page = (skip // limit) + 1
     total_pages = (total // limit) + (1 if total % limit else 0)
     meta = PaginationMeta(total=total, page=page, limit=limit, total_pages=total_pages)
-    return PaginatedResponse(message="Lấy danh sách lịch hẹn thành công", data=appointments, meta=meta)
+    response = PaginatedResponse(message="Lấy danh sách lịch hẹn thành công", data=appointments, meta=meta)
+    if field_set:  # Dữ liệu đã rút gọn theo fields -> trả thẳng, không validate theo response_model đầy đủ
+        return FastJSONResponse(response)
+    return response
+
+@router.put("/status", response_model=ResponseBase[List[AppointmentStatusResult]])
+@protected_route([RoleEnum.ADMIN, RoleEnum.STAFF])
+def update_appointment_statuses(
+    CREDENTIALS: AuthCredentialDepend,
+    batch: AppointmentStatusBatch,
+    DB: Session = Depends(get_db),
+    CURRENT_USER = None,
+):
+    """
+    Cập nhật trạng thái nhiều lịch hẹn cùng lúc (tối đa 500)
+    - Trả kết quả từng lịch hẹn: UPDATED, UNCHANGED, NOT_FOUND, INVALID_TRANSITION,
+      CONFLICT (mở lại lịch hẹn đã hủy/vắng mặt vào khung giờ bác sĩ đã có lịch hẹn khác)
+    - Lịch hẹn lỗi không ảnh hưởng các lịch hẹn còn lại
+    """
+    repo = AppointmentService(DB)
+    results = repo.update_statuses(batch.items)
+    return ResponseBase(message="Cập nhật trạng thái lịch hẹn thành công", data=results)
+
+@router.post("/{appointment_id}/check-in", response_model=ResponseBase[AppointmentStatusResult])
+@protected_route([RoleEnum.ADMIN, RoleEnum.STAFF])
+def check_in_appointment(
+    CREDENTIALS: AuthCredentialDepend,
+    appointment_id: UUID,
+    DB: Session = Depends(get_db),
+    CURRENT_USER = None,
+):
+    """
+    Check-in bệnh nhân tại quầy: lịch hẹn SCHEDULED/NO_SHOW -> WAITING
+    - 409 nếu lịch hẹn đã hoàn thành/đã hủy
+    """
+    repo = AppointmentService(DB)
+    result = repo.check_in(appointment_id)
+    return ResponseBase(message="Check-in thành công", data=result)
 
 @router.put("/{appointment_id}", response_model=ResponseBase[AppointmentResponse])
 @protected_route([RoleEnum.ADMIN, RoleEnum.STAFF])
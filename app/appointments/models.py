@@ -1,10 +1,10 @@
-from sqlalchemy import Column, String, DateTime, Enum, ForeignKey, Date, Text, Time
+from sqlalchemy import Column, String, DateTime, Enum, Float, ForeignKey, Date, Index, Integer, Text, Time
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from app.database import Base
 import enum
 import uuid
-from sqlalchemy.dialects.postgresql import UUID
+from app.core.types import UUID
 
 from app.patients.models import Patient
 
@@ -14,10 +14,34 @@ class AppointmentStatusEnum(enum.Enum):
     WAITING = "WAITING"         # Đang chờ
     COMPLETED = "COMPLETED"     # Hoàn thành
     CANCELLED = "CANCELLED"     # Hủy bỏ
+    NO_SHOW = "NO_SHOW"         # Bệnh nhân không đến (job đánh dấu lịch hẹn đã qua ngày mà vẫn SCHEDULED)
+
+# Trạng thái đang giữ khung giờ của bác sĩ (lịch hẹn hủy / không đến thì khung giờ được dùng lại)
+ACTIVE_APPOINTMENT_STATUSES = (AppointmentStatusEnum.SCHEDULED, AppointmentStatusEnum.WAITING, AppointmentStatusEnum.COMPLETED)
+# Unique index một phần: mỗi bác sĩ chỉ có một lịch hẹn còn hiệu lực ở mỗi ngày + giờ (chống đặt trùng khi nhiều lễ tân đặt cùng lúc)
+DOCTOR_SLOT_INDEX = "uq_appointments_doctor_slot"
+_ACTIVE_SLOT_WHERE = text("status IN ({})".format(", ".join(f"'{status.name}'" for status in ACTIVE_APPOINTMENT_STATUSES)))
+
+# Chuyển trạng thái hợp lệ khi cập nhật hàng loạt / check-in
+APPOINTMENT_STATUS_TRANSITIONS = {
+    AppointmentStatusEnum.SCHEDULED: {AppointmentStatusEnum.WAITING, AppointmentStatusEnum.CANCELLED, AppointmentStatusEnum.NO_SHOW},
+    AppointmentStatusEnum.WAITING: {AppointmentStatusEnum.COMPLETED, AppointmentStatusEnum.CANCELLED, AppointmentStatusEnum.SCHEDULED},
+    AppointmentStatusEnum.NO_SHOW: {AppointmentStatusEnum.WAITING, AppointmentStatusEnum.SCHEDULED, AppointmentStatusEnum.CANCELLED},
+    AppointmentStatusEnum.CANCELLED: {AppointmentStatusEnum.SCHEDULED},
+    AppointmentStatusEnum.COMPLETED: set(),
+}
 
 class Appointment(Base):
     """Model cho bảng APPOINTMENT - Quản lý lịch hẹn khám"""
     __tablename__ = "appointments"
+    __table_args__ = (
+        # Job đánh dấu NO_SHOW: lịch hẹn SCHEDULED của các ngày đã qua
+        Index("ix_appointments_status_appointment_date", "status", "appointment_date"),
+        Index(
+            DOCTOR_SLOT_INDEX, "doctor_id", "appointment_date", "appointment_time", unique=True,
+            postgresql_where=_ACTIVE_SLOT_WHERE, sqlite_where=_ACTIVE_SLOT_WHERE,
+        ),
+    )
 
     # Khóa chính
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
@@ -26,6 +50,7 @@ class Appointment(Base):
     patient_id = Column(UUID(as_uuid=True), ForeignKey("patients.id"), nullable=False)
     doctor_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    series_id = Column(UUID(as_uuid=True), index=True)                        # Chuỗi lịch hẹn định kỳ (liệu trình), NULL: lịch hẹn lẻ
     
     # Thông tin lịch hẹn - không được null
     appointment_date = Column(Date, nullable=False)                           # Ngày hẹn
@@ -43,4 +68,19 @@ class Appointment(Base):
     patient = relationship(lambda: Patient, back_populates="appointments")    
     doctor = relationship("User", foreign_keys=[doctor_id], back_populates="appointments_as_doctor")
     created_by_user = relationship("User", foreign_keys=[created_by], back_populates="appointments_created")
-    medical_records = relationship("MedicalRecord", back_populates="appointment")
\ No newline at end of file
+    medical_records = relationship("MedicalRecord", back_populates="appointment")
+
+
+class DoctorServiceStat(Base):
+    """
+    Model cho bảng DOCTOR_SERVICE_STAT - Thời gian khám trung bình của bác sĩ (EWMA), job định kỳ cập nhật dần
+    từ các hóa đơn mới: thời gian khám = hóa đơn.created_at - phiên khám.created_at
+    """
+    __tablename__ = "doctor_service_stats"
+
+    doctor_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    mean_minutes = Column(Float, nullable=False)                                # Trung bình trượt (EWMA)
+    variance = Column(Float, nullable=False, default=0)                         # Phương sai trượt (phút^2)
+    samples = Column(Integer, nullable=False, default=0)                        # Số lượt khám đã tính
+    last_invoice_at = Column(DateTime(timezone=True), nullable=False)           # Hóa đơn cuối cùng đã tính
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
@@ -0,0 +1,150 @@
+"""
+Lịch trong ngày của từng bác sĩ (giờ của các lịch hẹn còn hiệu lực), giữ trong bộ nhớ process để xếp bệnh nhân vãng lai.
+
+Xếp một bệnh nhân vãng lai không query lại cả ngày của mọi bác sĩ mỗi request:
+- Lịch của (bác sĩ, ngày) được load một lần (một query cho mọi bác sĩ chưa có trong cache) và hết hạn sau
+  WALK_IN_SCHEDULE_TTL_SECONDS để nhận thay đổi của worker/instance khác
+- Lịch hẹn tạo/sửa trong process được ghi vào session.info, SAU KHI commit thì bỏ lịch (bác sĩ, ngày) đó khỏi cache
+- Khung giờ được chọn được đánh dấu ngay trong cache (dưới lock) nên hai request cùng lúc trong process không chọn trùng;
+  giữa các worker, unique index uq_appointments_doctor_slot chặn trùng và request đến sau chọn khung giờ khác
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date
+from datetime import time as dt_time
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.appointments.models import ACTIVE_APPOINTMENT_STATUSES, Appointment
+from app.appointments.validators import WORKING_WINDOWS
+from app.core.config import settings
+
+_PENDING_KEY = "doctor_schedule_changes"
+
+
+def to_minutes(value: dt_time) -> int:
+    """Giờ -> số phút từ 0h"""
+    return value.hour * 60 + value.minute
+
+
+def from_minutes(minutes: int) -> dt_time:
+    return dt_time(minutes // 60, minutes % 60)
+
+
+_WINDOWS = [(to_minutes(start), to_minutes(end)) for start, end in WORKING_WINDOWS]
+
+
+@dataclass
+class DaySchedule:
+    """Giờ bắt đầu (phút từ 0h) của các lịch hẹn còn hiệu lực của một bác sĩ trong một ngày, đã sắp xếp"""
+    booked: List[int]
+    expires_at: float
+
+    def next_free(self, earliest: int, slot: int) -> Optional[int]:
+        """Giờ sớm nhất từ `earliest` còn trống đủ một lượt khám (kết thúc trong giờ làm việc), None nếu hết chỗ"""
+        for start, end in _WINDOWS:
+            candidate = max(start, earliest)
+            while candidate + slot <= end:
+                # Lịch hẹn b trùng với lượt khám [candidate, candidate + slot) khi |b - candidate| < slot;
+                # nhảy tới sau lịch hẹn trùng muộn nhất
+                i = bisect_left(self.booked, candidate + slot)
+                if i and self.booked[i - 1] > candidate - slot:
+                    candidate = self.booked[i - 1] + slot
+                else:
+                    return candidate
+        return None
+
+
+class DoctorDaySchedules:
+    """(doctor_id, ngày) -> DaySchedule"""
+
+    def __init__(self):
+        self._schedules: Dict[Tuple[UUID, date], DaySchedule] = {}
+        self._lock = threading.Lock()
+
+    def load(self, db: Session, doctor_ids: Iterable[UUID], day: date) -> Dict[UUID, DaySchedule]:
+        """Lịch trong ngày của các bác sĩ; chỉ query những bác sĩ chưa có trong cache hoặc đã hết hạn (một query)"""
+        now = time.monotonic()
+        schedules: Dict[UUID, DaySchedule] = {}
+        with self._lock:
+            for doctor_id in doctor_ids:
+                schedule = self._schedules.get((doctor_id, day))
+                if schedule is not None and schedule.expires_at > now:
+                    schedules[doctor_id] = schedule
+        missing = [doctor_id for doctor_id in doctor_ids if doctor_id not in schedules]
+        if not missing:
+            return schedules
+
+        booked = defaultdict(list)
+        for doctor_id, appointment_time in db.execute(
+            select(Appointment.doctor_id, Appointment.appointment_time).where(
+                Appointment.doctor_id.in_(missing),
+                Appointment.appointment_date == day,
+                Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES),
+                Appointment.appointment_time.is_not(None),
+            )
+        ):
+            booked[doctor_id].append(to_minutes(appointment_time))
+        expires_at = now + settings.walk_in_schedule_ttl_seconds
+        with self._lock:
+            for doctor_id in missing:
+                schedule = DaySchedule(sorted(booked[doctor_id]), expires_at)
+                self._schedules[(doctor_id, day)] = schedules[doctor_id] = schedule
+        return schedules
+
+    def assign(self, schedules: Dict[UUID, DaySchedule], earliest: int, slot: int) -> Optional[Tuple[UUID, int]]:
+        """
+        Chọn bác sĩ có khung giờ trống sớm nhất (heap theo giờ trống sớm nhất của từng bác sĩ; cùng giờ thì bác sĩ
+        ít lịch hẹn hơn trong ngày) và đánh dấu khung giờ đó đã đặt. Trả về (doctor_id, phút), None nếu không còn chỗ.
+        """
+        with self._lock:
+            heap = []
+            for doctor_id, schedule in schedules.items():
+                start = schedule.next_free(earliest, slot)
+                if start is not None:
+                    heap.append((start, len(schedule.booked), str(doctor_id), doctor_id))
+            if not heap:
+                return None
+            heapq.heapify(heap)
+            start, _, _, doctor_id = heapq.heappop(heap)
+            insort(schedules[doctor_id].booked, start)
+            return doctor_id, start
+
+    def release(self, schedule: DaySchedule, start: int) -> None:
+        """Bỏ đánh dấu khi không tạo được lịch hẹn"""
+        with self._lock:
+            i = bisect_left(schedule.booked, start)
+            if i < len(schedule.booked) and schedule.booked[i] == start:
+                del schedule.booked[i]
+
+    def invalidate(self, keys: Iterable[Tuple[UUID, date]]) -> None:
+        with self._lock:
+            for key in keys:
+                self._schedules.pop(key, None)
+
+
+doctor_schedules = DoctorDaySchedules()
+
+
+def track_schedule_change(db: Session, doctor_id: UUID, day: date) -> None:
+    """Ghi nhận lịch hẹn của (bác sĩ, ngày) thay đổi trong transaction hiện tại (bỏ khỏi cache khi commit)"""
+    db.info.setdefault(_PENDING_KEY, set()).add((doctor_id, day))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        doctor_schedules.invalidate(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
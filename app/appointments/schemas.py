@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, field_validator, model_validator
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime, date, time
 from uuid import UUID
 import enum
@@ -14,7 +14,7 @@ from app.appointments.validators import (
 )
 
 # Import các response từ schemas khác
-from app.patients.schemas import PatientForeignKeyResponse
+from app.patients.schemas import PatientSummary
 from app.users.schemas import UserForeignKeyResponse
 
 class BaseSchema(BaseModel):
@@ -96,6 +96,137 @@ class AppointmentResponse(BaseSchema):
     notes: Optional[str]
     created_at: datetime
     created_by: UUID
-    patient: Optional[PatientForeignKeyResponse] = None    # Thông tin bệnh nhân
+    series_id: Optional[UUID] = None                       # Chuỗi lịch hẹn định kỳ (nếu có)
+    patient: Optional[PatientSummary] = None               # Thông tin bệnh nhân (bản gọn)
     doctor: Optional[UserForeignKeyResponse] = None        # Thông tin bác sĩ
     # created_by: Optional[UserResponse] = None # Thông tin người tạo lịch hẹn
+
+
+# ================================ BULK STATUS SCHEMAS ================================
+class AppointmentStatusResultEnum(str, enum.Enum):
+    """Kết quả cập nhật trạng thái của từng lịch hẹn"""
+    UPDATED = "UPDATED"                         # Đã cập nhật
+    UNCHANGED = "UNCHANGED"                     # Đã ở trạng thái yêu cầu
+    NOT_FOUND = "NOT_FOUND"                     # Lịch hẹn không tồn tại
+    INVALID_TRANSITION = "INVALID_TRANSITION"   # Không được chuyển từ trạng thái hiện tại
+    CONFLICT = "CONFLICT"                       # Mở lại lịch hẹn vào khung giờ bác sĩ đã có lịch hẹn khác
+
+class AppointmentStatusItem(BaseSchema):
+    """Một cặp (lịch hẹn, trạng thái mới)"""
+    appointment_id: UUID
+    status: AppointmentStatusEnum
+
+class AppointmentStatusBatch(BaseSchema):
+    """Schema cập nhật trạng thái nhiều lịch hẹn"""
+    items: List[AppointmentStatusItem] = Field(min_length=1, max_length=500)
+
+    @field_validator("items")
+    @classmethod
+    def check_unique(cls, value):
+        """Mỗi lịch hẹn chỉ xuất hiện một lần trong request"""
+        ids = [item.appointment_id for item in value]
+        if len(ids) != len(set(ids)):
+            raise ValueError("Mỗi lịch hẹn chỉ được xuất hiện một lần")
+        return value
+
+class AppointmentStatusResult(BaseSchema):
+    """Kết quả cập nhật trạng thái một lịch hẹn"""
+    appointment_id: UUID
+    result: AppointmentStatusResultEnum
+    status: Optional[AppointmentStatusEnum] = None      # Trạng thái hiện tại sau khi xử lý
+    previous_status: Optional[AppointmentStatusEnum] = None
+
+
+# ================================ SERIES SCHEMAS ================================
+MAX_SERIES_OCCURRENCES = 52
+
+class AppointmentFrequencyEnum(str, enum.Enum):
+    """Tần suất lặp của chuỗi lịch hẹn"""
+    DAILY = "DAILY"
+    WEEKLY = "WEEKLY"
+    MONTHLY = "MONTHLY"
+
+class AppointmentOccurrenceResultEnum(str, enum.Enum):
+    """Kết quả tạo một lịch hẹn trong chuỗi"""
+    CREATED = "CREATED"         # Đã tạo
+    CONFLICT = "CONFLICT"       # Bác sĩ đã có lịch hẹn cùng giờ, không tạo
+
+class AppointmentSeriesCreate(BaseSchema):
+    """Schema tạo chuỗi lịch hẹn định kỳ (ví dụ tái khám hàng tuần theo liệu trình)"""
+    patient_id: UUID
+    doctor_id: UUID
+    start_date: date                        # Ngày của lần hẹn đầu tiên
+    appointment_time: time                  # Giờ hẹn (giống nhau cho mọi lần)
+    time_slot: str = Field(max_length=100, default="30 phút")
+    notes: Optional[str] = Field(max_length=250, default=None)
+    frequency: AppointmentFrequencyEnum = AppointmentFrequencyEnum.WEEKLY
+    interval: int = Field(default=1, ge=1, le=12)           # Lặp mỗi `interval` ngày/tuần/tháng
+    count: Optional[int] = Field(default=None, ge=1, le=MAX_SERIES_OCCURRENCES)    # Số lần hẹn
+    until: Optional[date] = Field(default=None, validate_default=True)   # Hoặc: lặp đến hết ngày này
+    allow_partial: bool = True              # True: bỏ qua các lần bị trùng lịch; False: trùng một lần là không tạo gì (409)
+
+    @field_validator("start_date")
+    @classmethod
+    def check_start_date(cls, value):
+        """Validate ngày hẹn đầu tiên"""
+        return validate_appointment_date(value)
+
+    @field_validator("appointment_time")
+    @classmethod
+    def check_appointment_time(cls, value):
+        """Validate giờ hẹn"""
+        return validate_appointment_time(value)
+
+    @field_validator("until")
+    @classmethod
+    def check_until(cls, value, info):
+        """Phải có đúng một trong count / until, until không trước start_date"""
+        start_date = info.data.get("start_date")
+        if value is not None and start_date is not None and value < start_date:
+            raise ValueError("Ngày kết thúc phải từ ngày bắt đầu trở đi")
+        if (value is None) == (info.data.get("count") is None):
+            raise ValueError("Cần cung cấp đúng một trong hai: count hoặc until")
+        return value
+
+class AppointmentOccurrence(BaseSchema):
+    """Một lần hẹn trong chuỗi"""
+    appointment_date: date
+    appointment_time: time
+    result: AppointmentOccurrenceResultEnum
+    appointment_id: Optional[UUID] = None   # Có khi result = CREATED
+
+class AppointmentSeriesResponse(BaseSchema):
+    """Kết quả tạo chuỗi lịch hẹn"""
+    series_id: UUID
+    created: int                            # Số lịch hẹn đã tạo
+    conflicts: int                          # Số lần bị trùng lịch bác sĩ
+    occurrences: List[AppointmentOccurrence]
+
+
+
+# ================================ WALK-IN SCHEMAS ================================
+class WalkInCreate(BaseSchema):
+    """Schema xếp bệnh nhân vãng lai (không hẹn trước) vào bác sĩ trống sớm nhất trong hôm nay"""
+    patient_id: UUID
+    doctor_ids: Optional[List[UUID]] = Field(default=None, min_length=1, max_length=50)   # Chỉ xếp vào các bác sĩ này (mặc định: mọi bác sĩ)
+    notes: Optional[str] = Field(max_length=250, default=None)
+
+class WalkInAssignment(BaseSchema):
+    """Kết quả xếp bệnh nhân vãng lai"""
+    appointment: AppointmentResponse
+    expected_wait_minutes: int              # Thời gian chờ dự kiến đến giờ khám được xếp
+
+
+# ================================ WAITING QUEUE SCHEMAS ================================
+class WaitingEta(BaseSchema):
+    """Thời gian chờ dự kiến của một bệnh nhân đang chờ khám"""
+    appointment_id: UUID
+    patient_id: UUID
+    doctor_id: UUID
+    appointment_time: Optional[time] = None
+    position: int                           # Thứ tự trong hàng chờ của bác sĩ (0: đang khám)
+    in_service: bool                        # Đang được khám
+    estimated_start: datetime               # Giờ bắt đầu khám dự kiến
+    eta_minutes: int                        # Số phút chờ dự kiến
+    eta_max_minutes: int                    # Số phút chờ nếu mỗi lượt khám trước mất mean + stddev
+    service_minutes: float                  # Thời gian khám trung bình của bác sĩ
@@ -1,21 +1,96 @@
+import calendar
+import uuid
+from contextlib import contextmanager
+from functools import cached_property
+from types import SimpleNamespace
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from typing import List, Optional
+from sqlalchemy import and_, bindparam, case, insert, literal, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional, Set, Tuple
 from uuid import UUID
-from datetime import datetime, date, timedelta
+from datetime import datetime, date, time, timedelta, timezone
 from fastapi import HTTPException
-from app.appointments.models import Appointment, AppointmentStatusEnum
-from app.appointments.schemas import AppointmentCreate, AppointmentUpdate, AppointmentResponse
+from app.appointments.models import (
+    ACTIVE_APPOINTMENT_STATUSES, APPOINTMENT_STATUS_TRANSITIONS, DOCTOR_SLOT_INDEX, Appointment, AppointmentStatusEnum,
+    DoctorServiceStat,
+)
+from app.appointments.schemas import (
+    AppointmentCreate, AppointmentUpdate, AppointmentResponse,
+    AppointmentStatusItem, AppointmentStatusResult, AppointmentStatusResultEnum,
+    MAX_SERIES_OCCURRENCES, AppointmentFrequencyEnum, AppointmentOccurrence, AppointmentOccurrenceResultEnum,
+    AppointmentSeriesCreate, AppointmentSeriesResponse, WalkInCreate, WalkInAssignment, WaitingEta,
+)
+from app.appointments.schedules import doctor_schedules, from_minutes, track_schedule_change
+from app.appointments.waiting import estimate_starts, track_queue_change, waiting_board
+from app.utils.helper import clinic_timezone, to_clinic_date
+from app.core.config import settings
+from app.database import SessionLocal
 from app.users.services import UserService
 from app.patients.services import PatientService
-from app.users.models import UserRoleEnum
+from app.users.models import User, UserRoleEnum
+from app.core.fieldsets import FieldSet
+from app.invoices.models import Invoice
+from app.medical_records.models import MedicalRecord
+from app.realtime.events import emit_appointment
+
+# Số lần chọn lại khung giờ khi worker khác vừa đặt mất khung giờ được chọn
+WALK_IN_MAX_ATTEMPTS = 3
+
+# Lượt khám ngoài khoảng này (ví dụ hóa đơn lập hôm sau) không tính vào thời gian khám trung bình
+MIN_SERVICE_MINUTES = 1
+MAX_SERVICE_MINUTES = 240
+# Lần cập nhật đầu tiên của bác sĩ chỉ tính hóa đơn gần đây (EWMA gần như không còn trọng số của dữ liệu cũ)
+SERVICE_STATS_INITIAL_WINDOW = timedelta(days=30)
+
+# SQLite không trả tên index trong lỗi UNIQUE, chỉ liệt kê các cột
+_DOCTOR_SLOT_COLUMNS = "appointments.doctor_id, appointments.appointment_date, appointments.appointment_time"
+
+
+def _is_double_booking(error: IntegrityError) -> bool:
+    """Lỗi do vi phạm unique index khung giờ bác sĩ (không phải lỗi khóa ngoại, ...)"""
+    diag = getattr(error.orig, "diag", None)  # psycopg2
+    if diag is not None and getattr(diag, "constraint_name", None):
+        return diag.constraint_name == DOCTOR_SLOT_INDEX
+    message = str(error.orig)
+    return DOCTOR_SLOT_INDEX in message or _DOCTOR_SLOT_COLUMNS in message
+
+
+def _reopens_slot(row, new_status: AppointmentStatusEnum) -> bool:
+    """Lịch hẹn đã hủy / vắng mặt được mở lại -> chiếm lại khung giờ của bác sĩ (unique index uq_appointments_doctor_slot)"""
+    return (
+        row.appointment_time is not None
+        and row.status not in ACTIVE_APPOINTMENT_STATUSES
+        and new_status in ACTIVE_APPOINTMENT_STATUSES
+    )
+
 
 class AppointmentService:
     """Service class để xử lý logic liên quan đến Appointment"""
     def __init__(self, db: Session):
         self.db = db
-        self.user_service = UserService(db)
-        self.patient_service = PatientService(db)
+
+    # Service phụ khởi tạo khi dùng lần đầu: endpoint chỉ tạo những gì nó cần
+    @cached_property
+    def user_service(self) -> UserService:
+        return UserService(self.db)
+
+    @cached_property
+    def patient_service(self) -> PatientService:
+        return PatientService(self.db)
+
+    @contextmanager
+    def _booking(self):
+        """
+        Bọc các thao tác ghi lịch hẹn: trùng khung giờ bác sĩ do database chặn (unique index một phần),
+        không cần khóa ở tầng ứng dụng - request đến sau nhận 409
+        """
+        try:
+            yield
+        except IntegrityError as e:
+            self.db.rollback()
+            if _is_double_booking(e):
+                raise HTTPException(status_code=409, detail="Bác sĩ đã có lịch hẹn vào ngày giờ này")
+            raise
 
     def create_appointment(self, appointment_in: AppointmentCreate) -> AppointmentResponse:
         """Tạo lịch hẹn mới"""
@@ -24,15 +99,18 @@ class AppointmentService:
         if not patient:
             raise HTTPException(status_code=404, detail="Bệnh nhân không tồn tại")
 
+        # Lấy bác sĩ và người tạo trong một query
+        users = self.user_service.get_users_by_ids([appointment_in.doctor_id, appointment_in.created_by])
+
         # Kiểm tra xem doctor_id (user_id của bác sĩ) có tồn tại và có vai trò DOCTOR
-        doctor = self.user_service.get_user_by_id(appointment_in.doctor_id)
+        doctor = users.get(appointment_in.doctor_id)
         if not doctor:
             raise HTTPException(status_code=404, detail="Bác sĩ không tồn tại")
         if doctor.role != UserRoleEnum.DOCTOR:
             raise HTTPException(status_code=400, detail="User không phải là bác sĩ: "+str(doctor.role))
 
         # Kiểm tra xem created_by (user_id của người tạo) có tồn tại
-        created_by_user = self.user_service.get_user_by_id(appointment_in.created_by)
+        created_by_user = users.get(appointment_in.created_by)
         if not created_by_user:
             raise HTTPException(status_code=404, detail="Nhân viên không tồn tại")
 
@@ -50,7 +128,12 @@ class AppointmentService:
 
         # Thêm vào database
         self.db.add(db_appointment)
-        self.db.commit()
+        with self._booking():
+            self.db.flush()  # Lấy id cho event realtime
+            emit_appointment(self.db, db_appointment, "created")
+            track_schedule_change(self.db, db_appointment.doctor_id, db_appointment.appointment_date)
+            track_queue_change(self.db, db_appointment.doctor_id)
+            self.db.commit()
         self.db.refresh(db_appointment)
 
         # Tạo response với thông tin liên quan
@@ -65,6 +148,7 @@ class AppointmentService:
             status=db_appointment.status,
             notes=db_appointment.notes,
             created_at=db_appointment.created_at,
+            series_id=db_appointment.series_id,
             patient=patient,
             doctor=doctor
         )
@@ -90,6 +174,7 @@ class AppointmentService:
             status=db_appointment.status,
             notes=db_appointment.notes,
             created_at=db_appointment.created_at,
+            series_id=db_appointment.series_id,
             patient=patient,
             doctor=doctor
         )
@@ -101,9 +186,14 @@ class AppointmentService:
         week_start: Optional[date] = None,
         month: Optional[str] = None,
         skip: int = 0,
-        limit: int = 10
+        limit: int = 10,
+        field_set: Optional[FieldSet] = None,
+        series_id: Optional[UUID] = None,
     ) -> List[AppointmentResponse]:
-        """Lấy danh sách lịch hẹn với phân trang và các bộ lọc"""
+        """
+        Lấy danh sách lịch hẹn với phân trang và các bộ lọc
+        - Nếu có field_set: trả về list dict chỉ gồm các trường được chọn
+        """
         query = self.db.query(Appointment)
 
         # Lọc theo bác sĩ
@@ -115,6 +205,10 @@ class AppointmentService:
             #     raise HTTPException(status_code=400, detail="User không phải là bác sĩ")
             query = query.filter(Appointment.doctor_id == doctor_id)
 
+        # Lọc theo chuỗi lịch hẹn định kỳ
+        if series_id:
+            query = query.filter(Appointment.series_id == series_id)
+
         # Lọc theo ngày
         if appointment_date:
             query = query.filter(Appointment.appointment_date == appointment_date)
@@ -138,11 +232,18 @@ class AppointmentService:
                 raise HTTPException(status_code=400, detail="Định dạng tháng không hợp lệ, sử dụng YYYY-MM")
 
         # Áp dụng phân trang
+        if field_set:
+            # Sparse fieldset: chỉ SELECT các cột được chọn, object lồng lấy bằng JOIN
+            rows = query.options(*field_set.load_options()).offset(skip).limit(limit).all()
+            return field_set.project_all(rows)
         appointments = query.offset(skip).limit(limit).all()
+        # Lấy bệnh nhân/bác sĩ của cả trang bằng 2 query thay vì 2 query mỗi dòng
+        patients = self.patient_service.get_patients_by_ids(a.patient_id for a in appointments)
+        doctors = self.user_service.get_users_by_ids(a.doctor_id for a in appointments)
         result = []
         for appointment in appointments:
-            patient = self.patient_service.get_patient_by_id(appointment.patient_id)
-            doctor = self.user_service.get_user_by_id(appointment.doctor_id)
+            patient = patients.get(appointment.patient_id)
+            doctor = doctors.get(appointment.doctor_id)
             result.append(AppointmentResponse(
                 id=appointment.id,
                 patient_id=appointment.patient_id,
@@ -154,6 +255,7 @@ class AppointmentService:
                 status=appointment.status,
                 notes=appointment.notes,
                 created_at=appointment.created_at,
+                series_id=appointment.series_id,
                 patient=patient,
                 doctor=doctor
             ))
@@ -164,7 +266,8 @@ class AppointmentService:
         doctor_id: Optional[UUID] = None,
         appointment_date: Optional[date] = None,
         week_start: Optional[date] = None,
-        month: Optional[str] = None
+        month: Optional[str] = None,
+        series_id: Optional[UUID] = None,
     ) -> int:
         """Đếm tổng số lịch hẹn với các bộ lọc"""
         query = self.db.query(Appointment)
@@ -173,6 +276,10 @@ class AppointmentService:
         if doctor_id:
             query = query.filter(Appointment.doctor_id == doctor_id)
 
+        # Lọc theo chuỗi lịch hẹn định kỳ
+        if series_id:
+            query = query.filter(Appointment.series_id == series_id)
+
         # Lọc theo ngày
         if appointment_date:
             query = query.filter(Appointment.appointment_date == appointment_date)
@@ -202,11 +309,17 @@ class AppointmentService:
             return None
 
         # Cập nhật các trường được cung cấp
+        track_schedule_change(self.db, db_appointment.doctor_id, db_appointment.appointment_date)
+        track_queue_change(self.db, db_appointment.doctor_id)
         update_data = appointment_update.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_appointment, field, value)
+        emit_appointment(self.db, db_appointment)
+        track_schedule_change(self.db, db_appointment.doctor_id, db_appointment.appointment_date)
+        track_queue_change(self.db, db_appointment.doctor_id)
 
-        self.db.commit()
+        with self._booking():
+            self.db.commit()
         self.db.refresh(db_appointment)
 
         # Lấy thông tin bệnh nhân và bác sĩ
@@ -224,10 +337,299 @@ class AppointmentService:
             status=db_appointment.status,
             notes=db_appointment.notes,
             created_at=db_appointment.created_at,
+            series_id=db_appointment.series_id,
             patient=patient,
             doctor=doctor
         )
 
+    @staticmethod
+    def _series_dates(series_in: AppointmentSeriesCreate) -> List[date]:
+        """Ngày của các lần hẹn theo quy tắc lặp (mỗi lần tính từ start_date để tháng ngắn không làm lệch các lần sau)"""
+        dates: List[date] = []
+        while series_in.count is None or len(dates) < series_in.count:
+            step = len(dates) * series_in.interval
+            if series_in.frequency == AppointmentFrequencyEnum.DAILY:
+                occurrence = series_in.start_date + timedelta(days=step)
+            elif series_in.frequency == AppointmentFrequencyEnum.WEEKLY:
+                occurrence = series_in.start_date + timedelta(weeks=step)
+            else:
+                month_index = series_in.start_date.month - 1 + step
+                year, month = series_in.start_date.year + month_index // 12, month_index % 12 + 1
+                day = min(series_in.start_date.day, calendar.monthrange(year, month)[1])
+                occurrence = date(year, month, day)
+            if series_in.until is not None and occurrence > series_in.until:
+                break
+            if len(dates) == MAX_SERIES_OCCURRENCES:
+                raise HTTPException(status_code=400, detail=f"Chuỗi lịch hẹn tối đa {MAX_SERIES_OCCURRENCES} lần")
+            dates.append(occurrence)
+        return dates
+
+    def create_series(self, series_in: AppointmentSeriesCreate, created_by: UUID) -> AppointmentSeriesResponse:
+        """
+        Tạo chuỗi lịch hẹn định kỳ:
+        - Kiểm tra trùng lịch bác sĩ cho mọi lần hẹn bằng MỘT query
+        - Insert tất cả lần hẹn không trùng bằng một câu lệnh (executemany), báo kết quả từng lần
+        """
+        if not self.patient_service.get_patient_by_id(series_in.patient_id):
+            raise HTTPException(status_code=404, detail="Bệnh nhân không tồn tại")
+        doctor = self.user_service.get_user_by_id(series_in.doctor_id)
+        if not doctor:
+            raise HTTPException(status_code=404, detail="Bác sĩ không tồn tại")
+        if doctor.role != UserRoleEnum.DOCTOR:
+            raise HTTPException(status_code=400, detail="User không phải là bác sĩ: "+str(doctor.role))
+
+        dates = self._series_dates(series_in)
+        taken = set(self.db.scalars(
+            select(Appointment.appointment_date).where(
+                Appointment.doctor_id == series_in.doctor_id,
+                Appointment.appointment_time == series_in.appointment_time,
+                Appointment.appointment_date.in_(dates),
+                Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES),
+            )
+        ))
+        if taken and not series_in.allow_partial:
+            conflict_dates = ", ".join(str(day) for day in sorted(taken))
+            raise HTTPException(status_code=409, detail=f"Bác sĩ đã có lịch hẹn cùng giờ vào các ngày: {conflict_dates}")
+
+        series_id = uuid.uuid4()
+        rows = [
+            {
+                "id": uuid.uuid4(),
+                "patient_id": series_in.patient_id,
+                "doctor_id": series_in.doctor_id,
+                "created_by": created_by,
+                "series_id": series_id,
+                "appointment_date": day,
+                "appointment_time": series_in.appointment_time,
+                "time_slot": series_in.time_slot,
+                "status": AppointmentStatusEnum.SCHEDULED,
+                "notes": series_in.notes,
+            }
+            for day in dates if day not in taken
+        ]
+        if rows:
+            with self._booking():  # Lịch khác vừa được đặt vào một khung giờ sau lúc kiểm tra -> 409, không tạo gì
+                self.db.execute(insert(Appointment), rows)
+                for row in rows:
+                    emit_appointment(self.db, SimpleNamespace(**row), "created")
+                    track_schedule_change(self.db, row["doctor_id"], row["appointment_date"])
+                self.db.commit()
+
+        created = {row["appointment_date"]: row["id"] for row in rows}
+        occurrences = [
+            AppointmentOccurrence(
+                appointment_date=day,
+                appointment_time=series_in.appointment_time,
+                result=AppointmentOccurrenceResultEnum.CONFLICT if day in taken else AppointmentOccurrenceResultEnum.CREATED,
+                appointment_id=created.get(day),
+            )
+            for day in dates
+        ]
+        return AppointmentSeriesResponse(
+            series_id=series_id, created=len(rows), conflicts=len(dates) - len(rows), occurrences=occurrences,
+        )
+
+    def update_statuses(self, items: List[AppointmentStatusItem]) -> List[AppointmentStatusResult]:
+        """
+        Cập nhật trạng thái nhiều lịch hẹn: một SELECT ... FOR UPDATE + một UPDATE (CASE theo id).
+        Trả kết quả từng lịch hẹn theo thứ tự request; lịch hẹn không tồn tại / chuyển trạng thái không hợp lệ /
+        mở lại (CANCELLED, NO_SHOW -> SCHEDULED, WAITING) vào khung giờ bác sĩ đã có lịch hẹn khác (CONFLICT)
+        không ảnh hưởng các lịch hẹn còn lại.
+        """
+        requested = {item.appointment_id: AppointmentStatusEnum(item.status) for item in items}
+        rows = {
+            row.id: row
+            for row in self.db.execute(
+                select(
+                    Appointment.id, Appointment.status, Appointment.patient_id, Appointment.doctor_id,
+                    Appointment.appointment_date, Appointment.appointment_time, Appointment.time_slot,
+                )
+                .where(Appointment.id.in_(list(requested)))
+                .order_by(Appointment.id)  # Khóa theo thứ tự cố định tránh deadlock
+                .with_for_update()
+            )
+        }
+
+        reopening = [
+            row for appointment_id, row in rows.items()
+            if _reopens_slot(row, requested[appointment_id])
+        ]
+        taken = self._taken_slots(reopening) if reopening else set()
+
+        results: List[AppointmentStatusResult] = []
+        changes = {}
+        for appointment_id, new_status in requested.items():
+            row = rows.get(appointment_id)
+            if row is None:
+                result = AppointmentStatusResultEnum.NOT_FOUND
+            elif row.status == new_status:
+                result = AppointmentStatusResultEnum.UNCHANGED
+            elif new_status not in APPOINTMENT_STATUS_TRANSITIONS[row.status]:
+                result = AppointmentStatusResultEnum.INVALID_TRANSITION
+            elif _reopens_slot(row, new_status) and (row.doctor_id, row.appointment_date, row.appointment_time) in taken:
+                result = AppointmentStatusResultEnum.CONFLICT
+            else:
+                if _reopens_slot(row, new_status):
+                    taken.add((row.doctor_id, row.appointment_date, row.appointment_time))  # Hai lịch hẹn trong lô cùng khung giờ
+                result = AppointmentStatusResultEnum.UPDATED
+                changes[appointment_id] = new_status
+            results.append(AppointmentStatusResult(
+                appointment_id=appointment_id,
+                result=result,
+                status=new_status if result == AppointmentStatusResultEnum.UPDATED else (row.status if row else None),
+                previous_status=row.status if row else None,
+            ))
+
+        with self._booking():  # Lịch hẹn khác vừa được đặt vào khung giờ sau lúc kiểm tra -> 409, không cập nhật gì
+            if changes:
+                status_type = Appointment.__table__.c.status.type
+                self.db.execute(
+                    update(Appointment)
+                    .where(Appointment.id.in_(list(changes)))
+                    .values(status=case(
+                        {appointment_id: literal(new_status, status_type) for appointment_id, new_status in changes.items()},
+                        value=Appointment.id,
+                    ))
+                    .execution_options(synchronize_session=False)
+                )
+                for appointment_id, new_status in changes.items():
+                    emit_appointment(self.db, rows[appointment_id], status=new_status)
+                    track_schedule_change(self.db, rows[appointment_id].doctor_id, rows[appointment_id].appointment_date)
+                    track_queue_change(self.db, rows[appointment_id].doctor_id)
+            self.db.commit()
+        return results
+
+    def _taken_slots(self, rows) -> Set[Tuple[UUID, date, time]]:
+        """Khung giờ (bác sĩ, ngày, giờ) của các lịch hẹn sắp mở lại đã có lịch hẹn còn hiệu lực khác, một query"""
+        slots = {(row.doctor_id, row.appointment_date, row.appointment_time) for row in rows}
+        return {
+            slot
+            for slot in self.db.execute(
+                select(Appointment.doctor_id, Appointment.appointment_date, Appointment.appointment_time).where(
+                    Appointment.doctor_id.in_({doctor_id for doctor_id, _, _ in slots}),
+                    Appointment.appointment_date.in_({day for _, day, _ in slots}),
+                    Appointment.appointment_time.in_({at for _, _, at in slots}),
+                    Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES),
+                )
+            ).tuples()
+            if slot in slots
+        }
+
+    def check_in(self, appointment_id: UUID) -> AppointmentStatusResult:
+        """Bệnh nhân đến quầy lễ tân: lịch hẹn -> WAITING"""
+        item = AppointmentStatusItem(appointment_id=appointment_id, status=AppointmentStatusEnum.WAITING)
+        result = self.update_statuses([item])[0]
+        if result.result == AppointmentStatusResultEnum.NOT_FOUND:
+            raise HTTPException(status_code=404, detail="Lịch hẹn không tồn tại")
+        if result.result == AppointmentStatusResultEnum.INVALID_TRANSITION:
+            raise HTTPException(status_code=409, detail=f"Không thể check-in lịch hẹn ở trạng thái {result.status}")
+        if result.result == AppointmentStatusResultEnum.CONFLICT:
+            raise HTTPException(status_code=409, detail="Bác sĩ đã có lịch hẹn vào ngày giờ này")
+        return result
+
+    def assign_walk_in(self, walk_in_in: WalkInCreate, created_by: UUID) -> WalkInAssignment:
+        """
+        Xếp bệnh nhân vãng lai vào bác sĩ có khung giờ trống sớm nhất từ bây giờ đến hết giờ làm việc hôm nay.
+        Lịch trong ngày của bác sĩ lấy từ cache (app.appointments.schedules), không query lại cả ngày mỗi request;
+        khung giờ vừa bị worker khác đặt mất (unique index) thì chọn lại.
+        """
+        patient = self.patient_service.get_patient_by_id(walk_in_in.patient_id)
+        if not patient:
+            raise HTTPException(status_code=404, detail="Bệnh nhân không tồn tại")
+
+        query = select(User).where(User.role == UserRoleEnum.DOCTOR, User.deleted_at.is_(None))
+        if walk_in_in.doctor_ids:
+            query = query.where(User.id.in_(walk_in_in.doctor_ids))
+        doctors = {doctor.id: doctor for doctor in self.db.scalars(query)}
+        if not doctors:
+            raise HTTPException(status_code=404, detail="Không có bác sĩ phù hợp")
+
+        now = datetime.now(clinic_timezone())  # Giờ làm việc / ngày hẹn theo giờ phòng khám, không theo múi giờ server
+        today = now.date()
+        earliest = now.hour * 60 + now.minute + (1 if now.second or now.microsecond else 0)
+        slot = settings.appointment_slot_minutes
+
+        for _ in range(WALK_IN_MAX_ATTEMPTS):
+            schedules = doctor_schedules.load(self.db, list(doctors), today)
+            choice = doctor_schedules.assign(schedules, earliest, slot)
+            if choice is None:
+                raise HTTPException(status_code=409, detail="Không còn khung giờ trống trong hôm nay")
+            doctor_id, start = choice
+
+            db_appointment = Appointment(
+                patient_id=walk_in_in.patient_id,
+                doctor_id=doctor_id,
+                created_by=created_by,
+                appointment_date=today,
+                appointment_time=from_minutes(start),
+                time_slot=f"{slot} phút",
+                status=AppointmentStatusEnum.WAITING,   # Bệnh nhân đã có mặt tại phòng khám
+                notes=walk_in_in.notes,
+            )
+            self.db.add(db_appointment)
+            try:
+                self.db.flush()
+                emit_appointment(self.db, db_appointment, "created")
+                track_queue_change(self.db, doctor_id)
+                self.db.commit()
+            except IntegrityError as e:
+                self.db.rollback()
+                if not _is_double_booking(e):
+                    doctor_schedules.release(schedules[doctor_id], start)
+                    raise
+                continue  # Khung giờ đã có người đặt: giữ đánh dấu trong cache, chọn lại
+            except Exception:
+                self.db.rollback()
+                doctor_schedules.release(schedules[doctor_id], start)
+                raise
+            break
+        else:
+            raise HTTPException(status_code=409, detail="Bác sĩ đã có lịch hẹn vào ngày giờ này")
+
+        self.db.refresh(db_appointment)
+        appointment = AppointmentResponse(
+            id=db_appointment.id,
+            patient_id=db_appointment.patient_id,
+            doctor_id=db_appointment.doctor_id,
+            created_by=db_appointment.created_by,
+            appointment_date=db_appointment.appointment_date,
+            appointment_time=db_appointment.appointment_time,
+            time_slot=db_appointment.time_slot,
+            status=db_appointment.status,
+            notes=db_appointment.notes,
+            created_at=db_appointment.created_at,
+            series_id=db_appointment.series_id,
+            patient=patient,
+            doctor=doctors[doctor_id],
+        )
+        return WalkInAssignment(appointment=appointment, expected_wait_minutes=max(start - earliest, 0))
+
+    def mark_no_shows(self, before: date, batch_size: int = 500) -> int:
+        """
+        Lịch hẹn trước ngày before vẫn SCHEDULED -> NO_SHOW, theo từng lô (mỗi lô một transaction ngắn,
+        không khóa cả bảng). Trả về số lịch hẹn đã đánh dấu.
+        """
+        total = 0
+        while True:
+            ids = self.db.scalars(
+                select(Appointment.id)
+                .where(Appointment.status == AppointmentStatusEnum.SCHEDULED, Appointment.appointment_date < before)
+                .limit(batch_size)
+            ).all()
+            if not ids:
+                break
+            result = self.db.execute(
+                update(Appointment)
+                .where(Appointment.id.in_(ids), Appointment.status == AppointmentStatusEnum.SCHEDULED)
+                .values(status=AppointmentStatusEnum.NO_SHOW)
+                .execution_options(synchronize_session=False)
+            )
+            self.db.commit()
+            total += result.rowcount
+            if len(ids) < batch_size:
+                break
+        return total
+
     # def delete_appointment(self, appointment_id: UUID) -> bool:
     #     """Xóa lịch hẹn"""
     #     db_appointment = self.db.query(Appointment).filter(Appointment.id == appointment_id).first()
@@ -236,4 +638,142 @@ class AppointmentService:
 
     #     self.db.delete(db_appointment)
     #     self.db.commit()
-    #     return True
\ No newline at end of file
+    #     return True
+
+
+class WaitingQueueService:
+    """Thời gian khám trung bình của bác sĩ và thời gian chờ dự kiến của bệnh nhân đang chờ khám"""
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_waiting_etas(self, doctor_id: Optional[UUID] = None) -> List[WaitingEta]:
+        """
+        Thời gian chờ dự kiến của các bệnh nhân WAITING hôm nay, theo bác sĩ và thứ tự hàng chờ.
+        Tính từ hàng chờ + thời gian khám trung bình trong bộ nhớ (app.appointments.waiting): không query khi không có thay đổi.
+        """
+        now = datetime.now(timezone.utc)
+        queues = waiting_board.queues(self.db, to_clinic_date(now))
+        doctor_ids = [doctor_id] if doctor_id is not None else sorted(queues, key=str)
+        result: List[WaitingEta] = []
+        for queue_doctor_id in doctor_ids:
+            service = waiting_board.service_time(self.db, queue_doctor_id)
+            position = 0
+            for entry, expected, latest in estimate_starts(queues.get(queue_doctor_id, []), service, now):
+                in_service = entry.started_at is not None
+                if not in_service:
+                    position += 1
+                result.append(WaitingEta(
+                    appointment_id=entry.appointment_id,
+                    patient_id=entry.patient_id,
+                    doctor_id=entry.doctor_id,
+                    appointment_time=entry.appointment_time,
+                    position=0 if in_service else position,
+                    in_service=in_service,
+                    estimated_start=expected,
+                    eta_minutes=max(round((expected - now).total_seconds() / 60), 0),
+                    eta_max_minutes=max(round((latest - now).total_seconds() / 60), 0),
+                    service_minutes=round(service.mean_minutes, 1),
+                ))
+        return result
+
+    def update_service_stats(self, lag_seconds: float = 60, alpha: float = 0.2) -> int:
+        """
+        Cập nhật thời gian khám trung bình (EWMA) của bác sĩ từ các hóa đơn mới, trả về số bác sĩ đã cập nhật.
+        - Chỉ đọc hóa đơn sau last_invoice_at của từng bác sĩ (tăng dần, không tính lại lịch sử)
+        - Chỉ tính hóa đơn cũ hơn lag_seconds: created_at lấy lúc INSERT nhưng transaction có thể commit sau
+        - UPDATE ... WHERE last_invoice_at = <giá trị đã đọc>: hai instance chạy cùng lúc không tính trùng
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=lag_seconds)
+        current = {
+            row.doctor_id: row
+            for row in self.db.execute(
+                select(
+                    DoctorServiceStat.doctor_id, DoctorServiceStat.mean_minutes, DoctorServiceStat.variance,
+                    DoctorServiceStat.samples, DoctorServiceStat.last_invoice_at,
+                )
+            )
+        }
+        rows = self.db.execute(
+            select(Invoice.doctor_id, Invoice.created_at, MedicalRecord.created_at.label("started_at"))
+            .join(MedicalRecord, MedicalRecord.id == Invoice.medical_record_id)
+            .outerjoin(DoctorServiceStat, DoctorServiceStat.doctor_id == Invoice.doctor_id)
+            .where(
+                or_(
+                    and_(DoctorServiceStat.doctor_id.is_(None), Invoice.created_at >= cutoff - SERVICE_STATS_INITIAL_WINDOW),
+                    Invoice.created_at > DoctorServiceStat.last_invoice_at,
+                ),
+                Invoice.created_at < cutoff,
+            )
+            .order_by(Invoice.doctor_id, Invoice.created_at)
+        ).all()
+
+        stats = {}
+        for row in rows:
+            stat = stats.get(row.doctor_id)
+            if stat is None:
+                seen = current.get(row.doctor_id)
+                stat = stats[row.doctor_id] = {
+                    "mean": seen.mean_minutes if seen else None,
+                    "variance": seen.variance if seen else 0.0,
+                    "samples": seen.samples if seen else 0,
+                    "seen": seen.last_invoice_at if seen else None,
+                }
+            stat["last"] = row.created_at
+            minutes = (row.created_at - row.started_at).total_seconds() / 60
+            if not MIN_SERVICE_MINUTES <= minutes <= MAX_SERVICE_MINUTES:
+                continue
+            if stat["mean"] is None:
+                stat["mean"] = minutes
+            else:
+                # EWMA + phương sai trượt: cập nhật từng lượt khám, không cần dữ liệu cũ
+                diff = minutes - stat["mean"]
+                increment = alpha * diff
+                stat["mean"] += increment
+                stat["variance"] = (1 - alpha) * (stat["variance"] + diff * increment)
+            stat["samples"] += 1
+
+        new_stats = [
+            {"doctor_id": doctor_id, "mean_minutes": stat["mean"], "variance": stat["variance"],
+             "samples": stat["samples"], "last_invoice_at": stat["last"]}
+            for doctor_id, stat in stats.items() if stat["seen"] is None and stat["mean"] is not None
+        ]
+        updates = [
+            {"b_doctor_id": doctor_id, "b_seen": stat["seen"], "b_mean": stat["mean"], "b_variance": stat["variance"],
+             "b_samples": stat["samples"], "b_last": stat["last"]}
+            for doctor_id, stat in stats.items() if stat["seen"] is not None
+        ]
+        table = DoctorServiceStat.__table__
+        try:
+            if new_stats:
+                self.db.execute(insert(table), new_stats)
+            if updates:
+                self.db.execute(
+                    update(table)
+                    .where(table.c.doctor_id == bindparam("b_doctor_id"), table.c.last_invoice_at == bindparam("b_seen"))
+                    .values(
+                        mean_minutes=bindparam("b_mean"), variance=bindparam("b_variance"),
+                        samples=bindparam("b_samples"), last_invoice_at=bindparam("b_last"),
+                    ),
+                    updates,
+                )
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return len(new_stats) + len(updates)
+
+
+def update_service_time_stats() -> int:
+    """Job định kỳ: cập nhật thời gian khám trung bình của bác sĩ, nạp lại vào bộ nhớ để tính thời gian chờ"""
+    with SessionLocal() as db:
+        updated = WaitingQueueService(db).update_service_stats(
+            settings.service_time_stats_lag_seconds, settings.service_time_ewma_alpha,
+        )
+        waiting_board.reload_service_times(db)
+        return updated
+
+
+def mark_no_show_appointments() -> int:
+    """Job định kỳ: đánh dấu NO_SHOW các lịch hẹn đã qua ngày mà bệnh nhân không đến"""
+    with SessionLocal() as db:
+        return AppointmentService(db).mark_no_shows(datetime.now(clinic_timezone()).date(), settings.appointment_no_show_batch_size)
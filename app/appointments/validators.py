@@ -7,18 +7,15 @@ def validate_appointment_date(value: date) -> date:
         raise ValueError(f"Ngày hẹn ({value}) phải từ hôm nay trở đi.")
     return value
 
+# Giờ làm việc của bác sĩ (Thứ Hai - Thứ Sáu): 11:00-13:00 và 17:00-20:00
+WORKING_WINDOWS = (
+    (time(11, 0), time(13, 0)),
+    (time(17, 0), time(20, 0)),
+)
+
 def validate_appointment_time(value: time) -> time:
     """Validate giờ hẹn"""
-
-    # Giờ hợp lệ cho Thứ Hai - Thứ Sáu
-    weekday_morning_start = time(11, 0)  # 11:00
-    weekday_morning_end = time(13, 0)    # 13:00
-    weekday_evening_start = time(17, 0)  # 17:00
-    weekday_evening_end = time(20, 0)    # 20:00
-    if not (
-        (weekday_morning_start <= value <= weekday_morning_end) or
-        (weekday_evening_start <= value <= weekday_evening_end)
-    ):
+    if not any(start <= value <= end for start, end in WORKING_WINDOWS):
         raise ValueError(
             f"Giờ hẹn ({value}) phải từ 11:00-13:00 hoặc 17:00-20:00."
         )
@@ -0,0 +1,188 @@
+"""
+Hàng chờ khám hôm nay (lịch hẹn WAITING) và thời gian khám trung bình của từng bác sĩ, giữ trong bộ nhớ process
+để trả thời gian chờ dự kiến (ETA) cho màn hình phòng chờ mà không query lại mỗi lần làm mới.
+
+- Hàng chờ được load một lần (một query) và hết hạn sau WAITING_QUEUE_TTL_SECONDS để nhận thay đổi của instance khác
+- Thay đổi lịch hẹn / phiên khám trong process được ghi vào session.info, SAU KHI commit thì đánh dấu hàng chờ của
+  bác sĩ đó cần load lại (lần đọc sau chỉ query lại các bác sĩ này, rollback thì bỏ)
+- Thời gian khám trung bình (bảng doctor_service_stats) được nạp lại mỗi lần job cập nhật chạy
+"""
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from datetime import time as dt_time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.appointments.models import Appointment, AppointmentStatusEnum, DoctorServiceStat
+from app.core.config import settings
+from app.medical_records.models import MedicalRecord, MedicalRecordStatusEnum
+
+_PENDING_KEY = "waiting_queue_changes"
+
+
+@dataclass(frozen=True)
+class WaitingEntry:
+    appointment_id: UUID
+    patient_id: UUID
+    doctor_id: UUID
+    appointment_time: Optional[dt_time]
+    started_at: Optional[datetime]      # Giờ bắt đầu phiên khám đang thực hiện (UTC), None: đang chờ
+
+    def sort_key(self):
+        # Đang khám trước, sau đó theo giờ hẹn
+        return (self.started_at is None, self.appointment_time or dt_time.max, str(self.appointment_id))
+
+
+@dataclass(frozen=True)
+class ServiceTime:
+    mean_minutes: float
+    stddev_minutes: float
+    samples: int
+
+
+def estimate_starts(
+    entries: List[WaitingEntry], service: ServiceTime, now: datetime,
+) -> List[Tuple[WaitingEntry, datetime, datetime]]:
+    """
+    Giờ bắt đầu dự kiến (trung bình, muộn nhất ~ mean + stddev mỗi lượt) của từng bệnh nhân theo thứ tự hàng chờ.
+    Bệnh nhân đang khám: bắt đầu = giờ mở phiên khám; bác sĩ rảnh sau phần thời gian khám còn lại.
+    """
+    mean = timedelta(minutes=service.mean_minutes)
+    high = timedelta(minutes=service.mean_minutes + service.stddev_minutes)
+    expected = latest = now
+    result = []
+    for entry in entries:
+        if entry.started_at is not None:
+            expected = max(expected, entry.started_at + mean)
+            latest = max(latest, entry.started_at + high)
+            result.append((entry, entry.started_at, entry.started_at))
+        else:
+            result.append((entry, expected, latest))
+            expected += mean
+            latest += high
+    return result
+
+
+def _load_queues(db: Session, day: date, doctor_ids: Optional[Iterable[UUID]] = None) -> Dict[UUID, List[WaitingEntry]]:
+    """Lịch hẹn WAITING trong ngày kèm phiên khám (nếu có), một query"""
+    query = (
+        select(
+            Appointment.id, Appointment.patient_id, Appointment.doctor_id, Appointment.appointment_time,
+            MedicalRecord.status.label("record_status"), MedicalRecord.created_at.label("record_created_at"),
+        )
+        .outerjoin(MedicalRecord, MedicalRecord.appointment_id == Appointment.id)
+        .where(Appointment.appointment_date == day, Appointment.status == AppointmentStatusEnum.WAITING)
+    )
+    if doctor_ids is not None:
+        query = query.where(Appointment.doctor_id.in_(list(doctor_ids)))
+
+    entries: Dict[UUID, WaitingEntry] = {}
+    finished: Set[UUID] = set()
+    for row in db.execute(query):
+        if row.record_status in (MedicalRecordStatusEnum.COMPLETED, MedicalRecordStatusEnum.PAID):
+            finished.add(row.id)  # Bác sĩ đã khám xong, bệnh nhân chờ thanh toán
+            continue
+        started_at = row.record_created_at
+        if started_at is not None and started_at.tzinfo is None:
+            started_at = started_at.replace(tzinfo=timezone.utc)  # SQLite trả datetime không có múi giờ (UTC)
+        entries[row.id] = WaitingEntry(row.id, row.patient_id, row.doctor_id, row.appointment_time, started_at)
+
+    queues: Dict[UUID, List[WaitingEntry]] = {}
+    for appointment_id, entry in entries.items():
+        if appointment_id not in finished:
+            queues.setdefault(entry.doctor_id, []).append(entry)
+    for queue in queues.values():
+        queue.sort(key=WaitingEntry.sort_key)
+    return queues
+
+
+class WaitingBoard:
+    """Hàng chờ hôm nay theo bác sĩ + thời gian khám trung bình của bác sĩ"""
+
+    def __init__(self):
+        self._day: Optional[date] = None
+        self._queues: Dict[UUID, List[WaitingEntry]] = {}
+        self._expires_at = 0.0
+        self._dirty: Dict[UUID, int] = {}       # doctor_id -> lần thay đổi (phân biệt thay đổi xảy ra trong lúc đang load)
+        self._generation = 0
+        self._service_times: Optional[Dict[UUID, ServiceTime]] = None
+        self._lock = threading.Lock()
+
+    def queues(self, db: Session, day: date) -> Dict[UUID, List[WaitingEntry]]:
+        """Hàng chờ của mọi bác sĩ; chỉ query khi hết hạn / sang ngày mới (toàn bộ) hoặc có bác sĩ thay đổi (bác sĩ đó)"""
+        now = time.monotonic()
+        with self._lock:
+            full = self._day != day or self._expires_at <= now
+            seen = dict(self._dirty)
+            if not full and not seen:
+                return dict(self._queues)
+
+        loaded = _load_queues(db, day, None if full else seen)
+
+        with self._lock:
+            if full:
+                self._day, self._queues = day, loaded
+                self._expires_at = now + settings.waiting_queue_ttl_seconds
+            else:
+                for doctor_id in seen:
+                    if doctor_id in loaded:
+                        self._queues[doctor_id] = loaded[doctor_id]
+                    else:
+                        self._queues.pop(doctor_id, None)
+            # Giữ đánh dấu của các thay đổi xảy ra sau khi bắt đầu load
+            self._dirty = {
+                doctor_id: generation for doctor_id, generation in self._dirty.items()
+                if seen.get(doctor_id) != generation
+            }
+            return dict(self._queues)
+
+    def mark_changed(self, doctor_ids: Iterable[UUID]) -> None:
+        with self._lock:
+            for doctor_id in doctor_ids:
+                self._generation += 1
+                self._dirty[doctor_id] = self._generation
+
+    def service_time(self, db: Session, doctor_id: UUID) -> ServiceTime:
+        """Thời gian khám trung bình; bác sĩ chưa có số liệu: dùng thời lượng một lượt khám mặc định"""
+        if self._service_times is None:
+            self.reload_service_times(db)
+        stat = self._service_times.get(doctor_id)
+        if stat is None:
+            return ServiceTime(float(settings.appointment_slot_minutes), 0.0, 0)
+        return stat
+
+    def reload_service_times(self, db: Session) -> None:
+        """Nạp lại toàn bộ bảng doctor_service_stats (một dòng mỗi bác sĩ)"""
+        service_times = {
+            row.doctor_id: ServiceTime(row.mean_minutes, max(row.variance, 0.0) ** 0.5, row.samples)
+            for row in db.execute(
+                select(DoctorServiceStat.doctor_id, DoctorServiceStat.mean_minutes, DoctorServiceStat.variance, DoctorServiceStat.samples)
+            )
+        }
+        with self._lock:
+            self._service_times = service_times
+
+
+waiting_board = WaitingBoard()
+
+
+def track_queue_change(db: Session, doctor_id: UUID) -> None:
+    """Ghi nhận hàng chờ của bác sĩ thay đổi trong transaction hiện tại (load lại sau khi commit)"""
+    db.info.setdefault(_PENDING_KEY, set()).add(doctor_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        waiting_board.mark_changed(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
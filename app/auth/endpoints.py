@@ -1,16 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 from app.core.dependencies import AuthCredentialDepend
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.users.schemas import UserLogin, UserResponse
 from app.users.services import UserService
 from app.auth.jwt_handler import create_access_token, create_refresh_token, verify_token, get_user_id_from_token
 from app.core.response import ResponseBase
 from app.users.schemas import UserTokenData, LoginResponseData, RefreshTokenData
+from app.core.routing import EnvelopeRoute
 
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 router = APIRouter(
+    route_class=EnvelopeRoute,  # Serialize nhanh envelope ResponseBase
     prefix="/auth",    # Tất cả endpoint sẽ có prefix /auth
     tags=["auth"],      # Nhóm trong Swagger docs
     responses={404: {"description": "Not found"}}  # Response chung cho 404
@@ -54,7 +56,7 @@ def refresh_token(data: RefreshTokenData):
 @router.get("/me", response_model=ResponseBase[UserResponse])
 def get_current_user(
     CREDENTIALS: AuthCredentialDepend,
-    DB: Session = Depends(get_db),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     # Lấy token từ Authorization header
@@ -0,0 +1,245 @@
+"""
+Nén response (gzip / brotli) và serve static file đã nén sẵn.
+
+- CompressionMiddleware: nén body response theo Accept-Encoding của client
+  + Chỉ nén khi body >= settings.compression_min_size
+  + Bỏ qua media type đã nén sẵn (ảnh, zip, ...) và response đã có Content-Encoding
+  + Response streaming (nhiều message body, ví dụ SSE) được chuyển thẳng, không nén
+- PrecompressedStaticFiles: nếu có file <tên>.br / <tên>.gz cạnh file gốc thì trả file nén sẵn,
+  không tốn CPU nén mỗi request
+- Tạo các file nén sẵn: python -m app.core.compression static
+"""
+import gzip
+import os
+import sys
+from pathlib import Path
+from typing import Optional, Set, Tuple
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+try:  # brotli là tuỳ chọn, không có thì chỉ dùng gzip
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+# Media type nên nén (dạng text). Các loại khác (ảnh, pdf, zip, ...) thường đã nén sẵn
+COMPRESSIBLE_MEDIA_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/problem+json",
+    "image/svg+xml",
+)
+# Media type không bao giờ nén: streaming cần đẩy từng event ngay
+EXCLUDED_MEDIA_TYPES = ("text/event-stream",)
+
+# Thứ tự ưu tiên encoding và đuôi file nén sẵn tương ứng
+PRECOMPRESSED_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+# Đuôi file static nên tạo bản nén sẵn
+PRECOMPRESS_EXTENSIONS = {".css", ".js", ".json", ".svg", ".html", ".txt", ".xml", ".map"}
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    """Kiểm tra media type có nên nén không"""
+    if not content_type:
+        return False
+    content_type = content_type.lower()
+    if content_type.startswith(EXCLUDED_MEDIA_TYPES):
+        return False
+    return content_type.startswith(COMPRESSIBLE_MEDIA_TYPES)
+
+
+def accepted_encodings(accept_encoding: str) -> Tuple[Set[str], Set[str]]:
+    """Parse header Accept-Encoding -> (các encoding được chấp nhận, các encoding bị từ chối rõ ràng bằng q=0)"""
+    accepted, refused = set(), set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip()
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    refused.add(name)
+                    continue
+            except ValueError:
+                continue
+        if name:
+            accepted.add(name)
+    return accepted, refused
+
+
+def accepts(encoding: str, accepted: Set[str], refused: Set[str]) -> bool:
+    """Client nhận encoding này: có tên trong header, hoặc có * và không bị từ chối bằng q=0"""
+    return encoding in accepted or ("*" in accepted and encoding not in refused)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Chọn encoding tốt nhất mà client và server cùng hỗ trợ (ưu tiên br)"""
+    accepted, refused = accepted_encodings(accept_encoding)
+    if brotli is not None and accepts("br", accepted, refused):
+        return "br"
+    if accepts("gzip", accepted, refused):
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Nén body theo encoding với mức nén trong settings"""
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.compression_brotli_quality)
+    return gzip.compress(body, compresslevel=settings.compression_gzip_level, mtime=0)
+
+
+def add_vary_accept_encoding(headers: MutableHeaders) -> None:
+    """Thêm Accept-Encoding vào header Vary (giữ các giá trị sẵn có)"""
+    vary = headers.get("vary")
+    if not vary:
+        headers["vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["vary"] = f"{vary}, Accept-Encoding"
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware nén response theo Accept-Encoding.
+    Viết dạng ASGI thuần (không dùng BaseHTTPMiddleware) để không bọc thêm task/stream cho mỗi request.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: Optional[int] = None) -> None:
+        self.app = app
+        self.minimum_size = settings.compression_min_size if minimum_size is None else minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start_message, passthrough
+
+            if message["type"] == "http.response.start":
+                # Giữ lại start message cho tới khi biết body có nén hay không
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            passthrough = True
+            headers = MutableHeaders(raw=start_message["headers"])
+            body = message.get("body", b"")
+
+            if not is_compressible(headers.get("content-type")) or "content-encoding" in headers:
+                await send(start_message)
+                await send(message)
+                return
+
+            add_vary_accept_encoding(headers)
+            # Streaming (nhiều message) hoặc body nhỏ: không nén
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            if len(compressed) >= len(body):
+                await send(start_message)
+                await send(message)
+                return
+
+            headers["content-encoding"] = encoding
+            headers["content-length"] = str(len(compressed))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+        # Response không có body message (hiếm) -> vẫn phải gửi start message
+        if start_message is not None and not passthrough:
+            await send(start_message)
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles ưu tiên trả file nén sẵn (<file>.br, <file>.gz) nếu client chấp nhận.
+    File nén chỉ được dùng khi không cũ hơn file gốc.
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = await super().get_response(path, scope)
+        if not isinstance(response, FileResponse) or response.status_code != 200:
+            return response
+        if not is_compressible(response.media_type):
+            return response
+
+        response.headers["vary"] = "Accept-Encoding"
+        accepted, refused = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        original_mtime = os.stat(response.path).st_mtime
+
+        for encoding, suffix in PRECOMPRESSED_SUFFIXES.items():
+            if not accepts(encoding, accepted, refused):
+                continue
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if stat_result is None or stat_result.st_mtime < original_mtime:
+                continue
+            variant = FileResponse(full_path, media_type=response.media_type, stat_result=stat_result)
+            variant.headers["content-encoding"] = encoding
+            variant.headers["vary"] = "Accept-Encoding"
+            if self.is_not_modified(variant.headers, Headers(scope=scope)):
+                return Response(status_code=304, headers={
+                    key: value for key, value in variant.headers.items()
+                    if key in ("etag", "last-modified", "vary", "cache-control")
+                })
+            return variant
+        return response
+
+
+def precompress_directory(directory: str) -> int:
+    """
+    Tạo file .gz (và .br nếu có brotli) cho các file static dạng text trong thư mục.
+    Bỏ qua file đã có bản nén mới hơn file gốc. Trả về số file đã tạo.
+    """
+    created = 0
+    for path in Path(directory).rglob("*"):
+        if not path.is_file() or path.suffix.lower() not in PRECOMPRESS_EXTENSIONS:
+            continue
+        source_mtime = path.stat().st_mtime
+        data = None
+        for encoding, suffix in PRECOMPRESSED_SUFFIXES.items():
+            if encoding == "br" and brotli is None:
+                continue
+            target = path.with_name(path.name + suffix)
+            if target.exists() and target.stat().st_mtime >= source_mtime:
+                continue
+            if data is None:
+                data = path.read_bytes()
+            if encoding == "br":
+                compressed = brotli.compress(data, quality=11)
+            else:
+                compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(compressed) >= len(data):
+                continue
+            target.write_bytes(compressed)
+            created += 1
+    return created
+
+
+if __name__ == "__main__":
+    target_dir = sys.argv[1] if len(sys.argv) > 1 else "static"
+    print(f"Đã tạo {precompress_directory(target_dir)} file nén sẵn trong {target_dir}")
@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
-from typing import Optional
+from typing import Literal, Optional
 
 
 class Settings(BaseSettings):
@@ -11,11 +11,25 @@ class Settings(BaseSettings):
     
     # Database configuration
     database_url: str = Field(..., env="DATABASE_URL")
+    database_replica_url: Optional[str] = Field(default=None, env="DATABASE_REPLICA_URL")  # Read replica (tuỳ chọn)
+    # Sau khi client ghi dữ liệu, các request đọc của client đó dùng primary trong N giây (read-your-writes)
+    read_your_writes_seconds: float = Field(default=5, env="READ_YOUR_WRITES_SECONDS")
     postgres_user: str = Field(..., env="POSTGRES_USER")
     postgres_password: str = Field(..., env="POSTGRES_PASSWORD") 
     postgres_db: str = Field(..., env="POSTGRES_DB")
     postgres_host: str = Field(default="localhost", env="POSTGRES_HOST")
     postgres_port: int = Field(default=5432, env="POSTGRES_PORT")
+
+    # Connection pool
+    db_pool_size: int = Field(default=5, env="DB_POOL_SIZE")                # Số connection giữ sẵn
+    db_max_overflow: int = Field(default=10, env="DB_MAX_OVERFLOW")         # Số connection mở thêm khi pool hết
+    db_pool_timeout: float = Field(default=30, env="DB_POOL_TIMEOUT")       # Giây chờ connection trước khi báo lỗi
+    db_pool_recycle: int = Field(default=300, env="DB_POOL_RECYCLE")        # Giây, -1 để tắt
+    # always: ping mỗi lần checkout | idle: chỉ ping connection đã rảnh lâu | never: không ping
+    db_pool_pre_ping: Literal["always", "idle", "never"] = Field(default="always", env="DB_POOL_PRE_PING")
+    db_pool_pre_ping_idle_seconds: float = Field(default=30, env="DB_POOL_PRE_PING_IDLE_SECONDS")
+    db_pool_use_lifo: bool = Field(default=False, env="DB_POOL_USE_LIFO")   # LIFO giữ ít connection "nóng", hợp với pre_ping=idle
+    db_pool_warmup: bool = Field(default=True, env="DB_POOL_WARMUP")        # Mở sẵn db_pool_size connection lúc khởi động
     
     # JWT configuration
     secret_key: str = Field(..., env="SECRET_KEY")
@@ -26,6 +40,53 @@ class Settings(BaseSettings):
     # App configuration
     app_name: str = Field(default="Acne Clinic API", env="APP_NAME")
     debug: bool = Field(default=False, env="DEBUG")
+    clinic_timezone: str = Field(default="Asia/Ho_Chi_Minh", env="CLINIC_TIMEZONE")  # Múi giờ phòng khám: xác định "ngày" của hóa đơn trong báo cáo
+
+    # Response compression
+    compression_enabled: bool = Field(default=True, env="COMPRESSION_ENABLED")
+    compression_min_size: int = Field(default=1024, env="COMPRESSION_MIN_SIZE")  # bytes, nhỏ hơn thì không nén
+    compression_gzip_level: int = Field(default=6, env="COMPRESSION_GZIP_LEVEL")
+    compression_brotli_quality: int = Field(default=4, env="COMPRESSION_BROTLI_QUALITY")
+
+    # Metrics (/metrics cho Prometheus)
+    metrics_enabled: bool = Field(default=True, env="METRICS_ENABLED")
+
+    # Profile theo request (admin gửi header X-Profile hoặc query __profile), tắt mặc định
+    profiling_enabled: bool = Field(default=False, env="PROFILING_ENABLED")
+    profiling_dir: str = Field(default="profiles", env="PROFILING_DIR")                  # Thư mục lưu profile
+    profiling_interval_ms: float = Field(default=1.0, env="PROFILING_INTERVAL_MS")      # Chu kỳ lấy mẫu stack
+
+    # Idempotency-Key cho POST tạo hóa đơn/đơn thuốc/chỉ định
+    idempotency_ttl_hours: float = Field(default=24, env="IDEMPOTENCY_TTL_HOURS")                      # Thời gian giữ response đã lưu
+    idempotency_purge_interval_seconds: float = Field(default=3600, env="IDEMPOTENCY_PURGE_INTERVAL_SECONDS")  # Chu kỳ job dọn key hết hạn
+    idempotency_lock_seconds: float = Field(default=120, env="IDEMPOTENCY_LOCK_SECONDS")                # Thời gian giữ chỗ IN_PROGRESS, quá hạn (worker chết giữa chừng) thì retry được xử lý lại
+
+    # Ledger tồn kho thuốc
+    stock_compaction_interval_seconds: float = Field(default=300, env="STOCK_COMPACTION_INTERVAL_SECONDS")  # Chu kỳ gộp ledger vào snapshot
+    stock_compaction_lag_seconds: float = Field(default=60, env="STOCK_COMPACTION_LAG_SECONDS")            # Chỉ gộp movement cũ hơn (chờ transaction commit)
+    stock_reservation_ttl_minutes: float = Field(default=120, env="STOCK_RESERVATION_TTL_MINUTES")          # Thời gian giữ chỗ thuốc từ lúc kê đơn
+    medication_low_stock_threshold: int = Field(default=20, env="MEDICATION_LOW_STOCK_THRESHOLD")          # Ngưỡng mặc định khi thuốc không đặt riêng
+    medication_alert_window_days: int = Field(default=30, env="MEDICATION_ALERT_WINDOW_DAYS")              # Số ngày kê đơn gần nhất để tính tốc độ dùng
+    medication_alert_run_out_days: float = Field(default=14, env="MEDICATION_ALERT_RUN_OUT_DAYS")          # Cảnh báo nếu dự kiến hết thuốc trong số ngày này
+    medication_alert_scan_interval_seconds: float = Field(default=900, env="MEDICATION_ALERT_SCAN_INTERVAL_SECONDS")  # Chu kỳ quét cảnh báo
+    stock_reservation_sweep_interval_seconds: float = Field(default=60, env="STOCK_RESERVATION_SWEEP_INTERVAL_SECONDS")  # Chu kỳ trả lại giữ chỗ quá hạn
+
+    # Lịch hẹn
+    appointment_no_show_interval_seconds: float = Field(default=3600, env="APPOINTMENT_NO_SHOW_INTERVAL_SECONDS")  # Chu kỳ job đánh dấu NO_SHOW
+    appointment_no_show_batch_size: int = Field(default=500, env="APPOINTMENT_NO_SHOW_BATCH_SIZE")                # Số lịch hẹn mỗi lô
+    appointment_slot_minutes: int = Field(default=30, env="APPOINTMENT_SLOT_MINUTES")                            # Thời lượng một lượt khám (xếp bệnh nhân vãng lai)
+    walk_in_schedule_ttl_seconds: float = Field(default=60, env="WALK_IN_SCHEDULE_TTL_SECONDS")                 # Thời gian giữ lịch trong ngày của bác sĩ trong bộ nhớ
+    waiting_queue_ttl_seconds: float = Field(default=30, env="WAITING_QUEUE_TTL_SECONDS")                       # Thời gian giữ hàng chờ trong bộ nhớ (nhận thay đổi của instance khác)
+    service_time_stats_interval_seconds: float = Field(default=300, env="SERVICE_TIME_STATS_INTERVAL_SECONDS")  # Chu kỳ job cập nhật thời gian khám trung bình
+    service_time_stats_lag_seconds: float = Field(default=60, env="SERVICE_TIME_STATS_LAG_SECONDS")            # Chỉ tính hóa đơn cũ hơn (chờ transaction commit)
+    service_time_ewma_alpha: float = Field(default=0.2, env="SERVICE_TIME_EWMA_ALPHA")                         # Trọng số lượt khám mới nhất
+
+    # Realtime (SSE): đẩy thay đổi trạng thái lịch hẹn/phiên khám/hóa đơn tới màn hình lễ tân, bác sĩ, thu ngân
+    # memory: chỉ trong process (một worker) | postgres: LISTEN/NOTIFY để các worker/instance cùng nhận event
+    realtime_backend: Literal["memory", "postgres"] = Field(default="memory", env="REALTIME_BACKEND")
+    realtime_channel: str = Field(default="clinic_events", env="REALTIME_CHANNEL")                # Kênh NOTIFY của Postgres
+    realtime_queue_size: int = Field(default=256, env="REALTIME_QUEUE_SIZE")                      # Số event chờ tối đa mỗi client
+    realtime_keepalive_seconds: float = Field(default=15, env="REALTIME_KEEPALIVE_SECONDS")       # Gửi ping khi không có event
     
     class Config:
         """Cấu hình để load từ file .env"""
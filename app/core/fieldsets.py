@@ -0,0 +1,139 @@
+"""
+Sparse fieldsets cho các list endpoint (query param `fields=`).
+
+Cú pháp: danh sách trường phân tách bằng dấu phẩy, trường của object lồng viết dạng `quan_he.truong`
+    ?fields=id,appointment_date,status,patient.full_name,doctor
+- `patient.full_name`: chỉ lấy full_name (và id) của patient
+- `doctor`: lấy toàn bộ trường của doctor theo schema response
+- `id` luôn được trả về
+
+Field set vừa giới hạn cột SELECT (load_only + joinedload) vừa giới hạn dữ liệu trả về,
+nên giảm cả I/O database lẫn kích thước payload.
+"""
+from typing import Any, Dict, List, Optional, Type, Union, get_args
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, load_only
+
+FieldTree = Dict[str, Union[bool, "FieldTree"]]
+
+FIELDS_QUERY_DESCRIPTION = (
+    "Chỉ trả về các trường này, phân tách bằng dấu phẩy. "
+    "Trường lồng dạng quan_he.truong, ví dụ: id,status,patient.full_name"
+)
+
+
+def _nested_schema(schema: Type[BaseModel], name: str) -> Optional[Type[BaseModel]]:
+    """Lấy schema của object lồng (bỏ Optional[...]) nếu field là BaseModel"""
+    annotation = schema.model_fields[name].annotation
+    for candidate in get_args(annotation) or (annotation,):
+        if isinstance(candidate, type) and issubclass(candidate, BaseModel):
+            return candidate
+    return None
+
+
+class FieldSet:
+    """
+    Tập trường được chọn cho một list endpoint.
+    - schema: schema response đầy đủ (ví dụ AppointmentResponse) - dùng để kiểm tra tên trường
+    - model: SQLAlchemy model tương ứng - dùng để build load options
+    """
+
+    def __init__(self, schema: Type[BaseModel], model: Type[Any], tree: FieldTree):
+        self.schema = schema
+        self.model = model
+        self.tree = tree
+        self._relationships = set(inspect(model).relationships.keys())
+        # Tính sẵn danh sách trường của từng object lồng, tránh tính lại cho mỗi dòng
+        self._nested = {name: self._nested_fields(name) for name in tree if name in self._relationships}
+
+    @classmethod
+    def parse(cls, fields: Optional[str], schema: Type[BaseModel], model: Type[Any]) -> Optional["FieldSet"]:
+        """
+        Parse query param `fields`. Trả về None nếu không truyền (trả đầy đủ như cũ).
+        Raise HTTP 400 nếu có trường không tồn tại.
+        """
+        if not fields or not fields.strip():
+            return None
+
+        mapper = inspect(model)
+        tree: FieldTree = {"id": True}
+        for raw in fields.split(","):
+            path = raw.strip()
+            if not path:
+                continue
+            name, _, child = path.partition(".")
+            if name not in schema.model_fields or (
+                name not in mapper.column_attrs and name not in mapper.relationships
+            ):
+                cls._raise_unknown(path, schema, mapper)
+
+            if name not in mapper.relationships:
+                if child:
+                    cls._raise_unknown(path, schema, mapper)
+                tree[name] = True
+                continue
+
+            nested = _nested_schema(schema, name)
+            target = mapper.relationships[name].mapper
+            if not child:
+                tree[name] = True
+                continue
+            if child not in nested.model_fields or child not in target.column_attrs:
+                cls._raise_unknown(path, schema, mapper)
+            if tree.get(name) is True:  # Đã chọn cả object
+                continue
+            tree.setdefault(name, {"id": True})[child] = True
+        return cls(schema, model, tree)
+
+    @staticmethod
+    def _raise_unknown(path: str, schema: Type[BaseModel], mapper: Any) -> None:
+        allowed = [
+            name for name in schema.model_fields
+            if name in mapper.column_attrs or name in mapper.relationships
+        ]
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Trường không hợp lệ trong fields: '{path}'. Các trường cho phép: {', '.join(allowed)}",
+        )
+
+    def _nested_fields(self, name: str) -> List[str]:
+        """Danh sách trường của object lồng được chọn"""
+        selected = self.tree[name]
+        if selected is True:
+            target = inspect(self.model).relationships[name].mapper
+            return [f for f in _nested_schema(self.schema, name).model_fields if f in target.column_attrs]
+        return list(selected)
+
+    def load_options(self) -> list:
+        """
+        Loader options cho query: chỉ SELECT các cột được chọn, object lồng load bằng JOIN.
+        raiseload=True để lỡ truy cập cột không load thì báo lỗi thay vì âm thầm query thêm.
+        """
+        mapper = inspect(self.model)
+        columns = []
+        options = []
+        for name in self.tree:
+            attr = getattr(self.model, name)
+            if name in self._nested:
+                target = mapper.relationships[name].mapper.class_
+                nested_columns = [getattr(target, f) for f in self._nested[name]]
+                options.append(joinedload(attr).load_only(*nested_columns, raiseload=True))
+            else:
+                columns.append(attr)
+        return [load_only(*columns, raiseload=True), *options]
+
+    def project(self, obj: Any) -> Dict[str, Any]:
+        """Chuyển ORM object thành dict chỉ gồm các trường được chọn"""
+        row = {}
+        for name in self.tree:
+            value = getattr(obj, name)
+            if name in self._nested and value is not None:
+                value = {f: getattr(value, f) for f in self._nested[name]}
+            row[name] = value
+        return row
+
+    def project_all(self, objs: List[Any]) -> List[Dict[str, Any]]:
+        return [self.project(obj) for obj in objs]
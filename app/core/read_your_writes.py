@@ -0,0 +1,89 @@
+"""
+Read-your-writes khi dùng read replica.
+
+Replica có độ trễ replication: client vừa tạo/cập nhật dữ liệu rồi đọc lại ngay có thể không thấy thay đổi.
+- Khi request có ghi DB (session flush), response gắn cookie đánh dấu thời điểm hết "cửa sổ ghi"
+- Trong cửa sổ đó, các request đọc của client này dùng primary thay vì replica (get_read_db)
+"""
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import cookie_parser
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+
+class _RequestDbState:
+    """
+    Trạng thái DB của một request.
+    Dùng object (mutable) trong ContextVar vì endpoint sync chạy trong threadpool với bản copy của context:
+    gán lại ContextVar trong thread sẽ không thấy được ở middleware, còn sửa thuộc tính object thì thấy.
+    """
+    __slots__ = ("wrote", "prefer_primary")
+
+    def __init__(self, prefer_primary: bool = False):
+        self.wrote = False
+        self.prefer_primary = prefer_primary
+
+
+_request_state: ContextVar[Optional[_RequestDbState]] = ContextVar("request_db_state", default=None)
+
+
+def mark_write() -> None:
+    """Đánh dấu request hiện tại đã ghi DB (gọi từ session event after_flush)"""
+    state = _request_state.get()
+    if state is not None:
+        state.wrote = True
+
+
+def must_read_primary() -> bool:
+    """Request hiện tại phải đọc từ primary (client vừa ghi dữ liệu)"""
+    state = _request_state.get()
+    return state is not None and (state.prefer_primary or state.wrote)
+
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware quản lý cookie cửa sổ đọc-primary sau khi ghi"""
+
+    def __init__(self, app: ASGIApp, window_seconds: Optional[float] = None) -> None:
+        self.app = app
+        self.window_seconds = settings.read_your_writes_seconds if window_seconds is None else window_seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = _RequestDbState(prefer_primary=self._in_write_window(scope))
+        token = _request_state.set(state)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and state.wrote:
+                until = int(time.time() + self.window_seconds) + 1
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "set-cookie",
+                    f"{READ_PRIMARY_COOKIE}={until}; Max-Age={int(self.window_seconds) + 1}; Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_state.reset(token)
+
+    @staticmethod
+    def _in_write_window(scope: Scope) -> bool:
+        cookie_header = Headers(scope=scope).get("cookie")
+        if not cookie_header:
+            return False
+        value = cookie_parser(cookie_header).get(READ_PRIMARY_COOKIE)
+        try:
+            return value is not None and float(value) > time.time()
+        except ValueError:
+            return False
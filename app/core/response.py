@@ -1,5 +1,7 @@
 from typing import Generic, TypeVar, Optional, List, Dict, Any
 from pydantic import BaseModel
+from pydantic_core import to_json
+from fastapi.responses import JSONResponse
 
 T = TypeVar('T')  # Generic type cho data
 
@@ -40,4 +42,27 @@ class PaginatedResponse(ResponseBase[List[T]]):
     - data: List các items.
     - meta: Thông tin phân trang.
     """
-    meta: Optional[PaginationMeta] = None
\ No newline at end of file
+    meta: Optional[PaginationMeta] = None
+
+class CursorPaginationMeta(BaseModel):
+    """
+    Metadata cho phân trang theo cursor (keyset): không đếm tổng, trang sau không bị lệch khi có bản ghi mới.
+    """
+    limit: int  # Số bản ghi mỗi trang
+    next_cursor: Optional[str] = None  # Truyền vào query cursor để lấy trang sau, None: đã hết
+    has_more: bool = False
+
+class CursorPaginatedResponse(ResponseBase[List[T]]):
+    """
+    Response cho danh sách phân trang theo cursor, kế thừa từ ResponseBase.
+    """
+    meta: Optional[CursorPaginationMeta] = None
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse serialize bằng pydantic-core thay cho json.dumps.
+    - Hỗ trợ sẵn BaseModel, UUID, datetime, Enum nên không cần qua jsonable_encoder.
+    - Dùng làm default_response_class của app.
+    """
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
@@ -0,0 +1,77 @@
+from copy import copy
+from inspect import iscoroutinefunction
+from typing import Any, Callable
+
+from fastapi.exceptions import ResponseValidationError
+from fastapi.routing import APIRoute, get_request_handler
+from fastapi.utils import is_body_allowed_for_status_code
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+from app.core.response import FastJSONResponse, ResponseBase
+
+
+class EnvelopeRoute(APIRoute):
+    """
+    Route class cho các endpoint trả về ResponseBase/PaginatedResponse.
+    Mặc định FastAPI sẽ: dump model -> validate lại theo response_model -> serialize ra dict -> json.dumps.
+    Route này rút gọn còn:
+    - Validate một lần với response_model (bỏ qua nếu kết quả đã đúng kiểu response_model)
+    - Serialize thẳng envelope bằng pydantic-core (FastJSONResponse)
+    Endpoint sync thì validate + serialize luôn trong threadpool, không chiếm event loop.
+    """
+
+    def get_route_handler(self) -> Callable:
+        if not self._can_use_fast_path():
+            return super().get_route_handler()
+
+        # Thay endpoint bằng wrapper trả về Response -> FastAPI sẽ trả thẳng, không serialize lại
+        dependant = copy(self.dependant)
+        dependant.call = self._wrap_endpoint(self.dependant.call)
+        return get_request_handler(
+            dependant=dependant,
+            body_field=self.body_field,
+            status_code=self.status_code,
+            response_class=self.response_class,
+            response_field=None,
+            dependency_overrides_provider=self.dependency_overrides_provider,
+            embed_body_fields=self._embed_body_fields,
+        )
+
+    def _can_use_fast_path(self) -> bool:
+        """Chỉ áp dụng cho response_model là envelope và không dùng các tuỳ chọn include/exclude"""
+        model = self.response_model
+        if not (isinstance(model, type) and issubclass(model, ResponseBase)):
+            return False
+        if self.status_code is not None and not is_body_allowed_for_status_code(self.status_code):
+            return False
+        return not (
+            self.response_model_include
+            or self.response_model_exclude
+            or self.response_model_exclude_unset
+            or self.response_model_exclude_defaults
+            or self.response_model_exclude_none
+        )
+
+    def _wrap_endpoint(self, endpoint: Callable[..., Any]) -> Callable[..., Any]:
+        model = self.response_model
+        status_code = self.status_code or 200
+
+        def render(result: Any) -> Response:
+            if isinstance(result, Response):
+                return result
+            if not isinstance(result, model):
+                try:
+                    result = model.model_validate(result, from_attributes=True)
+                except ValidationError as e:
+                    raise ResponseValidationError(errors=e.errors(include_url=False), body=result)
+            return FastJSONResponse(result, status_code=status_code)
+
+        if iscoroutinefunction(endpoint):
+            async def wrapper(**kwargs):
+                return render(await endpoint(**kwargs))
+        else:
+            async def wrapper(**kwargs):
+                return await run_in_threadpool(lambda: render(endpoint(**kwargs)))
+        return wrapper
@@ -0,0 +1,74 @@
+"""
+Chạy job định kỳ trong process của app (dọn dữ liệu hết hạn, quét cảnh báo...).
+
+- Job là hàm sync, chạy trong threadpool để không chặn event loop
+- Bắt đầu/dừng theo lifespan của app (scheduler.start() / await scheduler.stop())
+- Lỗi của một lần chạy chỉ ghi log, lần sau vẫn chạy tiếp
+Khi chạy nhiều instance, mọi instance đều chạy job: job phải idempotent (DELETE ... WHERE hết hạn, UPSERT...).
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PeriodicJob:
+    name: str
+    interval_seconds: float
+    func: Callable[[], object]
+    run_on_start: bool = False
+    last_run: Optional[float] = field(default=None, init=False)
+    last_duration: Optional[float] = field(default=None, init=False)
+
+
+class Scheduler:
+    """Tập job định kỳ, mỗi job chạy trong một asyncio task riêng"""
+
+    def __init__(self):
+        self._jobs: Dict[str, PeriodicJob] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def add_job(self, name: str, interval_seconds: float, func: Callable[[], object], run_on_start: bool = False) -> None:
+        """Đăng ký job (gọi trước khi start). Đăng ký lại cùng tên sẽ thay job cũ"""
+        self._jobs[name] = PeriodicJob(name, interval_seconds, func, run_on_start)
+
+    @property
+    def jobs(self) -> List[PeriodicJob]:
+        return list(self._jobs.values())
+
+    async def run_job(self, job: PeriodicJob) -> None:
+        start = time.perf_counter()
+        try:
+            result = await run_in_threadpool(job.func)
+            logger.debug("Job %s xong: %s", job.name, result)
+        except Exception:
+            logger.exception("Job %s lỗi", job.name)
+        finally:
+            job.last_run = time.time()
+            job.last_duration = time.perf_counter() - start
+
+    async def _loop(self, job: PeriodicJob) -> None:
+        if job.run_on_start:
+            await self.run_job(job)
+        while True:
+            await asyncio.sleep(job.interval_seconds)
+            await self.run_job(job)
+
+    def start(self) -> None:
+        for job in self._jobs.values():
+            self._tasks.append(asyncio.create_task(self._loop(job), name=f"job:{job.name}"))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+
+scheduler = Scheduler()
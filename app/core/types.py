@@ -0,0 +1,49 @@
+"""
+Kiểu cột và tiện ích DDL chạy được trên cả Postgres lẫn SQLite.
+
+- UUID: uuid native trên Postgres, CHAR(32) trên SQLite/dialect khác (thay cho sqlalchemy.dialects.postgresql.UUID)
+- postgres_only(): index/constraint chỉ tạo trên Postgres (GIN trigram, partial index, exclusion constraint...).
+  Trên SQLite bị bỏ qua khi create_all, model vẫn dùng được - chỉ mất phần tối ưu hiệu năng
+"""
+import uuid
+from typing import TypeVar
+
+from sqlalchemy import DDL, MetaData, Uuid, event
+from sqlalchemy.sql.ddl import DDLElement
+from sqlalchemy.sql.schema import SchemaItem
+
+SchemaItemT = TypeVar("SchemaItemT", bound=SchemaItem)
+
+
+class UUID(Uuid):
+    """
+    UUID portable, cùng cách dùng với postgresql.UUID: Column(UUID(as_uuid=True), ...)
+    - Postgres: kiểu uuid native
+    - SQLite: CHAR(32) dạng hex
+    Nhận cả chuỗi UUID khi bind (ví dụ id lấy từ JWT) như driver Postgres.
+    """
+    cache_ok = True
+
+    def bind_processor(self, dialect):
+        processor = super().bind_processor(dialect)
+        if processor is None:
+            return None
+
+        def process(value):
+            if isinstance(value, str):
+                value = uuid.UUID(value)
+            return processor(value)
+
+        return process
+
+
+def postgres_only(item: SchemaItemT) -> SchemaItemT:
+    """Chỉ phát DDL của Index/Constraint này khi database là Postgres"""
+    item.ddl_if(dialect="postgresql")
+    return item
+
+
+def require_postgres_extension(metadata: MetaData, name: str) -> None:
+    """CREATE EXTENSION (ví dụ pg_trgm) trước khi create_all tạo bảng, bỏ qua trên dialect khác"""
+    ddl: DDLElement = DDL(f"CREATE EXTENSION IF NOT EXISTS {name}").execute_if(dialect="postgresql")
+    event.listen(metadata, "before_create", ddl)
@@ -1,22 +1,158 @@
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, event, exc, MetaData
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+from sqlalchemy.pool import QueuePool, StaticPool
+from typing import Generator, Optional
 import logging
+import time
 
 from app.core.config import settings
+from app.core.read_your_writes import mark_write, must_read_primary
+from app.monitoring.metrics import (
+    REGISTRY,
+    DB_POOL_SIZE,
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_CHECKED_IN,
+    DB_POOL_OVERFLOW,
+    DB_POOL_CHECKOUT_WAIT,
+    DB_POOL_CONNECTIONS_OPENED,
+    DB_POOL_CONNECTIONS_CLOSED,
+    DB_POOL_CONNECTIONS_INVALIDATED,
+    DB_POOL_PINGS,
+)
 
 # Tạo logger để ghi log database
 logger = logging.getLogger(__name__)
 
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool đo thời gian chờ lấy connection (metric db_pool_checkout_wait_seconds)"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+
+def instrument_pool(engine: Engine) -> None:
+    """
+    Gắn event listener cho pool:
+    - Đếm connection mở/đóng/bị huỷ (connection churn)
+    - pre_ping=idle: chỉ ping connection đã nằm rảnh trong pool lâu hơn db_pool_pre_ping_idle_seconds,
+      tránh một round-trip cho mỗi lần checkout như pool_pre_ping=True
+    """
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        DB_POOL_CONNECTIONS_OPENED.inc()
+
+    @event.listens_for(engine, "close")
+    def _on_close(dbapi_connection, connection_record):
+        DB_POOL_CONNECTIONS_CLOSED.inc()
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        DB_POOL_CONNECTIONS_INVALIDATED.inc()
+
+    if settings.db_pool_pre_ping != "idle":
+        return
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        connection_record.info["last_checkin"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        last_checkin = connection_record.info.get("last_checkin")
+        if last_checkin is None or time.monotonic() - last_checkin < settings.db_pool_pre_ping_idle_seconds:
+            return
+        DB_POOL_PINGS.inc()
+        try:
+            engine.dialect.do_ping(dbapi_connection)
+        except Exception as e:
+            # Pool sẽ huỷ connection này và thử lấy/mở connection khác
+            raise exc.DisconnectionError(f"Connection rảnh quá lâu không còn dùng được: {e}") from e
+
+
+def create_test_engine(database_url: str = "sqlite://") -> Engine:
+    """
+    Engine SQLite cho test/benchmark/chạy local không cần Postgres.
+    - sqlite:// (in-memory): StaticPool để mọi session (kể cả trong threadpool) dùng chung một database
+    - Bật kiểm tra khóa ngoại như Postgres (SQLite mặc định tắt)
+    """
+    options = {"connect_args": {"check_same_thread": False}, "echo": settings.debug}
+    if database_url in ("sqlite://", "sqlite:///:memory:"):
+        options["poolclass"] = StaticPool
+    db_engine = create_engine(database_url, **options)
+
+    @event.listens_for(db_engine, "connect")
+    def _enable_foreign_keys(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    return db_engine
+
+
+def create_db_engine(database_url: str) -> Engine:
+    """Tạo engine với cấu hình pool từ settings và gắn instrumentation"""
+    if database_url.startswith("sqlite"):
+        return create_test_engine(database_url)  # Cấu hình pool/pre-ping chỉ áp dụng cho server DB
+    db_engine = create_engine(
+        database_url,
+        echo=settings.debug,  # Log SQL queries khi debug=True
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,                   # Recycle connection sau N giây
+        pool_pre_ping=settings.db_pool_pre_ping == "always",     # Kiểm tra connection trước khi sử dụng
+        pool_use_lifo=settings.db_pool_use_lifo,
+    )
+    instrument_pool(db_engine)
+    return db_engine
+
+
+def warm_up_pool(db_engine: Engine, count: Optional[int] = None) -> int:
+    """
+    Mở sẵn connection lúc khởi động để các request đầu tiên sau deploy không phải chờ connect.
+    Lỗi kết nối chỉ ghi log, không chặn app khởi động. Trả về số connection đã mở.
+    """
+    count = settings.db_pool_size if count is None else count
+    connections = []
+    try:
+        for _ in range(count):
+            connections.append(db_engine.raw_connection())  # Giữ lại để pool phải mở connection mới
+    except Exception as e:
+        logger.warning("Warm-up pool thất bại sau %d connection: %s", len(connections), e)
+    finally:
+        for connection in connections:
+            connection.close()  # Trả về pool
+    return len(connections)
+
+
 # Tạo engine - kết nối đến database
 # echo=True để log tất cả SQL queries (chỉ dùng trong development)
-engine = create_engine(
-    settings.database_url,
-    echo=settings.debug,  # Log SQL queries khi debug=True
-    pool_pre_ping=True,   # Kiểm tra connection trước khi sử dụng
-    pool_recycle=300,     # Recycle connection sau 5 phút
-)
+engine = create_db_engine(settings.database_url)
+
+# Read replica (tuỳ chọn) cho các endpoint chỉ đọc - None nếu không cấu hình DATABASE_REPLICA_URL
+replica_engine = create_db_engine(settings.database_replica_url) if settings.database_replica_url else None
+
+
+def collect_pool_metrics() -> None:
+    """Cập nhật gauge trạng thái pool lúc scrape /metrics"""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return
+    DB_POOL_SIZE.set(pool.size())
+    DB_POOL_CHECKED_OUT.set(pool.checkedout())
+    DB_POOL_CHECKED_IN.set(pool.checkedin())
+    DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+
+REGISTRY.add_collector(collect_pool_metrics)
 
 # Tạo SessionLocal để tạo database sessions
 SessionLocal = sessionmaker(
@@ -25,6 +161,23 @@ SessionLocal = sessionmaker(
     bind=engine           # Bind với engine đã tạo
 )
 
+# Session đọc từ replica (không có replica thì dùng luôn primary)
+ReadSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    bind=replica_engine or engine,
+)
+
+# Mọi lần flush trên primary đánh dấu request đã ghi -> các lần đọc sau của client dùng primary
+event.listen(SessionLocal, "after_flush", lambda session, flush_context: mark_write())
+
+
+# INSERT/UPDATE/DELETE chạy thẳng qua session.execute (ghi hàng loạt, UPDATE có điều kiện) không qua flush
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _mark_bulk_write(orm_execute_state) -> None:
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mark_write()
+
 # Base class cho tất cả models
 Base = declarative_base()
 
@@ -36,6 +189,19 @@ def get_db():
     finally:
         db.close() # Đóng session sau khi dùng
 
+# Dependency cho các endpoint chỉ đọc (GET)
+# - Dùng replica nếu có cấu hình
+# - Dùng primary nếu client vừa ghi dữ liệu (read-your-writes) hoặc không có replica
+def get_read_db():
+    if replica_engine is None or must_read_primary():
+        db = SessionLocal()
+    else:
+        db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
 
 
 # Metadata để quản lý database schema
@@ -0,0 +1,169 @@
+"""
+Idempotency-Key cho các endpoint tạo dữ liệu (thanh toán hóa đơn, kê đơn thuốc, chỉ định dịch vụ).
+
+Client gửi header `Idempotency-Key: <uuid>` (mỗi thao tác một key, retry dùng lại key cũ):
+- Lần đầu: giữ chỗ key (IN_PROGRESS), chạy endpoint; response 2xx được lưu lại
+- Retry cùng key + cùng nội dung: trả response đã lưu (một lần lookup theo PK), không chạy lại transaction,
+  kèm header Idempotent-Replayed: true
+- Retry khi lần đầu chưa xong: 409; quá IDEMPOTENCY_LOCK_SECONDS (worker chết giữa chừng) thì retry được xử lý lại
+- Cùng key nhưng khác nội dung/người gửi: 422
+Response lỗi (4xx/5xx) không được lưu: transaction đã rollback nên client có thể retry an toàn.
+"""
+import hashlib
+from typing import Iterable, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.auth.jwt_handler import TokenExpiredError, TokenInvalidError, verify_token
+from app.core.response import ErrorResponse, FastJSONResponse
+from app.database import SessionLocal
+from app.idempotency.models import IdempotencyStatusEnum
+from app.idempotency.services import IdempotencyService
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+
+def _user_id(headers: Headers) -> str:
+    """User gửi request (từ JWT) - đưa vào hash để key của người này không trả response cho người khác"""
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return ""
+    try:
+        return str(verify_token(token).get("id", ""))
+    except (TokenExpiredError, TokenInvalidError):
+        return ""  # Endpoint sẽ tự trả 401
+
+
+def request_fingerprint(method: str, path: str, user_id: str, body: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in (method.encode(), path.encode(), user_id.encode()):
+        digest.update(part)
+        digest.update(b"\0")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def _error(status_code: int, message: str) -> FastJSONResponse:
+    return FastJSONResponse(status_code=status_code, content=ErrorResponse(message=message).model_dump())
+
+
+def _begin(key: str, endpoint: str, request_hash: str):
+    with SessionLocal() as db:
+        record, created = IdempotencyService(db).begin(key, endpoint, request_hash)
+        # Đọc các trường cần dùng trước khi đóng session
+        stored = None
+        if not created:
+            stored = (record.request_hash, record.status, record.response_status,
+                      record.response_content_type, record.response_body)
+        return created, stored
+
+
+def _complete(key: str, endpoint: str, status_code: int, content_type: Optional[str], body: bytes) -> None:
+    with SessionLocal() as db:
+        IdempotencyService(db).complete(key, endpoint, status_code, content_type, body)
+
+
+def _release(key: str, endpoint: str) -> None:
+    with SessionLocal() as db:
+        IdempotencyService(db).release(key, endpoint)
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware áp dụng Idempotency-Key cho các endpoint POST được chỉ định.
+    Đặt bên trong CompressionMiddleware để lưu body chưa nén (retry có thể khác Accept-Encoding).
+    """
+
+    def __init__(self, app: ASGIApp, paths: Iterable[str]) -> None:
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        key = headers.get(IDEMPOTENCY_KEY_HEADER)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key.strip() or len(key) > MAX_KEY_LENGTH:
+            await _error(400, f"Idempotency-Key không hợp lệ (1-{MAX_KEY_LENGTH} ký tự)")(scope, receive, send)
+            return
+
+        body = await self._read_body(receive)
+        endpoint = f"{scope['method']} {scope['path']}"
+        request_hash = request_fingerprint(scope["method"], scope["path"], _user_id(headers), body)
+
+        created, stored = await run_in_threadpool(_begin, key, endpoint, request_hash)
+        if not created:
+            await self._respond_existing(stored, request_hash, scope, receive, send)
+            return
+
+        status_code = 0
+        content_type: Optional[str] = None
+        chunks: List[bytes] = []
+
+        async def replay_receive() -> Message:
+            nonlocal body
+            if body is None:
+                return await receive()  # Sau khi đã trả body: chờ http.disconnect như bình thường
+            message = {"type": "http.request", "body": body, "more_body": False}
+            body = None
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, content_type
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                content_type = Headers(raw=message["headers"]).get("content-type")
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, send_wrapper)
+        except BaseException:
+            await run_in_threadpool(_release, key, endpoint)
+            raise
+        if 200 <= status_code < 300:
+            await run_in_threadpool(_complete, key, endpoint, status_code, content_type, b"".join(chunks))
+        else:
+            await run_in_threadpool(_release, key, endpoint)
+
+    @staticmethod
+    async def _read_body(receive: Receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    @staticmethod
+    async def _respond_existing(stored, request_hash: str, scope: Scope, receive: Receive, send: Send) -> None:
+        stored_hash, status, response_status, content_type, response_body = stored
+        if stored_hash != request_hash:
+            response = _error(422, "Idempotency-Key đã được dùng cho một request khác")
+        elif status == IdempotencyStatusEnum.IN_PROGRESS:
+            response = _error(409, "Request với Idempotency-Key này đang được xử lý, vui lòng thử lại sau")
+        else:
+            await send({
+                "type": "http.response.start",
+                "status": response_status,
+                "headers": [
+                    (b"content-type", (content_type or "application/json").encode()),
+                    (b"content-length", str(len(response_body)).encode()),
+                    (REPLAYED_HEADER.lower().encode(), b"true"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": response_body})
+            return
+        await response(scope, receive, send)
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, String, Enum
+from sqlalchemy.sql import func
+from app.database import Base
+import enum
+
+class IdempotencyStatusEnum(enum.Enum):
+    """Trạng thái xử lý của một Idempotency-Key"""
+    IN_PROGRESS = "IN_PROGRESS"   # Request đầu tiên đang chạy
+    COMPLETED = "COMPLETED"       # Đã có response lưu lại để trả cho các lần retry
+
+class IdempotencyKey(Base):
+    """Model cho bảng IDEMPOTENCY_KEY - Lưu kết quả request ghi để retry không chạy lại transaction"""
+    __tablename__ = "idempotency_keys"
+
+    # Khóa chính gộp: key do client gửi + endpoint (METHOD /path) -> tra cứu bằng một lần lookup theo PK
+    key = Column(String(255), primary_key=True)
+    endpoint = Column(String(255), primary_key=True)
+
+    request_hash = Column(String(64), nullable=False)              # sha256(method, path, user, body)
+    status = Column(Enum(IdempotencyStatusEnum), nullable=False)
+
+    # Response đã lưu (body JSON chưa nén)
+    response_status = Column(Integer)
+    response_content_type = Column(String(100))
+    response_body = Column(LargeBinary)
+
+    locked_until = Column(DateTime(timezone=True))                 # Hạn giữ chỗ khi IN_PROGRESS: quá hạn thì retry được nhận xử lý lại
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)  # Job dọn dẹp xóa theo cột này
@@ -0,0 +1,114 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from typing import Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from app.core.config import settings
+from app.database import SessionLocal
+from app.idempotency.models import IdempotencyKey, IdempotencyStatusEnum
+
+
+def _as_utc(value: datetime) -> datetime:
+    """SQLite trả datetime không có timezone -> coi là UTC"""
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+class IdempotencyService:
+    """Service class để xử lý logic liên quan đến Idempotency-Key"""
+    def __init__(self, db: Session):
+        self.db = db
+
+    def begin(self, key: str, endpoint: str, request_hash: str) -> Tuple[IdempotencyKey, bool]:
+        """
+        Giữ chỗ key cho request mới (trạng thái IN_PROGRESS, hạn giữ chỗ IDEMPOTENCY_LOCK_SECONDS).
+        Trả về (bản ghi, True) nếu request này được quyền xử lý,
+        (bản ghi đã có, False) nếu key đã được dùng - PK (key, endpoint) đảm bảo chỉ một request thắng khi chạy đồng thời.
+        Giữ chỗ quá hạn (worker chết/restart giữa request, release() không chạy) được retry cùng nội dung nhận lại.
+        """
+        now = datetime.now(timezone.utc)
+        existing = self.db.get(IdempotencyKey, (key, endpoint))
+        if existing is not None:
+            if _as_utc(existing.expires_at) > now:
+                if self._is_stale(existing, request_hash, now):
+                    return self._take_over(existing, now)
+                return existing, False
+            # Key hết hạn nhưng job dọn dẹp chưa xóa -> dùng lại như key mới
+            self.db.delete(existing)
+            self.db.flush()
+
+        record = IdempotencyKey(
+            key=key,
+            endpoint=endpoint,
+            request_hash=request_hash,
+            status=IdempotencyStatusEnum.IN_PROGRESS,
+            locked_until=now + timedelta(seconds=settings.idempotency_lock_seconds),
+            expires_at=now + timedelta(hours=settings.idempotency_ttl_hours),
+        )
+        self.db.add(record)
+        try:
+            self.db.commit()
+        except IntegrityError:
+            # Request khác cùng key vừa giữ chỗ trước
+            self.db.rollback()
+            return self.db.get(IdempotencyKey, (key, endpoint)), False
+        return record, True
+
+    @staticmethod
+    def _is_stale(record: IdempotencyKey, request_hash: str, now: datetime) -> bool:
+        """Giữ chỗ IN_PROGRESS đã quá hạn của cùng request (khác nội dung vẫn trả 422)"""
+        return (
+            record.status == IdempotencyStatusEnum.IN_PROGRESS
+            and record.request_hash == request_hash
+            and (record.locked_until is None or _as_utc(record.locked_until) <= now)
+        )
+
+    def _take_over(self, record: IdempotencyKey, now: datetime) -> Tuple[IdempotencyKey, bool]:
+        """
+        Nhận lại giữ chỗ quá hạn: UPDATE có điều kiện locked_until chưa đổi -> nhiều retry cùng lúc chỉ một request thắng.
+        Endpoint được chạy lại; nếu lần trước đã kịp commit, endpoint tự chặn (ví dụ phiên khám đã thanh toán -> 409).
+        """
+        seen = IdempotencyKey.locked_until.is_(None) if record.locked_until is None else IdempotencyKey.locked_until == record.locked_until
+        result = self.db.execute(
+            update(IdempotencyKey)
+            .where(
+                IdempotencyKey.key == record.key,
+                IdempotencyKey.endpoint == record.endpoint,
+                IdempotencyKey.status == IdempotencyStatusEnum.IN_PROGRESS,
+                seen,
+            )
+            .values(locked_until=now + timedelta(seconds=settings.idempotency_lock_seconds))
+        )
+        self.db.commit()
+        return record, result.rowcount == 1
+
+    def complete(self, key: str, endpoint: str, status_code: int, content_type: Optional[str], body: bytes) -> None:
+        """Lưu response của request đã xử lý xong để trả lại cho các lần retry"""
+        record = self.db.get(IdempotencyKey, (key, endpoint))
+        if record is None:
+            return
+        record.status = IdempotencyStatusEnum.COMPLETED
+        record.response_status = status_code
+        record.response_content_type = content_type
+        record.response_body = body
+        self.db.commit()
+
+    def release(self, key: str, endpoint: str) -> None:
+        """Bỏ giữ chỗ khi request lỗi (không có gì được commit) -> client retry sẽ chạy lại bình thường"""
+        self.db.execute(delete(IdempotencyKey).where(
+            IdempotencyKey.key == key, IdempotencyKey.endpoint == endpoint
+        ))
+        self.db.commit()
+
+    def purge_expired(self) -> int:
+        """Xóa các key đã hết hạn, trả về số bản ghi đã xóa"""
+        result = self.db.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.expires_at < datetime.now(timezone.utc))
+        )
+        self.db.commit()
+        return result.rowcount
+
+
+def purge_expired_keys() -> int:
+    """Job định kỳ: dọn Idempotency-Key hết hạn"""
+    with SessionLocal() as db:
+        return IdempotencyService(db).purge_expired()
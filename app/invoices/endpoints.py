@@ -4,14 +4,18 @@ from typing import List, Optional
 from uuid import UUID
 from datetime import date
 from app.core.dependencies import AuthCredentialDepend
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.core.authentication import protected_route
 from app.users.models import UserRoleEnum as RoleEnum
-from app.core.response import PaginationMeta, ResponseBase, PaginatedResponse
-from app.invoices.schemas import InvoiceCreate, InvoiceResponse, InvoiceFullResponse
+from app.core.response import PaginationMeta, ResponseBase, PaginatedResponse, FastJSONResponse
+from app.core.fieldsets import FieldSet, FIELDS_QUERY_DESCRIPTION
+from app.invoices.models import Invoice
+from app.invoices.schemas import InvoiceCheckout, InvoiceCreate, InvoiceDraft, InvoiceResponse, InvoiceFullResponse, InvoiceSortEnum
 from app.invoices.services import InvoiceService
+from app.core.routing import EnvelopeRoute
 
 router = APIRouter(
+    route_class=EnvelopeRoute,  # Serialize nhanh envelope ResponseBase
     prefix="/invoices",
     tags=["invoices"],
     responses={404: {"description": "Not found"}}
@@ -27,11 +31,47 @@ def create_invoice(
     """
     Tạo hóa đơn mới
     - Trả về thông tin hóa đơn vừa tạo
+    - Phiên khám đã thanh toán trả về 409
     """
     repo = InvoiceService(DB)
     db_record = repo.create_invoice(record)
     return ResponseBase(message="Hóa đơn được tạo thành công", data=db_record)
 
+@router.get("/draft/{medical_record_id}", response_model=ResponseBase[InvoiceDraft])
+def read_invoice_draft(
+    CREDENTIALS: AuthCredentialDepend,
+    medical_record_id: UUID,
+    discount_amount: float = Query(0, ge=0, description="Số tiền giảm giá"),
+    DB: Session = Depends(get_db),
+    CURRENT_USER = None,
+):
+    """
+    Xem trước hóa đơn của phiên khám (không lưu)
+    - Tiền dịch vụ/thuốc tính từ chỉ định dịch vụ và đơn thuốc trong một query tổng hợp
+    - Đọc từ primary: đơn thuốc/chỉ định thường vừa được tạo ngay trước khi thanh toán
+    """
+    repo = InvoiceService(DB)
+    draft = repo.compute_invoice_draft(medical_record_id, discount_amount)
+    return ResponseBase(message="Tính hóa đơn nháp thành công", data=draft)
+
+@router.post("/checkout", response_model=ResponseBase[InvoiceResponse], status_code=status.HTTP_201_CREATED)
+@protected_route([RoleEnum.ADMIN, RoleEnum.DOCTOR, RoleEnum.STAFF])
+def checkout_invoice(
+    CREDENTIALS: AuthCredentialDepend,
+    record: InvoiceCheckout,
+    DB: Session = Depends(get_db),
+    CURRENT_USER = None,
+):
+    """
+    Thanh toán phiên khám: server tự tính tiền và lưu hóa đơn kèm chi tiết dịch vụ/thuốc
+    - Client chỉ gửi medical_record_id (và giảm giá, ghi chú), không cần tải đơn thuốc/chỉ định dịch vụ để tự cộng
+    - Người tạo hóa đơn là user đang đăng nhập
+    - Phiên khám đã thanh toán trả về 409
+    """
+    repo = InvoiceService(DB)
+    db_record = repo.checkout(record, created_by=CURRENT_USER.id)
+    return ResponseBase(message="Hóa đơn được tạo thành công", data=db_record)
+
 # @router.post("/detail", response_model=ResponseBase[InvoiceDetailResponse], status_code=status.HTTP_201_CREATED)
 # @protected_route([RoleEnum.ADMIN, RoleEnum.DOCTOR])
 # def create_invoice_detail(
@@ -53,7 +93,7 @@ def create_invoice(
 def read_invoice(
     CREDENTIALS: AuthCredentialDepend,
     invoice_id: UUID,
-    DB: Session = Depends(get_db),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     """
@@ -69,24 +109,42 @@ def read_invoice(
 @router.get("/", response_model=PaginatedResponse[InvoiceResponse])
 def read_invoices(
     CREDENTIALS: AuthCredentialDepend,
-    # patient_id: Optional[UUID] = Query(None, description="ID bệnh nhân để lọc"),
-    # doctor_id: Optional[UUID] = Query(None, description="ID bác sĩ (user_id) để lọc"),
+    patient_id: Optional[UUID] = Query(None, description="ID bệnh nhân để lọc"),
+    doctor_id: Optional[UUID] = Query(None, description="ID bác sĩ (user_id) để lọc"),
+    from_date: Optional[date] = Query(None, description="Từ ngày tạo (YYYY-MM-DD)"),
+    to_date: Optional[date] = Query(None, description="Đến ngày tạo (YYYY-MM-DD)"),
+    min_amount: Optional[float] = Query(None, ge=0, description="Thành tiền tối thiểu"),
+    max_amount: Optional[float] = Query(None, ge=0, description="Thành tiền tối đa"),
+    sort: InvoiceSortEnum = Query(InvoiceSortEnum.CREATED_AT_DESC, description="Sắp xếp: -created_at, created_at, -final_amount, final_amount"),
     skip: int = Query(0, ge=0, description="Số bản ghi bỏ qua"),
     limit: int = Query(10, ge=1, le=100, description="Số bản ghi lấy về"),
-    DB: Session = Depends(get_db),
+    fields: Optional[str] = Query(None, description=FIELDS_QUERY_DESCRIPTION),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     """
-    Lấy danh sách hóa đơn với phân trang
+    Lấy danh sách hóa đơn với phân trang, bộ lọc và sắp xếp
     - Bất kỳ ai cũng có thể xem danh sách hóa đơn
+    - Lọc theo bệnh nhân, bác sĩ, khoảng ngày tạo, khoảng thành tiền
+    - Mặc định mới nhất trước
+    - fields: chỉ lấy các trường cần thiết (ví dụ: id,final_amount,created_at,patient.full_name)
     """
     repo = InvoiceService(DB)
-    total = repo.count_invoices()    
+    field_set = FieldSet.parse(fields, InvoiceResponse, Invoice)
+    filters = dict(
+        patient_id=patient_id, doctor_id=doctor_id,
+        from_date=from_date, to_date=to_date,
+        min_amount=min_amount, max_amount=max_amount,
+    )
+    total = repo.count_invoices(**filters)
     page = (skip // limit) + 1
     total_pages = (total // limit) + (1 if total % limit else 0)
-    records = repo.get_invoices(skip=skip, limit=limit)
+    records = repo.get_invoices(skip=skip, limit=limit, sort=sort, field_set=field_set, **filters)
     meta = PaginationMeta(total=total, page=page, limit=limit, total_pages=total_pages)
-    return PaginatedResponse(message="Lấy danh sách hóa đơn thành công", data=records, meta=meta)
+    response = PaginatedResponse(message="Lấy danh sách hóa đơn thành công", data=records, meta=meta)
+    if field_set:  # Dữ liệu đã rút gọn theo fields -> trả thẳng, không validate theo response_model đầy đủ
+        return FastJSONResponse(response)
+    return response
 
 # @router.put("/{record_id}", response_model=ResponseBase[InvoiceResponse])
 # @protected_route([RoleEnum.ADMIN, RoleEnum.DOCTOR])
@@ -1,13 +1,23 @@
-from sqlalchemy import Column, DateTime, Integer, Double, Text, ForeignKey
+from sqlalchemy import Column, DateTime, Integer, Double, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
 import uuid
-from sqlalchemy.dialects.postgresql import UUID
+from app.core.types import UUID
 
 class Invoice(Base):
     """Model cho bảng INVOICE - Hóa đơn thanh toán"""
     __tablename__ = "invoices"
+    __table_args__ = (
+        # Lịch sử hóa đơn: lọc theo bệnh nhân/bác sĩ + khoảng ngày, sắp xếp theo ngày tạo
+        Index("ix_invoices_patient_id_created_at", "patient_id", "created_at"),
+        Index("ix_invoices_doctor_id_created_at", "doctor_id", "created_at"),
+        Index("ix_invoices_created_at", "created_at"),
+        # Sắp xếp/lọc theo thành tiền
+        Index("ix_invoices_final_amount", "final_amount"),
+        # Tra hóa đơn của phiên khám (xem hóa đơn, kiểm tra đã thanh toán)
+        Index("ix_invoices_medical_record_id", "medical_record_id"),
+    )
 
     # Khóa chính
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
@@ -1,10 +1,11 @@
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, Field, validator
 from typing import Optional, List
 from datetime import datetime
 from uuid import UUID
+import enum
 
 # Import các response từ schemas khác
-from app.patients.schemas import PatientResponse
+from app.patients.schemas import PatientResponse, PatientSummary
 from app.prescriptions.schemas import PrescriptionDetailResponse
 from app.service_indications.schemas import ServiceIndicationDetailResponse
 from app.users.schemas import UserForeignKeyResponse, UserResponse
@@ -48,6 +49,40 @@ class InvoiceCreate(InvoiceBase):
     """Schema tạo Invoice mới"""
     pass
 
+class InvoiceSortEnum(str, enum.Enum):
+    """Sắp xếp danh sách hóa đơn"""
+    CREATED_AT_DESC = "-created_at"
+    CREATED_AT_ASC = "created_at"
+    FINAL_AMOUNT_DESC = "-final_amount"
+    FINAL_AMOUNT_ASC = "final_amount"
+
+class InvoiceCheckout(BaseSchema):
+    """Schema thanh toán phiên khám: tiền dịch vụ/thuốc do server tính từ chỉ định dịch vụ và đơn thuốc"""
+    medical_record_id: UUID
+    discount_amount: float = Field(0, ge=0)    # Số tiền giảm giá
+    notes: Optional[str] = None
+
+class InvoiceDraftLine(BaseSchema):
+    """Một dòng của hóa đơn nháp (dịch vụ hoặc thuốc, đã gộp theo mã)"""
+    item_id: UUID                           # ID dịch vụ / thuốc
+    name: Optional[str] = None
+    quantity: int
+    unit_price: float
+    total_price: float
+
+class InvoiceDraft(BaseSchema):
+    """Hóa đơn nháp tính từ chỉ định dịch vụ và đơn thuốc của phiên khám (chưa lưu)"""
+    medical_record_id: UUID
+    patient_id: UUID
+    doctor_id: UUID
+    service_subtotal: float
+    medication_subtotal: float
+    total_amount: float
+    discount_amount: float
+    final_amount: float
+    services: List[InvoiceDraftLine] = []
+    medications: List[InvoiceDraftLine] = []
+
 class InvoiceUpdate(BaseSchema):
     """Schema cập nhật Invoice"""
     service_subtotal: Optional[float] = None
@@ -61,7 +96,7 @@ class InvoiceResponse(InvoiceBase):
     """Schema trả về thông tin Invoice"""
     id: UUID
     created_at: datetime
-    patient: Optional[PatientResponse] = None
+    patient: Optional[PatientSummary] = None    # Bản gọn cho danh sách, chi tiết dùng PatientResponse
     doctor: Optional[UserForeignKeyResponse] = None
     created_by_user: Optional[UserForeignKeyResponse] = None
     # service_invoice_details: Optional[List["ServiceInvoiceDetailResponse"]] = None
@@ -69,6 +104,7 @@ class InvoiceResponse(InvoiceBase):
 
 class InvoiceFullResponse(InvoiceResponse):
     """Schema trả về thông tin Invoice full"""
+    patient: Optional[PatientResponse] = None
     medications: Optional[List[PrescriptionDetailResponse]] = None
     services: Optional[List[ServiceIndicationDetailResponse]] = None
 
@@ -1,73 +1,231 @@
+from collections import defaultdict
+from functools import cached_property
+from sqlalchemy import Row, func, insert, literal, select, union_all, update
 from sqlalchemy.orm import Session
 # from app.invoices.models import Prescription, PrescriptionDetail
 # from app.invoices.schemas import PrescriptionCreate, PrescriptionUpdate, PrescriptionResponse, PrescriptionDetailCreate, PrescriptionDetailUpdate, PrescriptionDetailResponse, PrescriptionFullResponse
 from uuid import UUID
-from typing import List, Optional
-from datetime import datetime
+from typing import Dict, List, Optional
+from datetime import date
 from fastapi import HTTPException
-from app.appointments.services import AppointmentService
-from app.invoices.models import Invoice
-from app.invoices.schemas import InvoiceCreate, InvoiceFullResponse
+from app.appointments.models import Appointment, AppointmentStatusEnum
+from app.invoices.models import Invoice, MedicationInvoiceDetail, ServiceInvoiceDetail
+from app.core.fieldsets import FieldSet
+from app.invoices.schemas import InvoiceCheckout, InvoiceCreate, InvoiceDraft, InvoiceDraftLine, InvoiceFullResponse, InvoiceResponse, InvoiceSortEnum
+from app.medical_records.models import MedicalRecord, MedicalRecordStatusEnum
+from app.prescriptions.models import Prescription, PrescriptionDetail
+from app.service_indications.models import ServiceIndication, ServiceIndicationDetail
 from app.patients.services import PatientService
 from app.prescriptions.services import PrescriptionService
 from app.service_indications.services import ServiceIndicationService
 from app.users.services import UserService
-from app.medications.services import MedicationService
+from app.medications.models import StockMovementTypeEnum
+from app.medications.services import ReservationService, StockService
 from app.medical_records.services import MedicalRecordService
+from app.reports.services import ReportService
+from app.realtime.events import emit_appointment, emit_invoice, emit_medical_record
+from app.appointments.waiting import track_queue_change
+from app.utils.helper import clinic_day_bounds
+
+SERVICE_LINE = "SERVICE"
+MEDICATION_LINE = "MEDICATION"
 
 class InvoiceService:
     def __init__(self, db: Session):
         self.db = db
-        self.user_service = UserService(db)
-        self.patient_service = PatientService(db)
-        self.prescription_service = PrescriptionService(db)
-        self.service_indication_service = ServiceIndicationService(db)
-        self.medication_service = MedicationService(db)
-        self.medical_record_service = MedicalRecordService(db)
-        self.appointment_service = AppointmentService(db)
+
+    # Service phụ khởi tạo khi dùng lần đầu: endpoint chỉ tạo những gì nó cần.
+    # Tất cả dùng chung session -> chung identity map, bản ghi đã load không bị query lại
+    @cached_property
+    def user_service(self) -> UserService:
+        return UserService(self.db)
+
+    @cached_property
+    def patient_service(self) -> PatientService:
+        return PatientService(self.db)
+
+    @cached_property
+    def prescription_service(self) -> PrescriptionService:
+        return PrescriptionService(self.db)
+
+    @cached_property
+    def service_indication_service(self) -> ServiceIndicationService:
+        return ServiceIndicationService(self.db)
+
+    @cached_property
+    def stock_service(self) -> StockService:
+        return StockService(self.db)
+
+    @cached_property
+    def reservation_service(self) -> ReservationService:
+        return ReservationService(self.db)
+
+    @cached_property
+    def medical_record_service(self) -> MedicalRecordService:
+        return MedicalRecordService(self.db)
+
+    @cached_property
+    def report_service(self) -> ReportService:
+        return ReportService(self.db)
     
     def create_invoice(self, invoice_in: InvoiceCreate) -> Invoice:
         """Tạo một Invoice mới và cập nhật medical_record thành PAID và trừ stock medications.
         Toàn bộ thao tác nằm trong một transaction: nếu có lỗi sẽ rollback.
         """
         try:
+            medical_record = self.medical_record_service.get_medical_record_by_id(invoice_in.medical_record_id)
+            if not medical_record:
+                raise HTTPException(status_code=404, detail="Phiên khám không tồn tại")
+            self._mark_paid(medical_record)  # Trước khi tạo hóa đơn: request thanh toán trùng dừng ở đây (409)
+
             db_invoice = Invoice(**invoice_in.model_dump())
             self.db.add(db_invoice)
             self.db.flush()  # ensure db_invoice.id available if needed
 
             # Lấy prescription liên quan tới medical_record để trừ stock
             prescription = self.prescription_service.get_prescription_by_medical_record_id(invoice_in.medical_record_id)
+            quantities: Dict[UUID, int] = defaultdict(int)
             if prescription and getattr(prescription, "medications", None):
                 for detail in prescription.medications:
-                    med = self.medication_service.get_medication_by_id(detail.medication_id)
-                    if not med:
-                        # sẽ trigger rollback
-                        raise HTTPException(status_code=404, detail=f"Thuốc với id {detail.medication_id} không tìm thấy")
-                    # Kiểm tra trường stock_quantity tồn tại và đủ
-                    if getattr(med, "stock_quantity", None) is None:
-                        raise HTTPException(status_code=400, detail=f"Medication stock information unavailable for {med.id}")
-                    if med.stock_quantity < detail.quantity:
-                        raise HTTPException(status_code=400, detail=f"Số lượng tồn kho của thuốc này không đủ {med.id}")
-                    med.stock_quantity = med.stock_quantity - detail.quantity
-                    self.db.add(med)
-
-            # Cập nhật medical_record status = "PAID"
-            medical_record = self.medical_record_service.get_medical_record_by_id(invoice_in.medical_record_id)
+                    quantities[detail.medication_id] += detail.quantity
+            self.report_service.record_invoice(db_invoice)
+            emit_invoice(self.db, db_invoice)
+            self.reservation_service.consume_for_medical_record(medical_record.id)
+            # Trừ tồn kho sau cùng: giữ khóa dòng thuốc (dòng "nóng") ngắn nhất trước khi commit
+            self._deduct_stock(db_invoice, quantities)
+
+            # Commit tất cả thay đổi cùng lúc
+            self.db.commit()
+            self.db.refresh(db_invoice)
+            return self.get_invoice_by_id(db_invoice.id)
+        except HTTPException:
+            self.db.rollback()
+            raise
+        except Exception as e:
+            self.db.rollback()
+            raise HTTPException(status_code=400, detail=f"Lỗi tạo hóa đơn: {str(e)}")
+
+    def _invoice_lines(self, medical_record_id: UUID) -> List[Row]:
+        """
+        Các dòng dịch vụ + thuốc của phiên khám trong MỘT query (UNION ALL hai GROUP BY).
+        Gộp theo mã dịch vụ/thuốc vì chi tiết hóa đơn có khóa chính (invoice_id, service_id/medication_id).
+        """
+        services = (
+            select(
+                literal(SERVICE_LINE).label("kind"),
+                ServiceIndicationDetail.service_id.label("item_id"),
+                func.max(ServiceIndicationDetail.name).label("name"),
+                func.sum(ServiceIndicationDetail.quantity).label("quantity"),
+                func.max(ServiceIndicationDetail.unit_price).label("unit_price"),
+                func.sum(ServiceIndicationDetail.total_price).label("total_price"),
+            )
+            .join(ServiceIndication, ServiceIndication.id == ServiceIndicationDetail.service_indication_id)
+            .where(ServiceIndication.medical_record_id == medical_record_id)
+            .group_by(ServiceIndicationDetail.service_id)
+        )
+        medications = (
+            select(
+                literal(MEDICATION_LINE).label("kind"),
+                PrescriptionDetail.medication_id.label("item_id"),
+                func.max(PrescriptionDetail.name).label("name"),
+                func.sum(PrescriptionDetail.quantity).label("quantity"),
+                func.max(PrescriptionDetail.unit_price).label("unit_price"),
+                func.sum(PrescriptionDetail.total_price).label("total_price"),
+            )
+            .join(Prescription, Prescription.id == PrescriptionDetail.prescription_id)
+            .where(Prescription.medical_record_id == medical_record_id)
+            .group_by(PrescriptionDetail.medication_id)
+        )
+        return self.db.execute(union_all(services, medications)).all()
+
+    def compute_invoice_draft(self, medical_record_id: UUID, discount_amount: float = 0) -> InvoiceDraft:
+        """Tính hóa đơn nháp của phiên khám từ chỉ định dịch vụ và đơn thuốc (không lưu)"""
+        medical_record = self.medical_record_service.get_medical_record_by_id(medical_record_id)
+        if not medical_record:
+            raise HTTPException(status_code=404, detail="Phiên khám không tồn tại")
+        return self._build_draft(medical_record, discount_amount)
+
+    def _build_draft(self, medical_record: MedicalRecord, discount_amount: float) -> InvoiceDraft:
+        services: List[InvoiceDraftLine] = []
+        medications: List[InvoiceDraftLine] = []
+        for row in self._invoice_lines(medical_record.id):
+            line = InvoiceDraftLine(
+                item_id=row.item_id,
+                name=row.name,
+                quantity=row.quantity or 0,
+                unit_price=row.unit_price or 0,
+                total_price=row.total_price or 0,
+            )
+            (services if row.kind == SERVICE_LINE else medications).append(line)
+
+        service_subtotal = sum(line.total_price for line in services)
+        medication_subtotal = sum(line.total_price for line in medications)
+        total_amount = service_subtotal + medication_subtotal
+        if discount_amount > total_amount:
+            raise HTTPException(status_code=400, detail="Số tiền giảm giá không được lớn hơn tổng tiền")
+        return InvoiceDraft(
+            medical_record_id=medical_record.id,
+            patient_id=medical_record.patient_id,
+            doctor_id=medical_record.doctor_id,
+            service_subtotal=service_subtotal,
+            medication_subtotal=medication_subtotal,
+            total_amount=total_amount,
+            discount_amount=discount_amount,
+            final_amount=total_amount - discount_amount,
+            services=services,
+            medications=medications,
+        )
+
+    def checkout(self, checkout_in: InvoiceCheckout, created_by: UUID) -> InvoiceFullResponse:
+        """
+        Thanh toán phiên khám, tiền do server tính (client không phải tải đơn thuốc/chỉ định dịch vụ để tự cộng):
+        - Tổng tiền lấy từ một query tổng hợp, chi tiết hóa đơn insert hàng loạt
+        - Giữ chỗ thuốc -> CONSUMED, trừ tồn kho thuốc, medical_record -> PAID, appointment -> COMPLETED, cộng vào rollup doanh thu ngày
+        Toàn bộ nằm trong một transaction.
+        """
+        try:
+            medical_record = self.medical_record_service.get_medical_record_by_id(checkout_in.medical_record_id)
             if not medical_record:
                 raise HTTPException(status_code=404, detail="Phiên khám không tồn tại")
-            medical_record.status = "PAID"
-            self.db.add(medical_record)
+            self._mark_paid(medical_record)  # Trước khi tạo hóa đơn: request thanh toán trùng dừng ở đây (409)
+            draft = self._build_draft(medical_record, checkout_in.discount_amount)
 
-            # Cập nhật appointment status = "COMPLETED"
-            appointment = self.appointment_service.get_appointment_by_id(medical_record.appointment_id)
-            if not appointment:
-                raise HTTPException(status_code=404, detail="Lịch hẹn khám không tồn tại")
-            appointment.status = "COMPLETED"
-            self.db.add(appointment)
+            db_invoice = Invoice(
+                **draft.model_dump(exclude={"services", "medications"}),
+                created_by=created_by,
+                notes=checkout_in.notes,
+            )
+            self.db.add(db_invoice)
+            self.db.flush()
 
-            # Commit tất cả thay đổi cùng lúc
+            if draft.services:
+                self.db.execute(insert(ServiceInvoiceDetail), [
+                    {
+                        "invoice_id": db_invoice.id,
+                        "service_id": line.item_id,
+                        "quantity": line.quantity,
+                        "unit_price": line.unit_price,
+                        "total_price": line.total_price,
+                    }
+                    for line in draft.services
+                ])
+            if draft.medications:
+                self.db.execute(insert(MedicationInvoiceDetail), [
+                    {
+                        "invoice_id": db_invoice.id,
+                        "medication_id": line.item_id,
+                        "quantity": line.quantity,
+                        "unit_price": line.unit_price,
+                        "total_price": line.total_price,
+                    }
+                    for line in draft.medications
+                ])
+
+            self.report_service.record_invoice(db_invoice)
+            emit_invoice(self.db, db_invoice)
+            self.reservation_service.consume_for_medical_record(medical_record.id)
+            self._deduct_stock(db_invoice, {line.item_id: line.quantity for line in draft.medications})
             self.db.commit()
-            self.db.refresh(db_invoice)
             return self.get_invoice_by_id(db_invoice.id)
         except HTTPException:
             self.db.rollback()
@@ -75,14 +233,52 @@ class InvoiceService:
         except Exception as e:
             self.db.rollback()
             raise HTTPException(status_code=400, detail=f"Lỗi tạo hóa đơn: {str(e)}")
+
+    def _deduct_stock(self, invoice: Invoice, quantities: Dict[UUID, int]) -> None:
+        """Xuất kho thuốc của hóa đơn (medication_id -> số lượng): UPDATE có điều kiện từng thuốc + ghi ledger hàng loạt"""
+        self.stock_service.apply_movements([
+            {
+                "medication_id": medication_id,
+                "movement_type": StockMovementTypeEnum.DISPENSE,
+                "quantity": -quantity,
+                "reference_id": invoice.id,
+                "created_by": invoice.created_by,
+            }
+            for medication_id, quantity in quantities.items() if quantity
+        ])
+
+    def _mark_paid(self, medical_record: MedicalRecord) -> None:
+        """
+        medical_record -> PAID, appointment của phiên khám -> COMPLETED (commit cùng hóa đơn).
+        UPDATE có điều kiện status <> PAID: hai request thanh toán cùng phiên khám chạy song song thì request sau chờ
+        khóa dòng rồi không cập nhật được dòng nào -> 409, không tạo hóa đơn / trừ kho / cộng doanh thu lần hai.
+        """
+        result = self.db.execute(
+            update(MedicalRecord)
+            .where(MedicalRecord.id == medical_record.id, MedicalRecord.status != MedicalRecordStatusEnum.PAID)
+            .values(status=MedicalRecordStatusEnum.PAID)
+        )
+        if result.rowcount == 0:
+            raise HTTPException(status_code=409, detail="Phiên khám đã được thanh toán")
+        emit_medical_record(self.db, medical_record)
+        if medical_record.appointment_id is None:
+            return  # Phiên khám không qua lịch hẹn
+        appointment = self.db.get(Appointment, medical_record.appointment_id)
+        if not appointment:
+            raise HTTPException(status_code=404, detail="Lịch hẹn khám không tồn tại")
+        appointment.status = AppointmentStatusEnum.COMPLETED
+        emit_appointment(self.db, appointment)
+        track_queue_change(self.db, appointment.doctor_id)
     
     # Lấy Invoice theo ID
     def get_invoice_by_id(self, invoice_id: UUID) -> Optional[Invoice]:
         """Lấy Invoice theo ID"""
         invoice = self.db.query(Invoice).filter(Invoice.id == invoice_id).first()
-        patient = self.patient_service.get_patient_by_id(invoice.patient_id)
-        doctor = self.user_service.get_user_by_id(invoice.doctor_id)
-        created_by = self.user_service.get_user_by_id(invoice.created_by)
+        patient = self.patient_service.get_patient_by_id(invoice.patient_id, with_clinical=True)
+        # Bác sĩ và người tạo thường trùng nhau -> lấy chung một query
+        users = self.user_service.get_users_by_ids([invoice.doctor_id, invoice.created_by])
+        doctor = users.get(invoice.doctor_id)
+        created_by = users.get(invoice.created_by)
         prescription = self.prescription_service.get_prescription_by_medical_record_id(invoice.medical_record_id)
         service_indication = self.service_indication_service.get_service_indication_by_medical_record_id(invoice.medical_record_id)
         full_invoice = InvoiceFullResponse(
@@ -101,8 +297,8 @@ class InvoiceService:
             patient=patient,
             doctor=doctor,
             created_by_user=created_by,
-            medications = prescription.medications,
-            services = service_indication.services,
+            medications = prescription.medications if prescription else [],
+            services = service_indication.services if service_indication else [],
         )
         return full_invoice
     
@@ -112,9 +308,11 @@ class InvoiceService:
         invoice = self.db.query(Invoice).filter(Invoice.medical_record_id == medical_record_id).first()
         if not invoice:
             return None
-        patient = self.patient_service.get_patient_by_id(invoice.patient_id)
-        doctor = self.user_service.get_user_by_id(invoice.doctor_id)
-        created_by = self.user_service.get_user_by_id(invoice.created_by)
+        patient = self.patient_service.get_patient_by_id(invoice.patient_id, with_clinical=True)
+        # Bác sĩ và người tạo thường trùng nhau -> lấy chung một query
+        users = self.user_service.get_users_by_ids([invoice.doctor_id, invoice.created_by])
+        doctor = users.get(invoice.doctor_id)
+        created_by = users.get(invoice.created_by)
         prescription = self.prescription_service.get_prescription_by_medical_record_id(invoice.medical_record_id)
         service_indication = self.service_indication_service.get_service_indication_by_medical_record_id(invoice.medical_record_id)
         full_invoice = InvoiceFullResponse(
@@ -133,20 +331,102 @@ class InvoiceService:
             patient=patient,
             doctor=doctor,
             created_by_user=created_by,
-            medications = prescription.medications,
-            services = service_indication.services,
+            medications = prescription.medications if prescription else [],
+            services = service_indication.services if service_indication else [],
         )
         return full_invoice
     
+    def _filtered_query(
+        self,
+        patient_id: Optional[UUID] = None,
+        doctor_id: Optional[UUID] = None,
+        from_date: Optional[date] = None,
+        to_date: Optional[date] = None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+    ):
+        """Query Invoice với các bộ lọc (dùng chung cho danh sách và đếm)"""
+        if from_date and to_date and from_date > to_date:
+            raise HTTPException(status_code=400, detail="Ngày bắt đầu phải trước hoặc bằng ngày kết thúc")
+        if min_amount is not None and max_amount is not None and min_amount > max_amount:
+            raise HTTPException(status_code=400, detail="Số tiền tối thiểu phải nhỏ hơn hoặc bằng số tiền tối đa")
+
+        query = self.db.query(Invoice)
+        # Lọc theo bệnh nhân / bác sĩ (index (patient_id, created_at) / (doctor_id, created_at))
+        if patient_id:
+            query = query.filter(Invoice.patient_id == patient_id)
+        if doctor_id:
+            query = query.filter(Invoice.doctor_id == doctor_id)
+        # Lọc theo khoảng ngày tạo (ngày theo múi giờ phòng khám như báo cáo doanh thu):
+        # so sánh trực tiếp trên cột để dùng được index
+        if from_date:
+            start_at, _ = clinic_day_bounds(from_date, from_date)
+            query = query.filter(Invoice.created_at >= start_at)
+        if to_date:
+            _, end_at = clinic_day_bounds(to_date, to_date)
+            query = query.filter(Invoice.created_at < end_at)
+        # Lọc theo thành tiền
+        if min_amount is not None:
+            query = query.filter(Invoice.final_amount >= min_amount)
+        if max_amount is not None:
+            query = query.filter(Invoice.final_amount <= max_amount)
+        return query
+
     # Lấy danh sách Invoice với phân trang
-    def get_invoices(self, skip: int = 0, limit: int = 10) -> List[Invoice]:
-        """Lấy danh sách Invoice với phân trang"""
-        return self.db.query(Invoice).offset(skip).limit(limit).all()
+    def get_invoices(
+        self,
+        skip: int = 0,
+        limit: int = 10,
+        sort: InvoiceSortEnum = InvoiceSortEnum.CREATED_AT_DESC,
+        field_set: Optional[FieldSet] = None,
+        **filters,
+    ) -> List[InvoiceResponse]:
+        """
+        Lấy danh sách Invoice với phân trang, bộ lọc (xem _filtered_query) và sắp xếp
+        - Nếu có field_set: trả về list dict chỉ gồm các trường được chọn
+        - Bệnh nhân/bác sĩ/người tạo của cả trang lấy bằng 2 query, không phụ thuộc số dòng
+        """
+        query = self._filtered_query(**filters)
+        column = Invoice.final_amount if sort in (InvoiceSortEnum.FINAL_AMOUNT_ASC, InvoiceSortEnum.FINAL_AMOUNT_DESC) else Invoice.created_at
+        if InvoiceSortEnum(sort).value.startswith("-"):
+            query = query.order_by(column.desc(), Invoice.id.desc())
+        else:
+            query = query.order_by(column.asc(), Invoice.id.asc())  # id: thứ tự ổn định khi phân trang
+
+        if field_set:
+            # Sparse fieldset: chỉ SELECT các cột được chọn, object lồng lấy bằng JOIN
+            rows = query.options(*field_set.load_options()).offset(skip).limit(limit).all()
+            return field_set.project_all(rows)
+        invoices = query.offset(skip).limit(limit).all()
+        patients = self.patient_service.get_patients_by_ids(i.patient_id for i in invoices)
+        users = self.user_service.get_users_by_ids(
+            user_id for i in invoices for user_id in (i.doctor_id, i.created_by)
+        )
+        return [
+            InvoiceResponse(
+                id=invoice.id,
+                medical_record_id=invoice.medical_record_id,
+                patient_id=invoice.patient_id,
+                doctor_id=invoice.doctor_id,
+                created_by=invoice.created_by,
+                service_subtotal=invoice.service_subtotal,
+                medication_subtotal=invoice.medication_subtotal,
+                total_amount=invoice.total_amount,
+                discount_amount=invoice.discount_amount,
+                final_amount=invoice.final_amount,
+                notes=invoice.notes,
+                created_at=invoice.created_at,
+                patient=patients.get(invoice.patient_id),
+                doctor=users.get(invoice.doctor_id),
+                created_by_user=users.get(invoice.created_by),
+            )
+            for invoice in invoices
+        ]
     
     # Đếm tổng số Invoice
-    def count_invoices(self) -> int:
-        """Đếm tổng số Invoice"""
-        return self.db.query(Invoice).count()
+    def count_invoices(self, **filters) -> int:
+        """Đếm tổng số Invoice theo cùng bộ lọc với get_invoices"""
+        return self._filtered_query(**filters).count()
     
     # Cập nhật Prescription
     # def update_invoice(self, invoice_id: UUID, invoice_in: PrescriptionUpdate) -> Optional[Prescription]:
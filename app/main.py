@@ -1,7 +1,11 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException, status
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
-from app.core.response import ErrorResponse
+from starlette.concurrency import run_in_threadpool
+from app.core.response import ErrorResponse, FastJSONResponse
+from app.core.compression import CompressionMiddleware, PrecompressedStaticFiles
+from app.core.config import settings
+from app.database import Base, engine, replica_engine, warm_up_pool
+from app.core.read_your_writes import ReadYourWritesMiddleware
 from fastapi.exceptions import RequestValidationError
 from app.core.validation_handler import validation_handler_errors_out
 from fastapi.middleware.cors import CORSMiddleware
@@ -16,26 +20,81 @@ from app.medical_records.endpoints import router as medical_records_router
 from app.prescriptions.endpoints import router as prescriptions_router
 from app.service_indications.endpoints import router as service_indications_router
 from app.invoices.endpoints import router as invoices_router
+from app.reports.endpoints import router as reports_router
+from app.realtime.endpoints import router as realtime_router
+from app.realtime.events import start_realtime, stop_realtime
+from app.monitoring.endpoints import router as monitoring_router, profiles_router
+from app.monitoring.metrics import MetricsMiddleware
+from app.monitoring.profiler import PROFILE_ID_HEADER, ProfilingMiddleware
+from app.idempotency.middleware import IDEMPOTENCY_KEY_HEADER, REPLAYED_HEADER, IdempotencyMiddleware
+from app.idempotency.services import purge_expired_keys
+from app.medications.services import compact_stock_balances, release_expired_reservations, scan_medication_alerts
+from app.appointments.services import mark_no_show_appointments, update_service_time_stats
+from app.core.scheduler import scheduler
 from app.models import *
 
-app = FastAPI(title="Skin Clinic API")  # Tạo app FastAPI với title
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Các bước chạy khi app khởi động / tắt"""
+    if engine.dialect.name == "sqlite":
+        # Chạy local/test bằng SQLite: không có migration, tạo bảng trực tiếp từ model
+        await run_in_threadpool(Base.metadata.create_all, engine)
+    if settings.db_pool_warmup:
+        await run_in_threadpool(warm_up_pool, engine)  # Mở sẵn connection DB
+        if replica_engine is not None:
+            await run_in_threadpool(warm_up_pool, replica_engine)
+    await start_realtime()  # Hub + backend phát event realtime (SSE)
+    scheduler.start()  # Job định kỳ (dọn dữ liệu hết hạn, ...)
+    yield
+    await scheduler.stop()
+    await stop_realtime()
 
-# Cấu hình CORS
+app = FastAPI(title="Skin Clinic API", default_response_class=FastJSONResponse, lifespan=lifespan)  # Tạo app FastAPI với title, serialize JSON bằng pydantic-core
+
+# Idempotency-Key cho các POST tạo dữ liệu - đặt trong CompressionMiddleware để lưu body chưa nén
+app.add_middleware(IdempotencyMiddleware, paths=["/invoices/", "/invoices/checkout", "/prescriptions/", "/service-indications/"])
+scheduler.add_job("purge_idempotency_keys", settings.idempotency_purge_interval_seconds, purge_expired_keys)
+scheduler.add_job("compact_stock_balances", settings.stock_compaction_interval_seconds, compact_stock_balances)
+scheduler.add_job("release_expired_reservations", settings.stock_reservation_sweep_interval_seconds, release_expired_reservations)
+scheduler.add_job("scan_medication_alerts", settings.medication_alert_scan_interval_seconds, scan_medication_alerts, run_on_start=True)
+scheduler.add_job("mark_no_show_appointments", settings.appointment_no_show_interval_seconds, mark_no_show_appointments, run_on_start=True)
+scheduler.add_job("update_service_time_stats", settings.service_time_stats_interval_seconds, update_service_time_stats, run_on_start=True)
+
+# Nén response JSON/text lớn theo Accept-Encoding (gzip, brotli nếu có)
+if settings.compression_enabled:
+    app.add_middleware(CompressionMiddleware)
+
+# Read-your-writes: client vừa ghi dữ liệu sẽ đọc từ primary trong một khoảng ngắn
+if replica_engine is not None:
+    app.add_middleware(ReadYourWritesMiddleware)
+
+# Profile request theo yêu cầu của admin - không đăng ký khi tắt để không tốn gì trên hot path
+if settings.profiling_enabled:
+    app.add_middleware(ProfilingMiddleware)
+
+# Đo latency theo route - bao ngoài các middleware trên, tính cả thời gian nén
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
+# Cấu hình CORS - thêm sau cùng để bao ngoài cùng: response do middleware bên trong tự trả (idempotency replay/lỗi,
+# profile, ...) cũng có header CORS
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],  # Chỉ định origin của frontend
     allow_credentials=True,  # Cho phép gửi credentials (cookies, token)
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],  # Cho phép các phương thức HTTP
-    allow_headers=["Content-Type", "Authorization"],  # Cho phép header tùy chỉnh
+    allow_headers=["Content-Type", "Authorization", "X-Profile", IDEMPOTENCY_KEY_HEADER],  # Cho phép header tùy chỉnh
+    expose_headers=[PROFILE_ID_HEADER, REPLAYED_HEADER],  # Frontend đọc được id profile / response được trả lại
 )
 
 # Mount thư mục uploads để serve static files
 # Khi truy cập /uploads/avatars/abc.jpg sẽ trả về file từ thư mục stactic/uploads/avatars/abc.jpg
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Ưu tiên file nén sẵn (.br/.gz) nếu có - tạo bằng: python -m app.core.compression static
+app.mount("/static", PrecompressedStaticFiles(directory="static"), name="static")
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=exc.status_code,
         content=ErrorResponse(message=exc.detail).model_dump()  # Sử dụng ErrorResponse
     )
@@ -44,7 +103,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     errors_out = validation_handler_errors_out(exc)
 
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content=ErrorResponse(
             message="Request Validation Error", 
@@ -55,7 +114,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 
 @app.exception_handler(Exception)  # Handler cho các error bất ngờ
 async def general_exception_handler(request: Request, exc: Exception):
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content=ErrorResponse(message="Internal server error", details=str(exc)).model_dump()
     )
@@ -72,6 +131,12 @@ app.include_router(medical_records_router) # Include routes từ medical_records
 app.include_router(prescriptions_router) # Include routes từ prescriptions
 app.include_router(service_indications_router) # Include routes từ service_indications
 app.include_router(invoices_router) # Include routes từ invoices
+app.include_router(reports_router) # Include routes từ reports
+app.include_router(realtime_router) # Include routes từ realtime (SSE)
+if settings.metrics_enabled:
+    app.include_router(monitoring_router) # /metrics cho Prometheus
+if settings.profiling_enabled:
+    app.include_router(profiles_router) # /profiles/{id} tải profile đã lưu
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Skin Clinic Backend"}
\ No newline at end of file
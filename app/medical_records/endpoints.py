@@ -4,18 +4,22 @@ from typing import List, Optional
 from uuid import UUID
 from datetime import date
 from app.core.dependencies import AuthCredentialDepend
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.core.authentication import protected_route
 from app.prescriptions.schemas import PrescriptionFullResponse
 from app.prescriptions.services import PrescriptionService
 from app.service_indications.schemas import ServiceIndicationFullResponse
 from app.service_indications.services import ServiceIndicationService
 from app.users.models import UserRoleEnum as RoleEnum
-from app.core.response import PaginationMeta, ResponseBase, PaginatedResponse
+from app.core.response import PaginationMeta, ResponseBase, PaginatedResponse, FastJSONResponse
+from app.core.fieldsets import FieldSet, FIELDS_QUERY_DESCRIPTION
+from app.medical_records.models import MedicalRecord
 from app.medical_records.schemas import MedicalRecordCreate, MedicalRecordUpdate, MedicalRecordResponse
 from app.medical_records.services import MedicalRecordService
+from app.core.routing import EnvelopeRoute
 
 router = APIRouter(
+    route_class=EnvelopeRoute,  # Serialize nhanh envelope ResponseBase
     prefix="/medical_records",
     tags=["medical_records"],
     responses={404: {"description": "Not found"}}
@@ -42,7 +46,7 @@ def create_medical_record(
 def read_medical_record_by_appointment_id(
     CREDENTIALS: AuthCredentialDepend,
     appointment_id: UUID,
-    DB: Session = Depends(get_db),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     """
@@ -59,7 +63,7 @@ def read_medical_record_by_appointment_id(
 def read_prescription_by_medical_record_id(
     CREDENTIALS: AuthCredentialDepend,
     record_id: UUID,
-    DB: Session = Depends(get_db),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     """
@@ -76,7 +80,7 @@ def read_prescription_by_medical_record_id(
 def read_service_indication_by_medical_record_id(
     CREDENTIALS: AuthCredentialDepend,
     record_id: UUID,
-    DB: Session = Depends(get_db),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     """
@@ -93,7 +97,7 @@ def read_service_indication_by_medical_record_id(
 def read_medical_record(
     CREDENTIALS: AuthCredentialDepend,
     record_id: UUID,
-    DB: Session = Depends(get_db),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     """
@@ -101,7 +105,7 @@ def read_medical_record(
     - Bất kỳ ai cũng có thể xem thông tin hồ sơ khám bệnh
     """
     repo = MedicalRecordService(DB)
-    db_record = repo.get_medical_record_by_id(record_id)
+    db_record = repo.get_medical_record_by_id(record_id, with_clinical=True)
     if db_record is None:
         raise HTTPException(status_code=404, detail="Hồ sơ khám bệnh không tồn tại")
     return ResponseBase(message="Lấy thông tin hồ sơ khám bệnh thành công", data=db_record)
@@ -113,20 +117,26 @@ def read_medical_records(
     doctor_id: Optional[UUID] = Query(None, description="ID bác sĩ (user_id) để lọc"),
     skip: int = Query(0, ge=0, description="Số bản ghi bỏ qua"),
     limit: int = Query(10, ge=1, le=100, description="Số bản ghi lấy về"),
-    DB: Session = Depends(get_db),
+    fields: Optional[str] = Query(None, description=FIELDS_QUERY_DESCRIPTION),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     """
     Lấy danh sách hồ sơ khám bệnh với phân trang
     - Bất kỳ ai cũng có thể xem danh sách hồ sơ khám bệnh
+    - fields: chỉ lấy các trường cần thiết (ví dụ: id,diagnosis,created_at,patient.full_name)
     """
     repo = MedicalRecordService(DB)
+    field_set = FieldSet.parse(fields, MedicalRecordResponse, MedicalRecord)
     total = repo.count_medical_records(patient_id=patient_id, doctor_id=doctor_id)    
     page = (skip // limit) + 1
     total_pages = (total // limit) + (1 if total % limit else 0)
-    records = repo.get_medical_records(skip=skip, limit=limit, patient_id=patient_id, doctor_id=doctor_id)
+    records = repo.get_medical_records(skip=skip, limit=limit, patient_id=patient_id, doctor_id=doctor_id, field_set=field_set)
     meta = PaginationMeta(total=total, page=page, limit=limit, total_pages=total_pages)
-    return PaginatedResponse(message="Lấy danh sách hồ sơ khám bệnh thành công", data=records, meta=meta)
+    response = PaginatedResponse(message="Lấy danh sách hồ sơ khám bệnh thành công", data=records, meta=meta)
+    if field_set:  # Dữ liệu đã rút gọn theo fields -> trả thẳng, không validate theo response_model đầy đủ
+        return FastJSONResponse(response)
+    return response
 
 @router.get("/patient/{patient_id}", response_model=PaginatedResponse[MedicalRecordResponse])
 def read_medical_records_by_patient(
@@ -134,7 +144,7 @@ def read_medical_records_by_patient(
     patient_id: UUID,
     skip: int = Query(0, ge=0, description="Số bản ghi bỏ qua"),
     limit: int = Query(10, ge=1, le=100, description="Số bản ghi lấy về"),
-    DB: Session = Depends(get_db),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     """
@@ -1,10 +1,11 @@
-from sqlalchemy import Column, DateTime, Enum, ForeignKey, Text, String
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, DateTime, Enum, ForeignKey, Index, Text, String
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from app.database import Base
 import enum
 import uuid
-from sqlalchemy.dialects.postgresql import UUID
+from app.core.types import UUID
+from app.patients.models import CLINICAL_COLUMNS_GROUP
 
 class MedicalRecordStatusEnum(enum.Enum):
     """Enum cho trạng thái hồ sơ y tế"""
@@ -21,6 +22,10 @@ class ImageTypeEnum(enum.Enum):
 class MedicalRecord(Base):
     """Model cho bảng MEDICAL_RECORD - Hồ sơ khám bệnh"""
     __tablename__ = "medical_records"
+    __table_args__ = (
+        # Lịch sử khám của bệnh nhân (timeline), mới nhất trước, phân trang theo cursor (created_at, id)
+        Index("ix_medical_records_patient_id_created_at", "patient_id", "created_at", "id"),
+    )
 
     # Khóa chính
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
@@ -28,13 +33,14 @@ class MedicalRecord(Base):
     # Khóa ngoại - không được null
     patient_id = Column(UUID(as_uuid=True), ForeignKey("patients.id"), nullable=False)
     doctor_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
-    appointment_id = Column(UUID(as_uuid=True), ForeignKey("appointments.id"))
+    appointment_id = Column(UUID(as_uuid=True), ForeignKey("appointments.id"), index=True)
     
     # Thông tin khám bệnh
-    symptoms = Column(Text)                                    # Triệu chứng
-    diagnosis = Column(Text)                                   # Chẩn đoán
+    # Các cột lâm sàng: deferred, chỉ load ở màn chi tiết/danh sách hồ sơ (undefer_group)
+    symptoms = deferred(Column(Text), group=CLINICAL_COLUMNS_GROUP)    # Triệu chứng
+    diagnosis = deferred(Column(Text), group=CLINICAL_COLUMNS_GROUP)   # Chẩn đoán
     status = Column(Enum(MedicalRecordStatusEnum), nullable=False)  # Trạng thái
-    notes = Column(Text)                                       # Ghi chú
+    notes = deferred(Column(Text), group=CLINICAL_COLUMNS_GROUP)       # Ghi chú
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, field_validator
-from typing import Optional
-from datetime import datetime
+from typing import List, Optional
+from datetime import date, datetime, time
 from uuid import UUID
 import enum
 
@@ -8,8 +8,10 @@ import enum
 from app.medical_records.models import MedicalRecordStatusEnum, ImageTypeEnum
 
 # Import các response từ schemas khác
-from app.patients.schemas import PatientForeignKeyResponse
+from app.patients.schemas import PatientSummary
 from app.users.schemas import UserForeignKeyResponse
+from app.prescriptions.schemas import PrescriptionDetailResponse
+from app.service_indications.schemas import ServiceIndicationDetailResponse
 
 class BaseSchema(BaseModel):
     """Base schema cho tất cả các schema khác"""
@@ -44,7 +46,7 @@ class MedicalRecordResponse(MedicalRecordBase):
     """Schema trả về thông tin Medical Record"""
     id: UUID
     created_at: datetime
-    patient: Optional[PatientForeignKeyResponse] = None
+    patient: Optional[PatientSummary] = None
     doctor: Optional[UserForeignKeyResponse] = None
 
 
@@ -68,4 +70,30 @@ class SkinImageUpdate(BaseSchema):
 class SkinImageResponse(SkinImageBase):
     """Schema trả về thông tin Skin Image"""
     id: UUID
-    created_at: datetime
\ No newline at end of file
+    created_at: datetime
+
+
+# ================================ PATIENT TIMELINE SCHEMAS ================================
+class TimelineInvoice(BaseSchema):
+    """Tổng tiền hóa đơn của một lần khám"""
+    id: UUID
+    total_amount: Optional[float] = None
+    discount_amount: Optional[float] = None
+    final_amount: Optional[float] = None
+    created_at: datetime
+
+class PatientTimelineVisit(BaseSchema):
+    """Một lần khám trong lịch sử của bệnh nhân: chẩn đoán, thuốc đã kê, dịch vụ đã chỉ định, hóa đơn"""
+    id: UUID                                # ID hồ sơ khám
+    created_at: datetime                    # Thời điểm khám
+    status: MedicalRecordStatusEnum
+    symptoms: Optional[str] = None
+    diagnosis: Optional[str] = None
+    notes: Optional[str] = None
+    appointment_id: Optional[UUID] = None
+    appointment_date: Optional[date] = None
+    appointment_time: Optional[time] = None
+    doctor: Optional[UserForeignKeyResponse] = None
+    medications: List[PrescriptionDetailResponse] = []      # Các dòng thuốc của mọi đơn thuốc trong lần khám
+    services: List[ServiceIndicationDetailResponse] = []    # Các dịch vụ của mọi phiếu chỉ định trong lần khám
+    invoices: List[TimelineInvoice] = []
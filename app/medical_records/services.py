@@ -1,34 +1,60 @@
-from sqlalchemy.orm import Session
+from functools import cached_property
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session, joinedload, selectinload, undefer_group
 from app.medical_records.models import MedicalRecord
-from app.medical_records.schemas import MedicalRecordCreate, MedicalRecordUpdate, MedicalRecordResponse
+from app.patients.models import CLINICAL_COLUMNS_GROUP
+from app.prescriptions.models import Prescription
+from app.service_indications.models import ServiceIndication
+from app.medical_records.schemas import MedicalRecordCreate, MedicalRecordUpdate, MedicalRecordResponse, PatientTimelineVisit
 from uuid import UUID
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime
 from fastapi import HTTPException
 from app.users.services import UserService
 from app.patients.services import PatientService
+from app.core.fieldsets import FieldSet
+from app.utils.helper import decode_cursor, encode_cursor
+from app.realtime.events import emit_medical_record
+from app.appointments.waiting import track_queue_change
 
 class MedicalRecordService:
     def __init__(self, db: Session):
         self.db = db
-        self.user_service = UserService(db)
-        self.patient_service = PatientService(db)
-    
+
+    # Service phụ khởi tạo khi dùng lần đầu: endpoint chỉ tạo những gì nó cần
+    @cached_property
+    def user_service(self) -> UserService:
+        return UserService(self.db)
+
+    @cached_property
+    def patient_service(self) -> PatientService:
+        return PatientService(self.db)
+
     def create_medical_record(self, record_in: MedicalRecordCreate) -> MedicalRecord:
         """Tạo một MedicalRecord mới"""
         db_record = MedicalRecord(**record_in.model_dump())
         self.db.add(db_record)
+        self.db.flush()  # Lấy id cho event realtime
+        emit_medical_record(self.db, db_record, "created")
+        track_queue_change(self.db, db_record.doctor_id)  # Bắt đầu khám: cập nhật hàng chờ
         self.db.commit()
         self.db.refresh(db_record)
         return db_record
 
-    def get_medical_record_by_id(self, record_id: UUID) -> Optional[MedicalRecord]:
-        """Lấy MedicalRecord theo ID"""
-        return self.db.query(MedicalRecord).filter(MedicalRecord.id == record_id).first()
+    def get_medical_record_by_id(self, record_id: UUID, with_clinical: bool = False) -> Optional[MedicalRecord]:
+        """
+        Lấy MedicalRecord theo ID
+        - with_clinical=True: load luôn symptoms/diagnosis/notes (màn chi tiết)
+        """
+        query = self.db.query(MedicalRecord)
+        if with_clinical:
+            query = query.options(undefer_group(CLINICAL_COLUMNS_GROUP))
+        return query.filter(MedicalRecord.id == record_id).first()
     
     def get_medical_record_by_appointment_id(self, appointment_id: UUID) -> Optional[MedicalRecord]:
         """Lấy MedicalRecord theo ID"""
-        return self.db.query(MedicalRecord).filter(MedicalRecord.appointment_id == appointment_id).first()
+        return self.db.query(MedicalRecord).options(undefer_group(CLINICAL_COLUMNS_GROUP))\
+            .filter(MedicalRecord.appointment_id == appointment_id).first()
     
     def get_medical_records(
         self, 
@@ -36,8 +62,12 @@ class MedicalRecordService:
         limit: int = 10,
         patient_id: Optional[UUID] = None,
         doctor_id: Optional[UUID] = None,
+        field_set: Optional[FieldSet] = None,
     ) -> List[MedicalRecord]:
-        """Lấy danh sách MedicalRecord với phân trang"""
+        """
+        Lấy danh sách MedicalRecord với phân trang
+        - Nếu có field_set: trả về list dict chỉ gồm các trường được chọn
+        """
         query = self.db.query(MedicalRecord)
 
         if patient_id:
@@ -56,11 +86,19 @@ class MedicalRecordService:
         
         # ✅ Thêm sắp xếp theo created_at giảm dần
         query = query.order_by(MedicalRecord.created_at.desc())
-        medical_records = query.offset(skip).limit(limit).all()        
+        if field_set:
+            # Sparse fieldset: chỉ SELECT các cột được chọn, object lồng lấy bằng JOIN
+            rows = query.options(*field_set.load_options()).offset(skip).limit(limit).all()
+            return field_set.project_all(rows)
+        # MedicalRecordResponse trả đủ các cột lâm sàng -> load trong cùng query
+        medical_records = query.options(undefer_group(CLINICAL_COLUMNS_GROUP)).offset(skip).limit(limit).all()        
+        # Lấy bệnh nhân/bác sĩ của cả trang bằng 2 query thay vì 2 query mỗi dòng
+        patients = self.patient_service.get_patients_by_ids(r.patient_id for r in medical_records)
+        doctors = self.user_service.get_users_by_ids(r.doctor_id for r in medical_records)
         result = []
-        for medical_record in medical_records:            
-            patient = self.patient_service.get_patient_by_id(medical_record.patient_id)
-            doctor = self.user_service.get_user_by_id(medical_record.doctor_id)
+        for medical_record in medical_records:
+            patient = patients.get(medical_record.patient_id)
+            doctor = doctors.get(medical_record.doctor_id)
             result.append(MedicalRecordResponse(
                 id=medical_record.id,
                 patient_id=medical_record.patient_id,
@@ -78,10 +116,74 @@ class MedicalRecordService:
     
     def get_medical_records_by_patient(self, patient_id: UUID, skip: int = 0, limit: int = 10) -> List[MedicalRecord]:
         """Lấy danh sách MedicalRecord theo patient_id với phân trang"""
-        return self.db.query(MedicalRecord).filter(
+        return self.db.query(MedicalRecord).options(undefer_group(CLINICAL_COLUMNS_GROUP)).filter(
             MedicalRecord.patient_id == patient_id
         ).offset(skip).limit(limit).all()
     
+    def get_patient_timeline(
+        self, patient_id: UUID, limit: int = 10, cursor: Optional[str] = None,
+    ) -> Tuple[List[PatientTimelineVisit], Optional[str]]:
+        """
+        Lịch sử khám của bệnh nhân (mới nhất trước) kèm chẩn đoán, thuốc, dịch vụ, hóa đơn; trả về (trang, cursor trang sau).
+        - Phân trang theo cursor (created_at, id) của lần khám cuối trang: trang sau không lệch khi có lần khám mới
+        - Số query cố định, không phụ thuộc số lần khám trong trang: hồ sơ + bác sĩ + lịch hẹn (JOIN),
+          đơn thuốc, dòng thuốc, phiếu chỉ định, dòng dịch vụ, hóa đơn (selectinload: mỗi quan hệ một query IN)
+        """
+        if not self.patient_service.get_patient_by_id(patient_id):
+            raise HTTPException(status_code=404, detail="Bệnh nhân không tồn tại")
+
+        query = (
+            select(MedicalRecord)
+            .options(
+                undefer_group(CLINICAL_COLUMNS_GROUP),
+                joinedload(MedicalRecord.doctor),
+                joinedload(MedicalRecord.appointment),
+                selectinload(MedicalRecord.prescriptions).selectinload(Prescription.prescription_details),
+                selectinload(MedicalRecord.service_indications).selectinload(ServiceIndication.service_indication_details),
+                selectinload(MedicalRecord.invoices),
+            )
+            .where(MedicalRecord.patient_id == patient_id)
+        )
+        if cursor:
+            created_at, record_id = decode_cursor(cursor, 2)
+            try:
+                created_at, record_id = datetime.fromisoformat(created_at), UUID(record_id)
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="Cursor không hợp lệ")
+            query = query.where(or_(
+                MedicalRecord.created_at < created_at,
+                and_(MedicalRecord.created_at == created_at, MedicalRecord.id < record_id),
+            ))
+        records = self.db.scalars(
+            query.order_by(MedicalRecord.created_at.desc(), MedicalRecord.id.desc()).limit(limit + 1)
+        ).all()
+
+        next_cursor = None
+        if len(records) > limit:
+            records = records[:limit]
+            next_cursor = encode_cursor(records[-1].created_at, records[-1].id)
+        visits = [
+            PatientTimelineVisit(
+                id=record.id,
+                created_at=record.created_at,
+                status=record.status,
+                symptoms=record.symptoms,
+                diagnosis=record.diagnosis,
+                notes=record.notes,
+                appointment_id=record.appointment_id,
+                appointment_date=record.appointment.appointment_date if record.appointment else None,
+                appointment_time=record.appointment.appointment_time if record.appointment else None,
+                doctor=record.doctor,
+                medications=[detail for prescription in record.prescriptions for detail in prescription.prescription_details],
+                services=[
+                    detail for indication in record.service_indications for detail in indication.service_indication_details
+                ],
+                invoices=record.invoices,
+            )
+            for record in records
+        ]
+        return visits, next_cursor
+
     def count_medical_records(
         self,
         patient_id: Optional[UUID] = None,
@@ -98,13 +200,15 @@ class MedicalRecordService:
         return query.count()
     
     def update_medical_record(self, record_id: UUID, record_in: MedicalRecordUpdate) -> Optional[MedicalRecord]:
-        db_record = self.get_medical_record_by_id(record_id)
+        db_record = self.get_medical_record_by_id(record_id, with_clinical=True)
         if not db_record:
             return None
 
         update_data = record_in.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_record, field, value)
+        emit_medical_record(self.db, db_record)
+        track_queue_change(self.db, db_record.doctor_id)
 
         self.db.commit()
         self.db.refresh(db_record)
@@ -4,14 +4,20 @@ from typing import List, Optional
 from uuid import UUID
 from datetime import date
 from app.core.dependencies import AuthCredentialDepend
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.core.authentication import protected_route
 from app.users.models import UserRoleEnum as RoleEnum
 from app.core.response import PaginationMeta, ResponseBase, PaginatedResponse
-from app.medications.schemas import MedicationCreate, MedicationUpdate, MedicationResponse
-from app.medications.services import MedicationService
+from app.medications.schemas import (
+    MedicationCreate, MedicationUpdate, MedicationResponse,
+    StockMovementBatchCreate, StockMovementResponse, StockLevelResponse, MedicationAlertResponse,
+)
+from app.medications.models import MedicationAlertTypeEnum
+from app.medications.services import MedicationAlertService, MedicationService, StockService
+from app.core.routing import EnvelopeRoute
 
 router = APIRouter(
+    route_class=EnvelopeRoute,  # Serialize nhanh envelope ResponseBase
     prefix="/medications",
     tags=["medications"],
     responses={404: {"description": "Not found"}}
@@ -31,14 +37,70 @@ def create_medication(
     - Trả về thông tin thuốc vừa tạo
     """
     repo = MedicationService(DB)
-    db_medication = repo.create_medication(medication)
+    db_medication = repo.create_medication(medication, created_by=CURRENT_USER.id)
     return ResponseBase(message="Thuốc được tạo thành công", data=db_medication)
 
+@router.post("/stock-movements", response_model=ResponseBase[List[StockLevelResponse]], status_code=status.HTTP_201_CREATED)
+@protected_route([RoleEnum.ADMIN])
+def create_stock_movements(
+    CREDENTIALS: AuthCredentialDepend,
+    batch: StockMovementBatchCreate,
+    DB: Session = Depends(get_db),
+    CURRENT_USER = None,
+):
+    """
+    Ghi một lô nhập kho/điều chỉnh tồn kho (ví dụ một phiếu nhập nhiều thuốc)
+    - Chỉ ADMIN mới có quyền
+    - Cả lô nằm trong một transaction: một dòng lỗi (thuốc không tồn tại, trừ quá tồn kho) thì không ghi gì
+    - Trả về tồn kho mới của các thuốc trong lô
+    """
+    repo = StockService(DB)
+    levels = repo.record_movements(batch.movements, created_by=CURRENT_USER.id)
+    data = [StockLevelResponse(medication_id=medication_id, stock_quantity=quantity) for medication_id, quantity in levels.items()]
+    return ResponseBase(message="Ghi biến động tồn kho thành công", data=data)
+
+@router.get("/alerts", response_model=ResponseBase[List[MedicationAlertResponse]])
+def read_medication_alerts(
+    CREDENTIALS: AuthCredentialDepend,
+    alert_type: Optional[MedicationAlertTypeEnum] = Query(None, description="Lọc theo loại cảnh báo"),
+    DB: Session = Depends(get_read_db),
+    CURRENT_USER = None,
+):
+    """
+    Cảnh báo thuốc sắp hết (tồn kho dưới ngưỡng, dự kiến hết theo tốc độ kê đơn gần đây)
+    - Dữ liệu từ lần quét định kỳ gần nhất (xem computed_at), không quét trực tiếp đơn thuốc
+    """
+    repo = MedicationAlertService(DB)
+    alerts = repo.get_alerts(alert_type=alert_type)
+    return ResponseBase(message="Lấy cảnh báo thuốc thành công", data=alerts)
+
+@router.get("/{medication_id}/stock-movements", response_model=PaginatedResponse[StockMovementResponse])
+@protected_route([RoleEnum.ADMIN])
+def read_stock_movements(
+    CREDENTIALS: AuthCredentialDepend,
+    medication_id: UUID,
+    skip: int = Query(0, ge=0, description="Số bản ghi bỏ qua"),
+    limit: int = Query(20, ge=1, le=100, description="Số bản ghi lấy về"),
+    DB: Session = Depends(get_read_db),
+    CURRENT_USER = None,
+):
+    """
+    Lịch sử biến động tồn kho của thuốc (mới nhất trước)
+    - Chỉ ADMIN mới có quyền
+    """
+    repo = StockService(DB)
+    movements = repo.get_movements(medication_id, skip=skip, limit=limit)
+    total = repo.count_movements(medication_id)
+    page = (skip // limit) + 1
+    total_pages = (total // limit) + (1 if total % limit else 0)
+    meta = PaginationMeta(total=total, page=page, limit=limit, total_pages=total_pages)
+    return PaginatedResponse(message="Lấy lịch sử tồn kho thành công", data=movements, meta=meta)
+
 @router.get("/{medication_id}", response_model=ResponseBase[MedicationResponse])
 def read_medication(
     CREDENTIALS: AuthCredentialDepend,
     medication_id: UUID,
-    DB: Session = Depends(get_db),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     """
@@ -49,6 +111,7 @@ def read_medication(
     db_medication = repo.get_medication_by_id(medication_id)
     if db_medication is None:
         raise HTTPException(status_code=404, detail="Thuốc không tồn tại")
+    repo.attach_available_quantity([db_medication])
     return ResponseBase(message="Lấy thông tin thuốc thành công", data=db_medication)
 
 @router.get("/", response_model=PaginatedResponse[MedicationResponse])
@@ -57,7 +120,7 @@ def read_medications(
     skip: int = Query(0, ge=0, description="Số bản ghi bỏ qua"),
     limit: int = Query(10, ge=1, le=100, description="Số bản ghi lấy về"),
     q: Optional[str] = Query(None, description="Từ khoá tìm kiếm theo tên thuốc"),
-    DB: Session = Depends(get_db),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     """
@@ -67,6 +130,7 @@ def read_medications(
     """
     repo = MedicationService(DB)
     medications = repo.get_medications(skip=skip, limit=limit, q=q)
+    repo.attach_available_quantity(medications)
     total = repo.count_medications(q=q)
     page = (skip // limit) + 1
     total_pages = (total // limit) + (1 if total % limit else 0)
@@ -88,7 +152,7 @@ def update_medication(
     - Trả về thông tin thuốc sau khi cập nhật
     """
     repo = MedicationService(DB)
-    db_medication = repo.update_medication(medication_id, medication)
+    db_medication = repo.update_medication(medication_id, medication, created_by=CURRENT_USER.id)
     if db_medication is None:
         raise HTTPException(status_code=404, detail="Thuốc không tồn tại")
     return ResponseBase(message="Cập nhật thông tin thuốc thành công", data=db_medication)
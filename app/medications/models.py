@@ -1,9 +1,30 @@
-from sqlalchemy import Column, String, DateTime, Integer, Double
+from sqlalchemy import BigInteger, Column, String, DateTime, Enum, ForeignKey, Index, Integer, Double
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
+import enum
 import uuid
-from sqlalchemy.dialects.postgresql import UUID
+from app.core.types import UUID
+
+# Khóa tăng dần cho bảng ledger: BIGINT trên Postgres, INTEGER trên SQLite (để là rowid tự tăng)
+LedgerId = BigInteger().with_variant(Integer, "sqlite")
+
+class StockReservationStatusEnum(enum.Enum):
+    """Enum cho trạng thái giữ chỗ tồn kho"""
+    ACTIVE = "ACTIVE"           # Đang giữ chỗ (đã kê đơn, chưa thanh toán)
+    CONSUMED = "CONSUMED"       # Đã xuất thuốc theo hóa đơn
+    RELEASED = "RELEASED"       # Đã trả lại (hết hạn, sửa đơn)
+
+class MedicationAlertTypeEnum(enum.Enum):
+    """Enum cho loại cảnh báo thuốc"""
+    LOW_STOCK = "LOW_STOCK"     # Tồn kho khả dụng dưới ngưỡng
+    RUN_OUT = "RUN_OUT"         # Dự kiến hết thuốc trong vài ngày tới theo tốc độ kê đơn gần đây
+
+class StockMovementTypeEnum(enum.Enum):
+    """Enum cho loại biến động tồn kho"""
+    RECEIPT = "RECEIPT"         # Nhập kho
+    DISPENSE = "DISPENSE"       # Xuất thuốc theo hóa đơn
+    ADJUSTMENT = "ADJUSTMENT"   # Điều chỉnh (kiểm kê, hư hỏng, số dư đầu kỳ)
 
 class Medication(Base):
     """Model cho bảng MEDICATION - Quản lý thuốc"""
@@ -17,6 +38,7 @@ class Medication(Base):
     dosage_form = Column(String, nullable=False)      # Dạng thuốc (Viên, Chai, Tuýp, v.v.)
     price = Column(Double, nullable=False)            # Giá bán
     stock_quantity = Column(Integer, nullable=False)  # Số lượng tồn kho
+    low_stock_threshold = Column(Integer)             # Ngưỡng cảnh báo sắp hết (NULL: dùng ngưỡng mặc định)
     
     # Thông tin bổ sung
     description = Column(String)                      # Mô tả thuốc
@@ -28,3 +50,95 @@ class Medication(Base):
     # Relationships
     prescription_details = relationship("PrescriptionDetail", back_populates="medication")  # Danh sách chi tiết đơn thuốc.
     medication_invoice_details = relationship("MedicationInvoiceDetail", back_populates="medication")   # Danh sách chi tiết hóa đơn tiền thuốc.
+
+
+class StockMovement(Base):
+    """
+    Model cho bảng STOCK_MOVEMENT - Sổ biến động tồn kho (chỉ thêm, không sửa/xóa).
+    Tồn kho = tổng quantity (+ nhập, - xuất) của thuốc; medications.stock_quantity là bản denormalize để đọc nhanh.
+    """
+    __tablename__ = "stock_movements"
+    __table_args__ = (
+        # Lịch sử theo thuốc + cộng phần đuôi ledger sau snapshot (id > last_movement_id)
+        Index("ix_stock_movements_medication_id_id", "medication_id", "id"),
+    )
+
+    # Khóa chính tăng dần: thứ tự ghi, dùng làm mốc cho snapshot
+    id = Column(LedgerId, primary_key=True, autoincrement=True)
+
+    # Khóa ngoại
+    medication_id = Column(UUID(as_uuid=True), ForeignKey("medications.id"), nullable=False)
+    created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"))
+
+    # Thông tin biến động
+    movement_type = Column(Enum(StockMovementTypeEnum), nullable=False)
+    quantity = Column(Integer, nullable=False)        # Số lượng thay đổi (+ nhập, - xuất)
+    reference_id = Column(UUID(as_uuid=True))         # Chứng từ liên quan (ví dụ ID hóa đơn)
+    note = Column(String)                             # Ghi chú
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class MedicationStockBalance(Base):
+    """
+    Model cho bảng MEDICATION_STOCK_BALANCE - Snapshot tồn kho theo ledger, được job định kỳ gộp dần.
+    Tồn kho hiện tại = quantity + tổng các movement có id > last_movement_id.
+    """
+    __tablename__ = "medication_stock_balances"
+
+    medication_id = Column(UUID(as_uuid=True), ForeignKey("medications.id"), primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)            # Tồn kho tính đến last_movement_id
+    last_movement_id = Column(LedgerId, nullable=False, default=0)   # Movement cuối cùng đã gộp
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+
+class StockReservation(Base):
+    """
+    Model cho bảng STOCK_RESERVATION - Giữ chỗ tồn kho khi kê đơn.
+    Tồn kho khả dụng = stock_quantity - tổng giữ chỗ ACTIVE; hóa đơn chuyển giữ chỗ thành CONSUMED,
+    job dọn dẹp trả lại (RELEASED) các giữ chỗ quá hạn.
+    """
+    __tablename__ = "stock_reservations"
+    __table_args__ = (
+        # Kiểm tra tồn kho khả dụng khi kê đơn / tổng giữ chỗ theo thuốc
+        Index("ix_stock_reservations_medication_id_status", "medication_id", "status"),
+        # Job dọn giữ chỗ quá hạn
+        Index("ix_stock_reservations_status_expires_at", "status", "expires_at"),
+    )
+
+    # Khóa chính
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    # Khóa ngoại
+    medication_id = Column(UUID(as_uuid=True), ForeignKey("medications.id"), nullable=False)
+    prescription_id = Column(UUID(as_uuid=True), ForeignKey("prescriptions.id"), nullable=False, index=True)
+
+    # Thông tin giữ chỗ
+    quantity = Column(Integer, nullable=False)                                  # Số lượng giữ chỗ
+    status = Column(Enum(StockReservationStatusEnum), nullable=False)           # Trạng thái
+    expires_at = Column(DateTime(timezone=True), nullable=False)                # Hết hạn giữ chỗ
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class MedicationAlert(Base):
+    """
+    Model cho bảng MEDICATION_ALERT - Cảnh báo thuốc sắp hết, do job quét định kỳ tính sẵn.
+    Mỗi lần quét thay toàn bộ nội dung bảng; /medications/alerts chỉ đọc bảng này.
+    """
+    __tablename__ = "medication_alerts"
+
+    # Khóa chính kép: thuốc + loại cảnh báo
+    medication_id = Column(UUID(as_uuid=True), ForeignKey("medications.id"), primary_key=True)
+    alert_type = Column(Enum(MedicationAlertTypeEnum), primary_key=True)
+
+    # Số liệu lúc quét
+    available_quantity = Column(Integer, nullable=False)        # Tồn kho khả dụng (trừ giữ chỗ)
+    threshold = Column(Integer, nullable=False)                 # Ngưỡng cảnh báo áp dụng
+    daily_usage = Column(Double, nullable=False, default=0)     # Lượng kê đơn trung bình mỗi ngày
+    days_remaining = Column(Double)                             # Số ngày dự kiến còn đủ thuốc (NULL: không có kê đơn)
+
+    # Timestamps
+    computed_at = Column(DateTime(timezone=True), nullable=False)
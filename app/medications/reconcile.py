@@ -0,0 +1,147 @@
+"""
+Đối soát ledger tồn kho thuốc (stock_movements) với medications.stock_quantity và snapshot.
+
+Với mỗi thuốc kiểm tra:
+- Tổng ledger == medications.stock_quantity            (lệch: có chỗ sửa tồn kho không qua ledger)
+- Snapshot == tổng ledger đến snapshot.last_movement_id (lệch: snapshot bị gộp sai/trùng)
+
+Toàn bộ ledger được cộng bằng MỘT query GROUP BY (đọc tuần tự, kết quả stream theo lô),
+chạy được trên database lớn mà không load ledger vào bộ nhớ.
+
+Chạy:
+    python -m app.medications.reconcile
+    python -m app.medications.reconcile --open-missing     # Thuốc chưa có ledger: ghi số dư đầu kỳ = stock_quantity
+    python -m app.medications.reconcile --fix-snapshots    # Tính lại snapshot lệch từ ledger
+Exit code 1 nếu còn chênh lệch chưa xử lý.
+"""
+import argparse
+import sys
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+from uuid import UUID
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+
+import app.models  # noqa: F401  - đăng ký toàn bộ model
+from app.database import SessionLocal
+from app.medications.models import Medication, MedicationStockBalance, StockMovement, StockMovementTypeEnum
+from app.medications.services import StockService
+
+BATCH_SIZE = 1000
+
+
+@dataclass
+class StockDiscrepancy:
+    medication_id: UUID
+    name: str
+    stock_quantity: int
+    ledger_quantity: Optional[int]      # None: thuốc chưa có dòng ledger nào
+    snapshot_quantity: Optional[int]
+    snapshot_expected: Optional[int]    # Tổng ledger đến last_movement_id của snapshot
+
+    @property
+    def ledger_mismatch(self) -> bool:
+        return (self.ledger_quantity or 0) != self.stock_quantity
+
+    @property
+    def snapshot_mismatch(self) -> bool:
+        return self.snapshot_quantity is not None and self.snapshot_quantity != self.snapshot_expected
+
+
+def find_discrepancies(db: Session) -> Iterator[StockDiscrepancy]:
+    """Thuốc có ledger hoặc snapshot không khớp (stream, không load toàn bộ)"""
+    last_id = func.coalesce(MedicationStockBalance.last_movement_id, 0)
+    ledger = (
+        select(
+            StockMovement.medication_id,
+            func.sum(StockMovement.quantity).label("total"),
+            func.sum(case((StockMovement.id <= last_id, StockMovement.quantity), else_=0)).label("folded"),
+        )
+        .outerjoin(MedicationStockBalance, MedicationStockBalance.medication_id == StockMovement.medication_id)
+        .group_by(StockMovement.medication_id)
+        .subquery()
+    )
+    query = (
+        select(
+            Medication.id, Medication.name, Medication.stock_quantity,
+            ledger.c.total, ledger.c.folded, MedicationStockBalance.quantity,
+        )
+        .outerjoin(ledger, ledger.c.medication_id == Medication.id)
+        .outerjoin(MedicationStockBalance, MedicationStockBalance.medication_id == Medication.id)
+        .execution_options(yield_per=BATCH_SIZE)
+    )
+    for row in db.execute(query):
+        item = StockDiscrepancy(
+            medication_id=row[0], name=row[1], stock_quantity=row[2],
+            ledger_quantity=row[3], snapshot_expected=row[4] or 0, snapshot_quantity=row[5],
+        )
+        if item.ledger_mismatch or item.snapshot_mismatch:
+            yield item
+
+
+def open_missing_ledgers(db: Session, items: List[StockDiscrepancy]) -> int:
+    """Ghi số dư đầu kỳ (ADJUSTMENT = stock_quantity) cho thuốc chưa có ledger, trả về số dòng đã ghi"""
+    movements = [
+        {
+            "medication_id": item.medication_id,
+            "movement_type": StockMovementTypeEnum.ADJUSTMENT,
+            "quantity": item.stock_quantity,
+            "note": "Số dư đầu kỳ",
+        }
+        for item in items if item.ledger_quantity is None and item.stock_quantity
+    ]
+    stock_service = StockService(db)
+    for start in range(0, len(movements), BATCH_SIZE):
+        stock_service.append_movements(movements[start:start + BATCH_SIZE])
+    db.commit()
+    return len(movements)
+
+
+def fix_snapshots(db: Session, items: List[StockDiscrepancy]) -> int:
+    """Đặt lại snapshot lệch bằng tổng ledger đến last_movement_id của nó"""
+    fixed = 0
+    for item in items:
+        if item.snapshot_mismatch:
+            db.execute(
+                update(MedicationStockBalance)
+                .where(MedicationStockBalance.medication_id == item.medication_id)
+                .values(quantity=item.snapshot_expected)
+            )
+            fixed += 1
+    db.commit()
+    return fixed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--open-missing", action="store_true", help="Ghi số dư đầu kỳ cho thuốc chưa có ledger")
+    parser.add_argument("--fix-snapshots", action="store_true", help="Tính lại snapshot lệch từ ledger")
+    parser.add_argument("--limit", type=int, default=50, help="Số dòng chênh lệch tối đa in ra")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        items = list(find_discrepancies(db))
+        for item in items[:args.limit]:
+            print(
+                f"{item.medication_id}  {item.name[:30]:30}  stock={item.stock_quantity}  "
+                f"ledger={'-' if item.ledger_quantity is None else item.ledger_quantity}  "
+                f"snapshot={'-' if item.snapshot_quantity is None else item.snapshot_quantity}"
+                f"{'' if not item.snapshot_mismatch else f' (đúng: {item.snapshot_expected})'}"
+            )
+        if len(items) > args.limit:
+            print(f"... và {len(items) - args.limit} thuốc khác")
+
+        if args.open_missing:
+            print(f"Đã ghi số dư đầu kỳ cho {open_missing_ledgers(db, items)} thuốc")
+        if args.fix_snapshots:
+            print(f"Đã tính lại snapshot cho {fix_snapshots(db, items)} thuốc")
+        if args.open_missing or args.fix_snapshots:
+            items = list(find_discrepancies(db))
+
+    print(f"Chênh lệch: {len(items)} thuốc")
+    sys.exit(1 if items else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Tổng số lượng thuốc đang được giữ chỗ (reservation ACTIVE), giữ trong bộ nhớ process.
+
+Đọc tồn kho khả dụng (stock_quantity - đang giữ chỗ) không phải SUM bảng stock_reservations mỗi request:
+- Load một lần (GROUP BY) ở lần đọc đầu tiên
+- Thay đổi giữ chỗ được ghi vào session.info và chỉ cộng vào bộ đếm SAU KHI commit (rollback thì bỏ)
+- Job dọn giữ chỗ quá hạn nạp lại toàn bộ từ database mỗi lần chạy: sửa lệch do instance khác thay đổi giữ chỗ
+Bộ đếm chỉ dùng để ĐỌC; kiểm tra khi giữ chỗ vẫn dựa trên database (khóa dòng thuốc).
+"""
+import threading
+from collections import defaultdict
+from typing import Dict
+from uuid import UUID
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from app.medications.models import StockReservation, StockReservationStatusEnum
+
+_PENDING_KEY = "reserved_stock_deltas"
+
+
+class ReservedStockCounter:
+    """medication_id -> tổng số lượng đang giữ chỗ"""
+
+    def __init__(self):
+        self._reserved: Dict[UUID, int] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def ensure_loaded(self, db: Session) -> None:
+        if not self._loaded:
+            self.reload(db)
+
+    def reload(self, db: Session) -> None:
+        """Nạp lại toàn bộ từ database"""
+        totals = dict(db.execute(
+            select(StockReservation.medication_id, func.sum(StockReservation.quantity))
+            .where(StockReservation.status == StockReservationStatusEnum.ACTIVE)
+            .group_by(StockReservation.medication_id)
+        ).all())
+        with self._lock:
+            self._reserved = totals
+            self._loaded = True
+
+    def get(self, medication_id: UUID) -> int:
+        return self._reserved.get(medication_id, 0)
+
+    def add(self, deltas: Dict[UUID, int]) -> None:
+        if not self._loaded:
+            return  # Chưa load: lần đọc đầu tiên sẽ lấy số liệu đã commit từ database
+        with self._lock:
+            for medication_id, delta in deltas.items():
+                total = self._reserved.get(medication_id, 0) + delta
+                if total > 0:
+                    self._reserved[medication_id] = total
+                else:
+                    self._reserved.pop(medication_id, None)
+
+
+reserved_stock = ReservedStockCounter()
+
+
+def track_reserved_change(db: Session, medication_id: UUID, delta: int) -> None:
+    """Ghi nhận thay đổi giữ chỗ trong transaction hiện tại (áp dụng vào bộ đếm khi commit)"""
+    pending = db.info.setdefault(_PENDING_KEY, defaultdict(int))
+    pending[medication_id] += delta
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        reserved_stock.add(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
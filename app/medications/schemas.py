@@ -1,8 +1,10 @@
-from pydantic import BaseModel, Field, field_validator
-from typing import Optional
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import List, Optional
 from datetime import datetime
 from uuid import UUID
 
+from app.medications.models import MedicationAlertTypeEnum, StockMovementTypeEnum
+
 # Import validators
 from app.medications.validators import (
     validate_price,
@@ -23,6 +25,7 @@ class MedicationBase(BaseSchema):
     dosage_form: str = Field(min_length=2, max_length=50)                        # Dạng thuốc (bắt buộc)
     price: float                            # Giá (bắt buộc)
     stock_quantity: int                     # Số lượng tồn kho (bắt buộc)
+    low_stock_threshold: Optional[int] = Field(ge=0, default=None)        # Ngưỡng cảnh báo sắp hết
     description: Optional[str] = Field(max_length=250, default=None)       # Mô tả
 
     @field_validator("price")
@@ -46,6 +49,7 @@ class MedicationUpdate(BaseSchema):
     dosage_form: Optional[str] = Field(min_length=2, max_length=50, default=None)
     price: Optional[float] = None
     stock_quantity: Optional[int] = None
+    low_stock_threshold: Optional[int] = Field(ge=0, default=None)
     description: Optional[str] = Field(max_length=250, default=None)
 
     @field_validator("price")
@@ -61,5 +65,58 @@ class MedicationUpdate(BaseSchema):
 class MedicationResponse(MedicationBase):
     """Schema trả về thông tin Medication"""
     id: UUID
+    available_quantity: Optional[int] = None    # Tồn kho trừ phần đang giữ chỗ cho đơn thuốc chưa thanh toán
     created_at: datetime
     deleted_at: Optional[datetime] = None
+
+
+# ================================ STOCK MOVEMENT SCHEMAS ================================
+class StockMovementCreate(BaseSchema):
+    """Schema ghi một biến động tồn kho (xuất thuốc chỉ được ghi qua hóa đơn)"""
+    medication_id: UUID
+    movement_type: StockMovementTypeEnum = Field(StockMovementTypeEnum.RECEIPT, validate_default=True)
+    quantity: int                           # Nhập kho: số dương; điều chỉnh: âm hoặc dương
+    note: Optional[str] = Field(max_length=250, default=None)
+
+    @model_validator(mode="after")
+    def _check_quantity(self):
+        if self.movement_type == StockMovementTypeEnum.DISPENSE.value:
+            raise ValueError("Xuất thuốc chỉ được ghi qua hóa đơn")
+        if self.quantity == 0:
+            raise ValueError("Số lượng thay đổi phải khác 0")
+        if self.movement_type == StockMovementTypeEnum.RECEIPT.value and self.quantity < 0:
+            raise ValueError("Số lượng nhập kho phải là số dương")
+        return self
+
+class StockMovementBatchCreate(BaseSchema):
+    """Schema ghi nhiều biến động tồn kho cùng lúc (ví dụ một phiếu nhập kho)"""
+    movements: List[StockMovementCreate] = Field(min_length=1, max_length=1000)
+
+class StockMovementResponse(BaseSchema):
+    """Schema trả về một biến động tồn kho"""
+    id: int
+    medication_id: UUID
+    movement_type: StockMovementTypeEnum
+    quantity: int
+    reference_id: Optional[UUID] = None
+    note: Optional[str] = None
+    created_by: Optional[UUID] = None
+    created_at: datetime
+
+class StockLevelResponse(BaseSchema):
+    """Schema trả về tồn kho của thuốc"""
+    medication_id: UUID
+    stock_quantity: int                     # Tồn kho hiện tại
+
+
+# ================================ ALERT SCHEMAS ================================
+class MedicationAlertResponse(BaseSchema):
+    """Schema trả về cảnh báo thuốc sắp hết"""
+    medication_id: UUID
+    name: str                               # Tên thuốc
+    alert_type: MedicationAlertTypeEnum
+    available_quantity: int                 # Tồn kho khả dụng lúc quét
+    threshold: int                          # Ngưỡng cảnh báo
+    daily_usage: float                      # Lượng kê đơn trung bình mỗi ngày
+    days_remaining: Optional[float] = None  # Số ngày dự kiến còn đủ thuốc
+    computed_at: datetime
@@ -1,18 +1,46 @@
 from sqlalchemy.orm import Session
-from app.medications.models import Medication
-from app.medications.schemas import MedicationCreate, MedicationUpdate, MedicationResponse
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from collections import defaultdict
+from functools import cached_property
+from fastapi import HTTPException
+from app.core.config import settings
+from app.database import SessionLocal
+from app.medications.models import (
+    Medication, MedicationAlert, MedicationAlertTypeEnum, MedicationStockBalance, StockMovement,
+    StockMovementTypeEnum, StockReservation, StockReservationStatusEnum,
+)
+from app.medications.reservations import reserved_stock, track_reserved_change
+from app.prescriptions.models import Prescription, PrescriptionDetail
+from app.medications.schemas import (
+    MedicationAlertResponse, MedicationCreate, MedicationUpdate, MedicationResponse, StockMovementCreate,
+)
 from uuid import UUID
-from typing import List, Optional
-from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+from datetime import datetime, timedelta, timezone
+from app.utils.helper import get_many_by_ids
 
 class MedicationService:
     def __init__(self, db: Session):
         self.db = db
+
+    @cached_property
+    def stock_service(self) -> "StockService":
+        """Service phụ khởi tạo khi dùng lần đầu"""
+        return StockService(self.db)
     
-    def create_medication(self, medication_in: MedicationCreate) -> Medication:
-        """Tạo một Medication mới"""
+    def create_medication(self, medication_in: MedicationCreate, created_by: Optional[UUID] = None) -> Medication:
+        """Tạo một Medication mới, tồn kho ban đầu được ghi vào ledger như một lần nhập kho"""
         db_medication = Medication(**medication_in.model_dump())
         self.db.add(db_medication)
+        self.db.flush()
+        if db_medication.stock_quantity:
+            self.stock_service.append_movements([{
+                "medication_id": db_medication.id,
+                "movement_type": StockMovementTypeEnum.RECEIPT,
+                "quantity": db_medication.stock_quantity,
+                "note": "Tồn kho ban đầu",
+                "created_by": created_by,
+            }])
         self.db.commit()
         self.db.refresh(db_medication)
         return db_medication
@@ -20,7 +48,17 @@ class MedicationService:
     def get_medication_by_id(self, medication_id: UUID) -> Optional[Medication]:
         """Lấy Medication theo ID"""
         return self.db.query(Medication).filter(Medication.id == medication_id).first()
-    
+
+    def get_medications_by_ids(self, medication_ids: Iterable[UUID]) -> Dict[UUID, Medication]:
+        """Lấy nhiều Medication theo ID trong một query (bỏ qua bản ghi đã có trong session)"""
+        return get_many_by_ids(self.db, Medication, medication_ids)
+
+    def attach_available_quantity(self, medications: Iterable[Medication]) -> None:
+        """Gắn available_quantity (tồn kho trừ phần đang giữ chỗ) lấy từ bộ đếm trong bộ nhớ, không query giữ chỗ"""
+        reserved_stock.ensure_loaded(self.db)
+        for medication in medications:
+            medication.available_quantity = medication.stock_quantity - reserved_stock.get(medication.id)
+
     def get_medications(self, skip: int = 0, limit: int = 10, q: Optional[str] = None) -> List[Medication]:
         """Lấy danh sách Medication với phân trang và hỗ trợ tìm kiếm"""
         query = self.db.query(Medication).filter(
@@ -44,15 +82,32 @@ class MedicationService:
             )
         return query.count()
 
-    def update_medication(self, medication_id: UUID, medication_in: MedicationUpdate) -> Optional[Medication]:
+    def update_medication(
+        self, medication_id: UUID, medication_in: MedicationUpdate, created_by: Optional[UUID] = None
+    ) -> Optional[Medication]:
         db_medication = self.get_medication_by_id(medication_id)
         if not db_medication:
             return None
 
         update_data = medication_in.dict(exclude_unset=True)
+        stock_quantity = update_data.pop("stock_quantity", None)
         for field, value in update_data.items():
             setattr(db_medication, field, value)
 
+        if stock_quantity is not None:
+            # Đặt tồn kho tuyệt đối = điều chỉnh kiểm kê: khóa dòng để tính chênh lệch đúng khi đang có xuất thuốc
+            current = self.db.execute(
+                select(Medication.stock_quantity).where(Medication.id == medication_id).with_for_update()
+            ).scalar_one()
+            if stock_quantity != current:
+                self.stock_service.apply_movements([{
+                    "medication_id": medication_id,
+                    "movement_type": StockMovementTypeEnum.ADJUSTMENT,
+                    "quantity": stock_quantity - current,
+                    "note": "Cập nhật tồn kho",
+                    "created_by": created_by,
+                }])
+
         self.db.commit()
         self.db.refresh(db_medication)
         return db_medication
@@ -65,3 +120,339 @@ class MedicationService:
         self.db.commit()
         return True
 
+
+class StockService:
+    """
+    Sổ biến động tồn kho (ledger chỉ thêm) + snapshot tồn kho.
+    - Mọi thay đổi tồn kho đi qua apply_movements(): UPDATE có điều kiện trên medications.stock_quantity
+      (không đọc-sửa-ghi, khóa dòng ngắn nhất có thể) + ghi ledger hàng loạt trong cùng transaction
+    - Snapshot medication_stock_balances được job compact_stock_balances gộp dần,
+      tồn kho theo ledger = snapshot + phần đuôi ledger sau snapshot (đọc bằng index (medication_id, id))
+    """
+    def __init__(self, db: Session):
+        self.db = db
+
+    def append_movements(self, movements: List[Dict[str, Any]]) -> None:
+        """Ghi nhiều movement bằng một INSERT executemany (không commit)"""
+        if movements:
+            self.db.execute(insert(StockMovement), movements)
+
+    def apply_movements(self, movements: List[Dict[str, Any]], allow_negative: bool = False) -> None:
+        """
+        Áp dụng các movement vào tồn kho và ghi ledger (không commit, rollback theo transaction gọi).
+        Thuốc bị trừ quá tồn kho -> 400 (trừ khi allow_negative), thuốc không tồn tại -> 404.
+        """
+        deltas: Dict[UUID, int] = defaultdict(int)
+        for movement in movements:
+            deltas[movement["medication_id"]] += movement["quantity"]
+        # Cập nhật theo thứ tự id cố định để các transaction đồng thời không deadlock
+        for medication_id in sorted(deltas, key=str):
+            delta = deltas[medication_id]
+            stmt = update(Medication).where(Medication.id == medication_id)
+            if delta < 0 and not allow_negative:
+                stmt = stmt.where(Medication.stock_quantity >= -delta)
+            result = self.db.execute(stmt.values(stock_quantity=Medication.stock_quantity + delta))
+            if result.rowcount == 0:
+                if self.db.get(Medication, medication_id) is None:
+                    raise HTTPException(status_code=404, detail=f"Thuốc với id {medication_id} không tìm thấy")
+                raise HTTPException(status_code=400, detail=f"Số lượng tồn kho của thuốc này không đủ {medication_id}")
+        self.append_movements(movements)
+
+    def record_movements(self, movements_in: List[StockMovementCreate], created_by: Optional[UUID] = None) -> Dict[UUID, int]:
+        """Ghi một lô nhập kho/điều chỉnh (một transaction), trả về tồn kho mới của các thuốc liên quan"""
+        try:
+            self.apply_movements([
+                {
+                    "medication_id": movement.medication_id,
+                    "movement_type": StockMovementTypeEnum(movement.movement_type),
+                    "quantity": movement.quantity,
+                    "note": movement.note,
+                    "created_by": created_by,
+                }
+                for movement in movements_in
+            ])
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return self.get_stock_levels(movement.medication_id for movement in movements_in)
+
+    def get_stock_levels(self, medication_ids: Iterable[UUID]) -> Dict[UUID, int]:
+        """Tồn kho theo ledger = snapshot + tổng phần đuôi ledger sau snapshot, một query cho nhiều thuốc"""
+        ids = list(set(medication_ids))
+        if not ids:
+            return {}
+        last_id = func.coalesce(MedicationStockBalance.last_movement_id, 0)
+        tail = (
+            select(func.coalesce(func.sum(StockMovement.quantity), 0))
+            .where(StockMovement.medication_id == Medication.id, StockMovement.id > last_id)
+            .correlate(Medication, MedicationStockBalance)
+            .scalar_subquery()
+        )
+        rows = self.db.execute(
+            select(Medication.id, func.coalesce(MedicationStockBalance.quantity, 0) + tail)
+            .outerjoin(MedicationStockBalance, MedicationStockBalance.medication_id == Medication.id)
+            .where(Medication.id.in_(ids))
+        ).all()
+        return {medication_id: quantity for medication_id, quantity in rows}
+
+    def get_movements(self, medication_id: UUID, skip: int = 0, limit: int = 20) -> List[StockMovement]:
+        """Lịch sử biến động tồn kho của thuốc, mới nhất trước"""
+        return self.db.query(StockMovement).filter(StockMovement.medication_id == medication_id)\
+            .order_by(StockMovement.id.desc()).offset(skip).limit(limit).all()
+
+    def count_movements(self, medication_id: UUID) -> int:
+        return self.db.query(StockMovement).filter(StockMovement.medication_id == medication_id).count()
+
+    def compact_balances(self, lag_seconds: float = 60) -> int:
+        """
+        Gộp phần ledger mới vào snapshot, trả về số thuốc đã cập nhật.
+        - Chỉ gộp movement cũ hơn lag_seconds: id được cấp lúc INSERT nhưng transaction có thể commit sau,
+          movement id nhỏ commit muộn sẽ bị bỏ sót nếu gộp tới sát hiện tại
+        - UPDATE ... WHERE last_movement_id = <giá trị đã đọc>: hai instance chạy cùng lúc không cộng trùng
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=lag_seconds)
+        upto = self.db.scalar(select(func.max(StockMovement.id)).where(StockMovement.created_at < cutoff))
+        if upto is None:
+            return 0
+        rows = self.db.execute(
+            select(
+                StockMovement.medication_id,
+                MedicationStockBalance.last_movement_id,
+                func.sum(StockMovement.quantity).label("delta"),
+            )
+            .outerjoin(MedicationStockBalance, MedicationStockBalance.medication_id == StockMovement.medication_id)
+            .where(
+                StockMovement.id > func.coalesce(MedicationStockBalance.last_movement_id, 0),
+                StockMovement.id <= upto,
+            )
+            .group_by(StockMovement.medication_id, MedicationStockBalance.last_movement_id)
+        ).all()
+        new_balances = [
+            {"medication_id": row.medication_id, "quantity": row.delta, "last_movement_id": upto}
+            for row in rows if row.last_movement_id is None
+        ]
+        updates = [
+            {"b_medication_id": row.medication_id, "b_seen": row.last_movement_id, "b_delta": row.delta, "b_upto": upto}
+            for row in rows if row.last_movement_id is not None
+        ]
+        balances = MedicationStockBalance.__table__
+        try:
+            if new_balances:
+                self.db.execute(insert(balances), new_balances)
+            if updates:
+                self.db.execute(
+                    update(balances)
+                    .where(
+                        balances.c.medication_id == bindparam("b_medication_id"),
+                        balances.c.last_movement_id == bindparam("b_seen"),
+                    )
+                    .values(quantity=balances.c.quantity + bindparam("b_delta"), last_movement_id=bindparam("b_upto")),
+                    updates,
+                )
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return len(rows)
+
+
+class ReservationService:
+    """
+    Giữ chỗ tồn kho khi kê đơn (không commit, chạy trong transaction của đơn thuốc/hóa đơn).
+    Kiểm tra khi giữ chỗ: khóa dòng thuốc + SUM giữ chỗ ACTIVE của các thuốc trong đơn (index (medication_id, status)).
+    """
+    def __init__(self, db: Session):
+        self.db = db
+
+    def reserve(self, prescription_id: UUID, quantities: Dict[UUID, int]) -> None:
+        """Giữ chỗ số lượng thuốc của đơn; thiếu tồn kho khả dụng -> 409"""
+        quantities = {medication_id: quantity for medication_id, quantity in quantities.items() if quantity > 0}
+        if not quantities:
+            return
+        ids = sorted(quantities, key=str)  # Khóa theo thứ tự cố định tránh deadlock
+        stock = dict(self.db.execute(
+            select(Medication.id, Medication.stock_quantity).where(Medication.id.in_(ids))
+            .order_by(Medication.id).with_for_update()
+        ).all())
+        reserved = dict(self.db.execute(
+            select(StockReservation.medication_id, func.sum(StockReservation.quantity))
+            .where(StockReservation.medication_id.in_(ids), StockReservation.status == StockReservationStatusEnum.ACTIVE)
+            .group_by(StockReservation.medication_id)
+        ).all())
+        for medication_id in ids:
+            if medication_id not in stock:
+                raise HTTPException(status_code=404, detail=f"Thuốc với id {medication_id} không tìm thấy")
+            available = stock[medication_id] - reserved.get(medication_id, 0)
+            if available < quantities[medication_id]:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Thuốc {medication_id} không đủ tồn kho khả dụng (còn {max(available, 0)})",
+                )
+
+        expires_at = datetime.now(timezone.utc) + timedelta(minutes=settings.stock_reservation_ttl_minutes)
+        self.db.execute(insert(StockReservation), [
+            {
+                "medication_id": medication_id,
+                "prescription_id": prescription_id,
+                "quantity": quantity,
+                "status": StockReservationStatusEnum.ACTIVE,
+                "expires_at": expires_at,
+            }
+            for medication_id, quantity in quantities.items()
+        ])
+        for medication_id, quantity in quantities.items():
+            track_reserved_change(self.db, medication_id, quantity)
+
+    def release(self, prescription_id: UUID) -> None:
+        """Trả lại giữ chỗ còn ACTIVE của đơn (ví dụ khi sửa đơn)"""
+        self._close(StockReservation.prescription_id == prescription_id, StockReservationStatusEnum.RELEASED)
+
+    def consume_for_medical_record(self, medical_record_id: UUID) -> None:
+        """Phiên khám đã thanh toán: giữ chỗ ACTIVE của đơn thuốc -> CONSUMED (thuốc đã xuất qua ledger)"""
+        prescription_ids = select(Prescription.id).where(Prescription.medical_record_id == medical_record_id)
+        self._close(StockReservation.prescription_id.in_(prescription_ids), StockReservationStatusEnum.CONSUMED)
+
+    def _close(self, condition, status: StockReservationStatusEnum) -> None:
+        rows = self.db.execute(
+            select(StockReservation.id, StockReservation.medication_id, StockReservation.quantity)
+            .where(condition, StockReservation.status == StockReservationStatusEnum.ACTIVE)
+            .with_for_update()
+        ).all()
+        if not rows:
+            return
+        self.db.execute(
+            update(StockReservation)
+            .where(StockReservation.id.in_([row.id for row in rows]))
+            .values(status=status)
+        )
+        for row in rows:
+            track_reserved_change(self.db, row.medication_id, -row.quantity)
+
+    def release_expired(self) -> int:
+        """Trả lại giữ chỗ quá hạn, nạp lại bộ đếm từ database; trả về số giữ chỗ đã trả"""
+        try:
+            result = self.db.execute(
+                update(StockReservation)
+                .where(StockReservation.status == StockReservationStatusEnum.ACTIVE,
+                       StockReservation.expires_at < datetime.now(timezone.utc))
+                .values(status=StockReservationStatusEnum.RELEASED)
+            )
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        reserved_stock.reload(self.db)
+        return result.rowcount
+
+
+class MedicationAlertService:
+    """
+    Cảnh báo thuốc sắp hết, tính sẵn vào bảng medication_alerts bởi job quét định kỳ:
+    - LOW_STOCK: tồn kho khả dụng (trừ giữ chỗ) dưới ngưỡng của thuốc (hoặc ngưỡng mặc định)
+    - RUN_OUT: với tốc độ kê đơn trung bình N ngày gần nhất, thuốc sẽ hết trong vòng medication_alert_run_out_days ngày
+    Tốc độ kê đơn được tính bằng một GROUP BY trên prescription_details trong cửa sổ N ngày (index prescriptions.created_at),
+    request đọc cảnh báo chỉ đọc bảng kết quả.
+    """
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _daily_usage(self, since: datetime, window_days: int) -> Dict[UUID, float]:
+        """Lượng kê đơn trung bình mỗi ngày của từng thuốc từ thời điểm since"""
+        rows = self.db.execute(
+            select(PrescriptionDetail.medication_id, func.sum(PrescriptionDetail.quantity))
+            .join(Prescription, Prescription.id == PrescriptionDetail.prescription_id)
+            .where(Prescription.created_at >= since)
+            .group_by(PrescriptionDetail.medication_id)
+        ).all()
+        return {medication_id: (total or 0) / window_days for medication_id, total in rows}
+
+    def scan(self) -> int:
+        """Tính lại toàn bộ cảnh báo và thay nội dung bảng trong một transaction, trả về số cảnh báo"""
+        now = datetime.now(timezone.utc)
+        window_days = max(settings.medication_alert_window_days, 1)
+        usage = self._daily_usage(now - timedelta(days=window_days), window_days)
+        reserved = dict(self.db.execute(
+            select(StockReservation.medication_id, func.sum(StockReservation.quantity))
+            .where(StockReservation.status == StockReservationStatusEnum.ACTIVE)
+            .group_by(StockReservation.medication_id)
+        ).all())
+
+        alerts = []
+        medications = self.db.execute(
+            select(Medication.id, Medication.stock_quantity, Medication.low_stock_threshold)
+            .where(Medication.deleted_at.is_(None))
+        )
+        for medication_id, stock_quantity, low_stock_threshold in medications:
+            available = stock_quantity - reserved.get(medication_id, 0)
+            threshold = settings.medication_low_stock_threshold if low_stock_threshold is None else low_stock_threshold
+            daily_usage = usage.get(medication_id, 0.0)
+            days_remaining = max(available, 0) / daily_usage if daily_usage > 0 else None
+            row = {
+                "medication_id": medication_id,
+                "available_quantity": available,
+                "threshold": threshold,
+                "daily_usage": daily_usage,
+                "days_remaining": days_remaining,
+                "computed_at": now,
+            }
+            if available < threshold:
+                alerts.append({**row, "alert_type": MedicationAlertTypeEnum.LOW_STOCK})
+            if days_remaining is not None and days_remaining < settings.medication_alert_run_out_days:
+                alerts.append({**row, "alert_type": MedicationAlertTypeEnum.RUN_OUT})
+
+        try:
+            self.db.execute(delete(MedicationAlert))
+            if alerts:
+                self.db.execute(insert(MedicationAlert), alerts)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return len(alerts)
+
+    def get_alerts(self, alert_type: Optional[MedicationAlertTypeEnum] = None) -> List[MedicationAlertResponse]:
+        """Danh sách cảnh báo từ lần quét gần nhất (sắp hết sớm nhất trước)"""
+        query = (
+            select(MedicationAlert, Medication.name)
+            .join(Medication, Medication.id == MedicationAlert.medication_id)
+            .where(Medication.deleted_at.is_(None))
+            .order_by(
+                MedicationAlert.days_remaining.is_(None),
+                MedicationAlert.days_remaining,
+                MedicationAlert.available_quantity,
+            )
+        )
+        if alert_type is not None:
+            query = query.where(MedicationAlert.alert_type == alert_type)
+        return [
+            MedicationAlertResponse(
+                medication_id=alert.medication_id,
+                name=name,
+                alert_type=alert.alert_type,
+                available_quantity=alert.available_quantity,
+                threshold=alert.threshold,
+                daily_usage=alert.daily_usage,
+                days_remaining=alert.days_remaining,
+                computed_at=alert.computed_at,
+            )
+            for alert, name in self.db.execute(query)
+        ]
+
+
+def compact_stock_balances() -> int:
+    """Job định kỳ: gộp ledger tồn kho vào snapshot"""
+    with SessionLocal() as db:
+        return StockService(db).compact_balances(settings.stock_compaction_lag_seconds)
+
+
+def release_expired_reservations() -> int:
+    """Job định kỳ: trả lại giữ chỗ tồn kho quá hạn"""
+    with SessionLocal() as db:
+        return ReservationService(db).release_expired()
+
+
+def scan_medication_alerts() -> int:
+    """Job định kỳ: tính lại cảnh báo thuốc sắp hết"""
+    with SessionLocal() as db:
+        return MedicationAlertService(db).scan()
@@ -11,5 +11,7 @@ from app.medical_records.models import *
 from app.prescriptions.models import *
 from app.invoices.models import *
 from app.service_indications.models import *
+from app.idempotency.models import *
+from app.reports.models import *
 
 # Nếu có thêm model mới sau này, chỉ cần thêm dòng import tương ứng ở đây
\ No newline at end of file
@@ -0,0 +1,54 @@
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, PlainTextResponse
+from sqlalchemy.orm import Session
+
+from app.core.authentication import protected_route
+from app.core.dependencies import AuthCredentialDepend
+from app.database import get_read_db
+from app.monitoring.metrics import REGISTRY, collect_threadpool_metrics
+from app.monitoring.profiler import profile_path
+from app.users.models import UserRoleEnum as RoleEnum
+
+router = APIRouter(
+    tags=["monitoring"],
+)
+
+# Content-Type chuẩn của Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def read_metrics():
+    """
+    Metrics cho Prometheus scrape
+    - Latency/số request theo route, trạng thái pool DB, threadpool, bcrypt/upload đang chạy
+    """
+    collect_threadpool_metrics()  # Phải đọc trong event loop
+    return PlainTextResponse(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+# Tải profile đã lưu (chỉ đăng ký khi PROFILING_ENABLED=true)
+profiles_router = APIRouter(
+    prefix="/profiles",
+    tags=["monitoring"],
+)
+
+@profiles_router.get("/{profile_id}", include_in_schema=False)
+@protected_route([RoleEnum.ADMIN])
+def read_profile(
+    CREDENTIALS: AuthCredentialDepend,
+    profile_id: str,
+    part: Literal["speedscope", "sql"] = Query("speedscope", description="speedscope: stack profile, sql: SQL timeline"),
+    DB: Session = Depends(get_read_db),
+    CURRENT_USER = None,
+):
+    """
+    Tải profile của request theo id (header X-Profile-Id)
+    - part=speedscope: mở bằng https://www.speedscope.app
+    - part=sql: danh sách câu SQL theo thời gian
+    """
+    path = profile_path(profile_id, part)
+    if path is None or not path.is_file():
+        raise HTTPException(status_code=404, detail="Profile không tồn tại")
+    return FileResponse(path, media_type="application/json", filename=path.name)
@@ -0,0 +1,295 @@
+"""
+Metrics dạng Prometheus (text exposition format 0.0.4), không phụ thuộc thư viện ngoài.
+
+- Counter / Gauge / Histogram có label, thread-safe (endpoint sync chạy trong threadpool)
+- Gauge có thể lấy giá trị lúc scrape qua collector (pool DB, threadpool) -> không tốn gì trên hot path
+- MetricsMiddleware: đo latency theo route template (/patients/{patient_id}) và status code
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """Base cho các loại metric"""
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Bộ đếm chỉ tăng"""
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        # Metric không có label hiển thị 0 ngay từ đầu thay vì bị thiếu trong output
+        self._values: Dict[LabelValues, float] = {} if self.labelnames else {(): 0.0}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Gauge(_Metric):
+    """Giá trị tăng/giảm tự do (có thể được collector cập nhật lúc scrape)"""
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        # Metric không có label hiển thị 0 ngay từ đầu thay vì bị thiếu trong output
+        self._values: Dict[LabelValues, float] = {} if self.labelnames else {(): 0.0}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels: str) -> Iterator[None]:
+        """Tăng gauge khi bắt đầu, giảm khi kết thúc (đếm số tác vụ đang chạy)"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Histogram(_Metric):
+    """Histogram với bucket cố định (cộng dồn khi render như Prometheus yêu cầu)"""
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [count từng bucket (+Inf ở cuối), sum]
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Tập hợp metric + collector chạy trước mỗi lần scrape"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Collector cập nhật gauge ngay trước khi render (ví dụ đọc trạng thái pool)"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception:  # Collector lỗi không được làm hỏng cả trang metrics
+                pass
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# HTTP
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "Thời gian xử lý request theo route template",
+    ("method", "route", "status"),
+)
+HTTP_REQUESTS_IN_PROGRESS = REGISTRY.gauge("http_requests_in_progress", "Số request đang xử lý")
+
+# Database pool (giá trị gauge được collector trong app/database.py cập nhật lúc scrape)
+DB_POOL_SIZE = REGISTRY.gauge("db_pool_size", "Số connection cố định của pool")
+DB_POOL_CHECKED_OUT = REGISTRY.gauge("db_pool_checked_out", "Số connection đang được sử dụng")
+DB_POOL_CHECKED_IN = REGISTRY.gauge("db_pool_checked_in", "Số connection rảnh trong pool")
+DB_POOL_OVERFLOW = REGISTRY.gauge("db_pool_overflow", "Số connection overflow đang mở")
+DB_POOL_CHECKOUT_WAIT = REGISTRY.histogram(
+    "db_pool_checkout_wait_seconds", "Thời gian chờ lấy connection từ pool",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+DB_POOL_CONNECTIONS_OPENED = REGISTRY.counter("db_pool_connections_opened_total", "Số connection DB đã mở")
+DB_POOL_CONNECTIONS_CLOSED = REGISTRY.counter("db_pool_connections_closed_total", "Số connection DB đã đóng")
+DB_POOL_CONNECTIONS_INVALIDATED = REGISTRY.counter(
+    "db_pool_connections_invalidated_total", "Số connection bị huỷ do lỗi/ngắt kết nối"
+)
+DB_POOL_PINGS = REGISTRY.counter("db_pool_pings_total", "Số lần ping connection khi checkout (pre_ping=idle)")
+
+# Threadpool của AnyIO (endpoint sync + run_in_threadpool)
+THREADPOOL_TOTAL = REGISTRY.gauge("threadpool_total_tokens", "Số thread tối đa của threadpool")
+THREADPOOL_BORROWED = REGISTRY.gauge("threadpool_borrowed_tokens", "Số thread đang bận")
+THREADPOOL_WAITING = REGISTRY.gauge("threadpool_tasks_waiting", "Số tác vụ đang chờ thread rảnh")
+
+# Tác vụ nặng CPU/IO
+BCRYPT_IN_PROGRESS = REGISTRY.gauge("bcrypt_operations_in_progress", "Số thao tác hash/verify bcrypt đang chạy")
+UPLOADS_IN_PROGRESS = REGISTRY.gauge("upload_operations_in_progress", "Số file upload đang được ghi")
+
+# Realtime (SSE)
+REALTIME_SUBSCRIBERS = REGISTRY.gauge("realtime_subscribers", "Số client đang nhận event realtime")
+REALTIME_EVENTS_PUBLISHED = REGISTRY.counter("realtime_events_published_total", "Số event realtime đã phát tới hub")
+REALTIME_SUBSCRIBER_OVERFLOWS = REGISTRY.counter(
+    "realtime_subscriber_overflows_total", "Số lần hàng đợi của client đầy (bỏ event cũ, yêu cầu client tải lại)"
+)
+
+
+def collect_threadpool_metrics() -> None:
+    """Đọc trạng thái threadpool mặc định của AnyIO (phải gọi trong event loop)"""
+    from anyio.to_thread import current_default_thread_limiter
+
+    limiter = current_default_thread_limiter()
+    THREADPOOL_TOTAL.set(limiter.total_tokens)
+    THREADPOOL_BORROWED.set(limiter.borrowed_tokens)
+    THREADPOOL_WAITING.set(limiter.statistics().tasks_waiting)
+
+
+def route_label(scope: Scope) -> str:
+    """
+    Label route theo template (/patients/{patient_id}) thay vì path thật để tránh bùng nổ số series.
+    Request không khớp route nào gom chung vào <unmatched>.
+    """
+    route = scope.get("route")
+    if route is not None and hasattr(route, "path_format"):
+        return route.path_format
+    if scope.get("root_path"):  # Mount (ví dụ /static)
+        return scope["root_path"] + "/{path}"
+    return "<unmatched>"
+
+
+class MetricsMiddleware:
+    """ASGI middleware đo latency/số request theo method, route template và status"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                method=scope["method"], route=route_label(scope), status=str(status_code),
+            )
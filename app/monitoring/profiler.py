@@ -0,0 +1,310 @@
+"""
+Profile theo từng request (chỉ admin, bật bằng PROFILING_ENABLED=true).
+
+Kích hoạt trên endpoint bất kỳ bằng header `X-Profile` hoặc query `__profile`:
+- `store` (hoặc `1`/`true`): trả response bình thường, lưu profile vào settings.profiling_dir,
+  id trả về trong header X-Profile-Id -> tải bằng GET /profiles/{id} (hoặc /profiles/{id}?part=sql)
+- `return`: thay body response bằng tài liệu profile (JSON: speedscope + SQL timeline)
+
+Profile gồm:
+- Sampling profiler: lấy stack của thread event loop và các thread của threadpool (endpoint sync) mỗi
+  settings.profiling_interval_ms, xuất định dạng speedscope (mở bằng https://www.speedscope.app)
+- SQL timeline: câu SQL, thời điểm bắt đầu (tính từ đầu request), thời gian chạy, thread
+
+Khi PROFILING_ENABLED=false, middleware và SQL listener không được đăng ký -> không tốn gì.
+Lưu ý: thread của threadpool dùng chung cho mọi request, nên profile trên instance đang tải cao
+có thể lẫn stack của request khác.
+"""
+import json
+import re
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import anyio
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import Headers, MutableHeaders, QueryParams
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.auth.jwt_handler import TokenExpiredError, TokenInvalidError, verify_token
+from app.core.config import settings
+from app.users.models import UserRoleEnum
+
+PROFILE_HEADER = "x-profile"
+PROFILE_QUERY_PARAM = "__profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+MAX_STATEMENT_LENGTH = 2000
+_PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+Frame = Tuple[str, str, int]  # (tên hàm, file, dòng bắt đầu hàm)
+
+
+class SamplingProfiler:
+    """Lấy mẫu stack theo chu kỳ bằng sys._current_frames() trong một thread riêng"""
+
+    def __init__(self, loop_thread_id: int, interval: float):
+        self.loop_thread_id = loop_thread_id
+        self.interval = interval
+        self.frames: List[Frame] = []
+        self._frame_index: Dict[Frame, int] = {}
+        # thread id -> (tên thread, danh sách sample [stack], danh sách weight ms)
+        self.samples: Dict[int, Tuple[str, List[List[int]], List[float]]] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self.started_at = 0.0
+        self.stopped_at = 0.0
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.stopped_at = time.perf_counter()
+
+    def _frame_id(self, code) -> int:
+        key = (getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno)
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self.frames)
+            self.frames.append(key)
+        return index
+
+    @staticmethod
+    def _is_busy_worker(frame) -> bool:
+        """Thread là worker AnyIO đang chạy việc (không phải đang chờ trong queue.get)"""
+        child = None
+        while frame is not None:
+            code = frame.f_code
+            if code.co_name == "run" and "anyio" in code.co_filename:
+                return child is not None and not (
+                    child.co_name == "get" and child.co_filename.endswith("queue.py")
+                )
+            child = code
+            frame = frame.f_back
+        return False
+
+    def _stack(self, frame) -> List[int]:
+        """Stack từ ngoài vào trong (index trong self.frames)"""
+        stack = []
+        while frame is not None:
+            stack.append(self._frame_id(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight = (now - last) * 1000
+            last = now
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id != self.loop_thread_id and not self._is_busy_worker(frame):
+                    continue
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                entry = self.samples.get(thread_id)
+                if entry is None:
+                    entry = self.samples[thread_id] = (names.get(thread_id, str(thread_id)), [], [])
+                entry[1].append(self._stack(frame))
+                entry[2].append(weight)
+
+    def to_speedscope(self, name: str) -> Dict[str, Any]:
+        duration = (self.stopped_at - self.started_at) * 1000
+        profiles = [
+            {
+                "type": "sampled",
+                "name": f"{thread_name} ({'event loop' if thread_id == self.loop_thread_id else 'threadpool'})",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": duration,
+                "samples": stacks,
+                "weights": weights,
+            }
+            for thread_id, (thread_name, stacks, weights) in self.samples.items()
+        ]
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": name,
+            "exporter": "dcm-request-profiler",
+            "activeProfileIndex": 0,
+            "shared": {"frames": [{"name": n, "file": f, "line": line} for n, f, line in self.frames]},
+            "profiles": profiles,
+        }
+
+
+class RequestProfile:
+    """Dữ liệu profile của một request"""
+
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at = time.perf_counter()
+        self.duration_ms = 0.0
+        self.status_code: Optional[int] = None
+        self.sql: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add_statement(self, statement: str, started_at: float, duration: float, executemany: bool) -> None:
+        entry = {
+            "start_ms": round((started_at - self.started_at) * 1000, 3),
+            "duration_ms": round(duration * 1000, 3),
+            "statement": statement[:MAX_STATEMENT_LENGTH],
+            "executemany": executemany,
+            "thread": threading.current_thread().name,
+        }
+        with self._lock:
+            self.sql.append(entry)
+
+    def sql_timeline(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "created_at": self.created_at.isoformat(),
+            "status_code": self.status_code,
+            "duration_ms": round(self.duration_ms, 3),
+            "sql_count": len(self.sql),
+            "sql_total_ms": round(sum(s["duration_ms"] for s in self.sql), 3),
+            "statements": sorted(self.sql, key=lambda s: s["start_ms"]),
+        }
+
+
+# Profile của request hiện tại; được copy sang threadpool cùng context nên SQL listener thấy được
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    if profile is None:
+        return
+    started = conn.info["profile_query_start"].pop()
+    profile.add_statement(statement, started, time.perf_counter() - started, executemany)
+
+
+def install_sql_listeners() -> None:
+    """Đăng ký listener SQL cho mọi engine (chỉ gọi khi bật profiling)"""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def profile_path(profile_id: str, part: str = "speedscope") -> Optional[Path]:
+    """Đường dẫn file profile đã lưu (None nếu id không hợp lệ)"""
+    if not _PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    suffix = "sql.json" if part == "sql" else "speedscope.json"
+    return Path(settings.profiling_dir) / f"{profile_id}.{suffix}"
+
+
+def _is_admin(scope: Scope) -> bool:
+    """Chỉ token hợp lệ của ADMIN mới được bật profile (không cần query DB: role nằm trong JWT đã ký)"""
+    authorization = Headers(scope=scope).get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        payload = verify_token(token)
+    except (TokenExpiredError, TokenInvalidError):
+        return False
+    return payload.get("role") == UserRoleEnum.ADMIN.value
+
+
+def _requested_mode(scope: Scope) -> Optional[str]:
+    value = Headers(scope=scope).get(PROFILE_HEADER)
+    if value is None and PROFILE_QUERY_PARAM.encode() in scope.get("query_string", b""):
+        value = QueryParams(scope["query_string"]).get(PROFILE_QUERY_PARAM)
+    if value is None:
+        return None
+    value = value.strip().lower()
+    if value in ("1", "true", "store"):
+        return "store"
+    if value == "return":
+        return "return"
+    return None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware chạy profiler quanh request khi admin yêu cầu"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        install_sql_listeners()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        mode = _requested_mode(scope)
+        if mode is None or not _is_admin(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        profiler = SamplingProfiler(threading.get_ident(), settings.profiling_interval_ms / 1000)
+        captured: List[Message] = []
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                if mode == "store":
+                    MutableHeaders(scope=message).append(PROFILE_ID_HEADER, profile.id)
+            if mode == "return":
+                captured.append(message)  # Bỏ response gốc, trả profile sau khi xong
+                return
+            await send(message)
+
+        token = _current_profile.set(profile)
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            _current_profile.reset(token)
+            profile.duration_ms = (time.perf_counter() - profile.started_at) * 1000
+
+        speedscope = profiler.to_speedscope(f"{profile.method} {profile.path}")
+        if mode == "store":
+            await anyio.to_thread.run_sync(self._store, profile, speedscope)
+            return
+
+        body = json.dumps({**profile.sql_timeline(), "speedscope": speedscope}, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (PROFILE_ID_HEADER.lower().encode(), profile.id.encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    def _store(profile: RequestProfile, speedscope: Dict[str, Any]) -> None:
+        directory = Path(settings.profiling_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        profile_path(profile.id, "speedscope").write_text(json.dumps(speedscope), encoding="utf-8")
+        profile_path(profile.id, "sql").write_text(
+            json.dumps(profile.sql_timeline(), ensure_ascii=False, indent=2), encoding="utf-8"
+        )
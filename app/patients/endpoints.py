@@ -2,12 +2,23 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from uuid import UUID
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.patients.schemas import PatientCreate, PatientUpdate, PatientResponse
 from app.patients.services import PatientService
-from app.core.response import ResponseBase, PaginationMeta, PaginatedResponse
+from app.core.response import (
+    ResponseBase, PaginationMeta, PaginatedResponse, FastJSONResponse, CursorPaginationMeta, CursorPaginatedResponse,
+)
+from app.core.fieldsets import FieldSet, FIELDS_QUERY_DESCRIPTION
+from app.patients.models import Patient
+from app.medical_records.schemas import PatientTimelineVisit
+from app.medical_records.services import MedicalRecordService
+from app.core.routing import EnvelopeRoute
+from app.core.dependencies import AuthCredentialDepend
+from app.core.authentication import protected_route
+from app.users.models import UserRoleEnum as RoleEnum
 
 router = APIRouter(
+    route_class=EnvelopeRoute,  # Serialize nhanh envelope ResponseBase
     prefix="/patients",    # Tất cả endpoint sẽ có prefix /patients
     tags=["patients"],      # Nhóm trong Swagger docs
     responses={404: {"description": "Patient not found"}}  # Response chung cho 404
@@ -31,14 +42,35 @@ def create_patient(
 
 
 @router.get("/{patient_id}", response_model=ResponseBase[PatientResponse])
-def read_patient(patient_id: UUID, db: Session = Depends(get_db)):
+def read_patient(patient_id: UUID, db: Session = Depends(get_read_db)):
     repo = PatientService(db)
-    db_patient = repo.get_patient_by_id(patient_id)
+    db_patient = repo.get_patient_by_id(patient_id, with_clinical=True)
     if db_patient is None:
         raise HTTPException(status_code=404, detail="Patient not found")
     return ResponseBase(message="Lấy thông tin bệnh nhân thành công", data=db_patient)  # Wrap response
 
 
+@router.get("/{patient_id}/timeline", response_model=CursorPaginatedResponse[PatientTimelineVisit])
+@protected_route([RoleEnum.ADMIN, RoleEnum.DOCTOR, RoleEnum.STAFF])
+def read_patient_timeline(
+    CREDENTIALS: AuthCredentialDepend,
+    patient_id: UUID,
+    cursor: Optional[str] = Query(None, description="meta.next_cursor của trang trước, bỏ trống để lấy trang đầu"),
+    limit: int = Query(10, ge=1, le=50, description="Số lần khám mỗi trang"),
+    DB: Session = Depends(get_read_db),
+    CURRENT_USER = None,
+):
+    """
+    Lịch sử khám đầy đủ của bệnh nhân, mới nhất trước (thay cho gọi hồ sơ khám, đơn thuốc, chỉ định, hóa đơn từng lần khám)
+    - Mỗi lần khám: chẩn đoán, bác sĩ, lịch hẹn, các dòng thuốc, dịch vụ và tổng tiền hóa đơn
+    - Phân trang theo cursor: truyền meta.next_cursor để lấy trang sau, next_cursor = null là hết
+    """
+    repo = MedicalRecordService(DB)
+    visits, next_cursor = repo.get_patient_timeline(patient_id=patient_id, limit=limit, cursor=cursor)
+    meta = CursorPaginationMeta(limit=limit, next_cursor=next_cursor, has_more=next_cursor is not None)
+    return CursorPaginatedResponse(message="Lấy lịch sử khám của bệnh nhân thành công", data=visits, meta=meta)
+
+
 # @router.get("/", response_model=PaginatedResponse[PatientResponse])
 # def read_patients(
 #     skip: int = Query(0, ge=0, description="Số bản ghi bỏ qua"),
@@ -72,24 +104,30 @@ def read_patients(
     skip: int = Query(0, ge=0, description="Số bản ghi bỏ qua"),
     limit: int = Query(100, ge=1, le=100, description="Số bản ghi tối đa"),
     q: Optional[str] = Query(None, description="Search query: tìm theo full_name (không phân biệt hoa thường) hoặc phone_number"),
-    db: Session = Depends(get_db)
+    fields: Optional[str] = Query(None, description=FIELDS_QUERY_DESCRIPTION),
+    db: Session = Depends(get_read_db)
 ):
     """
     Lấy danh sách bệnh nhân
     - Hỗ trợ tìm kiếm theo tên hoặc số điện thoại
     - Phân trang với skip và limit
+    - fields: chỉ lấy các trường cần thiết (ví dụ: id,full_name,phone_number)
     """
     repo = PatientService(db)
-    patients = repo.get_patients(skip=skip, limit=limit, q=q)
+    field_set = FieldSet.parse(fields, PatientResponse, Patient)
+    patients = repo.get_patients(skip=skip, limit=limit, q=q, field_set=field_set)
     total = repo.count_patients(search_term=q)  # Đếm tổng số bệnh nhân khớp với search
     page = (skip // limit) + 1
     total_pages = (total // limit) + (1 if total % limit else 0)
     meta = PaginationMeta(total=total, page=page, limit=limit, total_pages=total_pages)
-    return PaginatedResponse(
+    response = PaginatedResponse(
         message="Patients retrieved successfully",
         data=patients,
         meta=meta
     )  # Wrap với pagination
+    if field_set:  # Dữ liệu đã rút gọn theo fields -> trả thẳng, không validate theo response_model đầy đủ
+        return FastJSONResponse(response)
+    return response
 
 @router.put("/{patient_id}", response_model=ResponseBase[PatientResponse])
 def update_patient(
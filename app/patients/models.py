@@ -1,10 +1,16 @@
-from sqlalchemy import Column, String, Date, Enum, DateTime, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Date, Enum, DateTime, Text, Index
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from app.database import Base
 import enum
 import uuid
-from sqlalchemy.dialects.postgresql import UUID
+from app.core.types import UUID, postgres_only, require_postgres_extension
+
+# Nhóm các cột text lâm sàng (dài) - deferred mặc định, chỉ load khi cần (undefer_group)
+CLINICAL_COLUMNS_GROUP = "clinical"
+
+# Index trigram cần extension pg_trgm
+require_postgres_extension(Base.metadata, "pg_trgm")
 
 class GenderEnum(enum.Enum):
     """Enum cho giới tính"""
@@ -14,6 +20,17 @@ class GenderEnum(enum.Enum):
 class Patient(Base):
     """Model cho bảng PATIENT - Quản lý thông tin bệnh nhân"""
     __tablename__ = "patients"
+    __table_args__ = (
+        # Tìm kiếm ilike '%...%' theo tên/SĐT dùng GIN trigram (chỉ Postgres, SQLite quét bảng như cũ)
+        postgres_only(Index(
+            "ix_patients_full_name_trgm", "full_name",
+            postgresql_using="gin", postgresql_ops={"full_name": "gin_trgm_ops"},
+        )),
+        postgres_only(Index(
+            "ix_patients_phone_number_trgm", "phone_number",
+            postgresql_using="gin", postgresql_ops={"phone_number": "gin_trgm_ops"},
+        )),
+    )
 
     # Khóa chính
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
@@ -29,11 +46,12 @@ class Patient(Base):
     address = Column(String)                          # Địa chỉ
     
     # Thông tin y tế
-    medical_history = Column(String)                  # Tiền sử bệnh lý
-    allergies = Column(String)                        # Các chất gây dị ứng
-    current_medications = Column(String)              # Thuốc đang sử dụng
-    current_condition = Column(String)                # Tình trạng sức khỏe hiện tại
-    notes = Column(Text)                             # Ghi chú thêm
+    # Các cột lâm sàng: deferred, không load khi chỉ nhúng bệnh nhân vào list/kiểm tra tồn tại
+    medical_history = deferred(Column(String), group=CLINICAL_COLUMNS_GROUP)       # Tiền sử bệnh lý
+    allergies = deferred(Column(String), group=CLINICAL_COLUMNS_GROUP)             # Các chất gây dị ứng
+    current_medications = deferred(Column(String), group=CLINICAL_COLUMNS_GROUP)   # Thuốc đang sử dụng
+    current_condition = deferred(Column(String), group=CLINICAL_COLUMNS_GROUP)    # Tình trạng sức khỏe hiện tại
+    notes = deferred(Column(Text), group=CLINICAL_COLUMNS_GROUP)                   # Ghi chú thêm
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -77,7 +77,7 @@ class PatientResponse(BaseSchema):
     dob: Optional[date] = None              # Ngày sinh
     gender: Optional[GenderEnum] = None     # Giới tính
     phone_number: str                       # Số điện thoại (bắt buộc)
-    email: Optional[EmailStr] = None        # Email (không bắt buộc)
+    email: Optional[str] = None             # Email (đã validate khi ghi, không validate lại khi trả về)
     address: Optional[str]                  # Địa chỉ
     medical_history: Optional[str]          # Tiền sử bệnh lý
     allergies: Optional[str]                # Dị ứng
@@ -90,4 +90,10 @@ class PatientResponse(BaseSchema):
 class PatientForeignKeyResponse(BaseSchema):
     """Schema trả về thông tin Patient trong các quan hệ Foreign Key"""
     id: UUID
-    full_name: str
\ No newline at end of file
+    full_name: str
+
+class PatientSummary(PatientForeignKeyResponse):
+    """Schema gọn của Patient để nhúng vào các list response (không có các cột lâm sàng)"""
+    phone_number: str
+    dob: Optional[date] = None
+    gender: Optional[GenderEnum] = None
\ No newline at end of file
@@ -1,10 +1,12 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, undefer_group
 from sqlalchemy import and_, or_
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional
 from uuid import UUID
 from datetime import datetime
-from app.patients.models import Patient
+from app.patients.models import Patient, CLINICAL_COLUMNS_GROUP
 from app.patients.schemas import PatientCreate, PatientUpdate
+from app.core.fieldsets import FieldSet
+from app.utils.helper import get_many_by_ids
 
 class PatientService:
     """Service class để xử lý logic liên quan đến Patient"""
@@ -22,15 +24,28 @@ class PatientService:
         return db_patient
 
     # @staticmethod
-    def get_patient_by_id(self, patient_id: UUID) -> Optional[Patient]:
-        """Lấy thông tin bệnh nhân theo ID"""
-        db_patient = self.db.query(Patient).filter(and_(Patient.id == patient_id, Patient.deleted_at.is_(None))).first()
-        if not db_patient:
+    def get_patient_by_id(self, patient_id: UUID, with_clinical: bool = False) -> Optional[Patient]:
+        """
+        Lấy thông tin bệnh nhân theo ID
+        - with_clinical=True: load luôn các cột lâm sàng (màn chi tiết), mặc định chỉ load thông tin cơ bản
+        - Dùng Session.get: bệnh nhân đã load trong request được lấy từ identity map, không query lại
+        """
+        options = [undefer_group(CLINICAL_COLUMNS_GROUP)] if with_clinical else None
+        db_patient = self.db.get(Patient, patient_id, options=options)
+        if not db_patient or db_patient.deleted_at is not None:
             return None
         return db_patient
 
-    def get_patients(self, skip: int = 0, limit: int = 10, q: Optional[str] = None) -> list[Patient]:
-        """Lấy danh sách patients với phân trang"""
+    def get_patients_by_ids(self, patient_ids: Iterable[UUID]) -> Dict[UUID, Patient]:
+        """Lấy nhiều bệnh nhân theo ID trong một query (bỏ qua bệnh nhân đã có trong session, đã xóa)"""
+        patients = get_many_by_ids(self.db, Patient, patient_ids)
+        return {patient_id: patient for patient_id, patient in patients.items() if patient.deleted_at is None}
+
+    def get_patients(self, skip: int = 0, limit: int = 10, q: Optional[str] = None, field_set: Optional[FieldSet] = None) -> list[Patient]:
+        """
+        Lấy danh sách patients với phân trang
+        - Nếu có field_set: trả về list dict chỉ gồm các trường được chọn
+        """
         query = self.db.query(Patient).filter(
             Patient.deleted_at.is_(None)  # Chỉ lấy bệnh nhân chưa bị xóa
         )
@@ -43,12 +58,17 @@ class PatientService:
                 )
             )
 
-        patients = query.offset(skip).limit(limit).all()
+        if field_set:
+            # Sparse fieldset: chỉ SELECT các cột được chọn, object lồng lấy bằng JOIN
+            rows = query.options(*field_set.load_options()).offset(skip).limit(limit).all()
+            return field_set.project_all(rows)
+        # PatientResponse trả đủ các cột lâm sàng -> load trong cùng query
+        patients = query.options(undefer_group(CLINICAL_COLUMNS_GROUP)).offset(skip).limit(limit).all()
         return patients
     
     def search_patients(self, search_term: str, skip: int = 0, limit: int = 100) -> List[Patient]:
         """Tìm kiếm bệnh nhân theo tên hoặc số điện thoại"""
-        searched_patients = self.db.query(Patient).filter(
+        searched_patients = self.db.query(Patient).options(undefer_group(CLINICAL_COLUMNS_GROUP)).filter(
             and_(
                 Patient.deleted_at.is_(None),
                 or_(
@@ -78,7 +98,7 @@ class PatientService:
     
     def update_patient(self, patient_id: UUID, patient_update: PatientUpdate) -> Optional[Patient]:
         """Cập nhật thông tin bệnh nhân"""
-        db_patient = self.get_patient_by_id(patient_id)
+        db_patient = self.get_patient_by_id(patient_id, with_clinical=True)
         
         # Cập nhật các trường
         update_data = patient_update.dict(exclude_unset=True)  # Chỉ lấy các trường được set
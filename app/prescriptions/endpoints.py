@@ -4,14 +4,16 @@ from typing import List, Optional
 from uuid import UUID
 from datetime import date
 from app.core.dependencies import AuthCredentialDepend
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.core.authentication import protected_route
 from app.users.models import UserRoleEnum as RoleEnum
 from app.core.response import PaginationMeta, ResponseBase, PaginatedResponse
 from app.prescriptions.schemas import PrescriptionCreate, PrescriptionDetailCreate, PrescriptionResponse, PrescriptionDetailResponse, PrescriptionFullResponse, PrescriptionUpdate
 from app.prescriptions.services import PrescriptionService
+from app.core.routing import EnvelopeRoute
 
 router = APIRouter(
+    route_class=EnvelopeRoute,  # Serialize nhanh envelope ResponseBase
     prefix="/prescriptions",
     tags=["prescriptions"],
     responses={404: {"description": "Not found"}}
@@ -55,7 +57,7 @@ def create_prescription(
 def read_prescription(
     CREDENTIALS: AuthCredentialDepend,
     prescription_id: UUID,
-    DB: Session = Depends(get_db),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     """
@@ -75,7 +77,7 @@ def read_prescriptions(
     # doctor_id: Optional[UUID] = Query(None, description="ID bác sĩ (user_id) để lọc"),
     skip: int = Query(0, ge=0, description="Số bản ghi bỏ qua"),
     limit: int = Query(10, ge=1, le=100, description="Số bản ghi lấy về"),
-    DB: Session = Depends(get_db),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     """
@@ -123,6 +125,7 @@ def update_prescription(
     Cập nhật đơn thuốc 
     - Chỉ ADMIN và DOCTOR mới có quyền cập nhật đơn thuốc
     - Trả về thông tin đơn thuốc vừa cập nhật
+    - Phiên khám đã thanh toán trả về 409
     """
     repo = PrescriptionService(DB)
     db_record = repo.update_prescription(record_id, record)
@@ -3,7 +3,7 @@ from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
 import uuid
-from sqlalchemy.dialects.postgresql import UUID
+from app.core.types import UUID
 
 class Prescription(Base):
     """Model cho bảng PRESCRIPTION - Đơn thuốc"""
@@ -13,13 +13,13 @@ class Prescription(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     
     # Khóa ngoại - không được null
-    medical_record_id = Column(UUID(as_uuid=True), ForeignKey("medical_records.id"), nullable=False)
+    medical_record_id = Column(UUID(as_uuid=True), ForeignKey("medical_records.id"), nullable=False, index=True)
     
     # Thông tin đơn thuốc
     notes = Column(Text)                                           # Ghi chú cho đơn thuốc
     
     # Timestamps
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)  # Quét lượng kê đơn N ngày gần nhất
 
     # Relationships
     medical_record = relationship("MedicalRecord", back_populates="prescriptions")
@@ -34,7 +34,7 @@ class PrescriptionDetail(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     
     # Khóa ngoại - không được null
-    prescription_id = Column(UUID(as_uuid=True), ForeignKey("prescriptions.id"), nullable=False)
+    prescription_id = Column(UUID(as_uuid=True), ForeignKey("prescriptions.id"), nullable=False, index=True)
     medication_id = Column(UUID(as_uuid=True), ForeignKey("medications.id"), nullable=False)
     
     # Thông tin chi tiết
@@ -1,17 +1,36 @@
+from functools import cached_property
 from sqlalchemy.orm import Session, joinedload
 from app.prescriptions.models import Prescription, PrescriptionDetail
 from app.prescriptions.schemas import PrescriptionCreate, PrescriptionUpdate, PrescriptionResponse, PrescriptionDetailCreate, PrescriptionDetailUpdate, PrescriptionDetailResponse, PrescriptionFullResponse
 from uuid import UUID
-from typing import List, Optional
+from typing import Dict, List, Optional
+from collections import defaultdict
 from datetime import datetime
 from fastapi import HTTPException
-from app.medications.services import MedicationService
+from app.medications.services import MedicationService, ReservationService
 from app.patients.services import PatientService
+from app.medical_records.models import MedicalRecord, MedicalRecordStatusEnum
 
 class PrescriptionService:
     def __init__(self, db: Session):
         self.db = db
-        self.medication_service = MedicationService(db)
+
+    @cached_property
+    def medication_service(self) -> MedicationService:
+        """Service phụ khởi tạo khi dùng lần đầu"""
+        return MedicationService(self.db)
+
+    @cached_property
+    def reservation_service(self) -> ReservationService:
+        return ReservationService(self.db)
+
+    @staticmethod
+    def _quantities(details) -> Dict[UUID, int]:
+        """Tổng số lượng theo thuốc của đơn (một thuốc có thể xuất hiện nhiều dòng)"""
+        quantities: Dict[UUID, int] = defaultdict(int)
+        for detail in details or []:
+            quantities[detail.medication_id] += detail.quantity
+        return quantities
     
     def create_prescription(self, prescription_in: PrescriptionCreate) -> Prescription:
         """Tạo một Prescription mới với transaction built-in"""
@@ -40,9 +59,15 @@ class PrescriptionService:
                     db_prescription_detail = PrescriptionDetail(**detail_create.model_dump())
                     self.db.add(db_prescription_detail)
                     self.db.flush()
+
+            # Giữ chỗ tồn kho ngay khi kê đơn: hết thuốc thì báo cho bác sĩ, không đợi tới lúc thanh toán
+            self.reservation_service.reserve(db_prescription.id, self._quantities(prescription_in.prescription_details))
             
             self.db.commit()  # Commit tất cả
             return self.get_prescription_by_id(db_prescription.id)
+        except HTTPException:
+            self.db.rollback()
+            raise
         except Exception as e:
             self.db.rollback()  # Rollback tự động khi có exception
             raise HTTPException(status_code=400, detail=f"Failed to create prescription: {str(e)}")
@@ -104,6 +129,12 @@ class PrescriptionService:
             db_prescription = self.get_prescription_by_id(prescription_id)
             if not db_prescription:
                 raise HTTPException(status_code=404, detail="Prescription not found")
+            # Phiên khám đã thanh toán: thuốc đã xuất kho theo đơn, sửa đơn sẽ giữ chỗ thuốc không bao giờ được dùng
+            record_status = self.db.query(MedicalRecord.status).filter(
+                MedicalRecord.id == db_prescription.medical_record_id
+            ).scalar()
+            if record_status == MedicalRecordStatusEnum.PAID:
+                raise HTTPException(status_code=409, detail="Phiên khám đã được thanh toán, không thể sửa đơn thuốc")
             if prescription_in.notes is not None:
                 db_prescription.notes = prescription_in.notes            
             # self.db.refresh(db_prescription)
@@ -131,9 +162,16 @@ class PrescriptionService:
                     db_prescription_detail = PrescriptionDetail(**detail_create.model_dump())
                     self.db.add(db_prescription_detail)
                     self.db.flush()
+
+            # Đơn thay đổi: trả giữ chỗ cũ rồi giữ chỗ theo đơn mới
+            self.reservation_service.release(prescription_id)
+            self.reservation_service.reserve(prescription_id, self._quantities(prescription_in.prescription_details))
             self.db.commit()  # Commit tất cả
 
             return self.get_prescription_by_id(db_prescription.id)
+        except HTTPException:
+            self.db.rollback()
+            raise
         except Exception as e:
             self.db.rollback()  # Rollback tự động khi có exception
             raise HTTPException(status_code=400, detail=f"Failed to update prescription: {str(e)}")
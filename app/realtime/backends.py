@@ -0,0 +1,144 @@
+"""
+Backend chuyển event realtime giữa các worker.
+
+- MemoryBackend: event chỉ đến client của chính process (chạy một worker / môi trường dev)
+- PostgresNotifyBackend: NOTIFY trong transaction ghi dữ liệu (Postgres chỉ gửi khi commit, rollback thì không),
+  mỗi process có một thread LISTEN nhận event của mọi worker/instance rồi đưa vào hub của process đó
+"""
+import json
+import logging
+import select
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from pydantic_core import to_json
+from sqlalchemy import func
+from sqlalchemy import select as sql_select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.database import engine
+from app.realtime.hub import EventHub
+
+logger = logging.getLogger(__name__)
+
+MAX_NOTIFY_PAYLOAD = 7999   # Giới hạn payload NOTIFY của Postgres là 8000 byte
+LISTEN_POLL_SECONDS = 1.0   # Chu kỳ kiểm tra cờ dừng của thread LISTEN
+RECONNECT_DELAY_SECONDS = 2.0
+
+
+@dataclass(frozen=True)
+class RealtimeEvent:
+    topic: str              # appointments | medical_records | invoices
+    type: str               # Ví dụ appointment.updated
+    data: Dict[str, Any]
+
+    def encode(self) -> str:
+        """JSON một dòng (UUID/date/enum được serialize bởi pydantic-core)"""
+        return to_json({"topic": self.topic, "type": self.type, "data": self.data}).decode()
+
+
+class MemoryBackend:
+    """Phát event thẳng vào hub của process sau khi transaction commit"""
+    in_transaction = False
+
+    def __init__(self):
+        self.hub: Optional[EventHub] = None
+
+    def start(self, hub: EventHub) -> None:
+        self.hub = hub
+
+    def stop(self) -> None:
+        self.hub = None
+
+    def publish(self, session: Session, events: List[RealtimeEvent]) -> None:
+        if self.hub is None:
+            return
+        for event in events:
+            self.hub.publish(event.topic, event.type, event.encode())
+
+
+class PostgresNotifyBackend:
+    """pg_notify trong transaction ghi dữ liệu + thread LISTEN trên một connection riêng"""
+    in_transaction = True
+
+    def __init__(self, engine: Engine, channel: str):
+        self.engine = engine
+        self.channel = channel
+        self.hub: Optional[EventHub] = None
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def publish(self, session: Session, events: List[RealtimeEvent]) -> None:
+        """Gọi trước khi commit: NOTIFY được gửi cùng lúc transaction commit"""
+        for event in events:
+            payload = event.encode()
+            if len(payload.encode()) > MAX_NOTIFY_PAYLOAD:
+                logger.warning("Bỏ event realtime %s: payload quá lớn cho NOTIFY", event.type)
+                continue
+            session.execute(sql_select(func.pg_notify(self.channel, payload)))
+
+    def start(self, hub: EventHub) -> None:
+        self.hub = hub
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._listen, name="realtime-listen", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=LISTEN_POLL_SECONDS * 2)
+            self._thread = None
+        self.hub = None
+
+    def _listen(self) -> None:
+        connected_before = False
+        while not self._stopping.is_set():
+            try:
+                self._listen_once(resync=connected_before)
+            except Exception:
+                logger.exception("Mất kết nối LISTEN realtime, thử kết nối lại")
+                self._stopping.wait(RECONNECT_DELAY_SECONDS)
+            connected_before = True
+
+    def _listen_once(self, resync: bool) -> None:
+        connection = self.engine.raw_connection()
+        connection.detach()  # Connection riêng cho LISTEN, không trả về pool
+        try:
+            raw = connection.dbapi_connection
+            raw.autocommit = True
+            with raw.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+            if resync and self.hub is not None:
+                self.hub.request_resync()  # Có thể đã lỡ event trong lúc mất kết nối
+            while not self._stopping.is_set():
+                if select.select([raw], [], [], LISTEN_POLL_SECONDS) == ([], [], []):
+                    continue
+                raw.poll()
+                while raw.notifies:
+                    self._deliver(raw.notifies.pop(0).payload)
+        finally:
+            connection.close()
+
+    def _deliver(self, payload: str) -> None:
+        if self.hub is None:
+            return
+        try:
+            message = json.loads(payload)
+            self.hub.publish(message["topic"], message["type"], payload)
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Bỏ qua NOTIFY realtime không hợp lệ: %.200s", payload)
+
+
+def create_backend():
+    """Chọn backend theo REALTIME_BACKEND (postgres cần database là PostgreSQL)"""
+    if settings.realtime_backend == "postgres":
+        if engine.dialect.name == "postgresql":
+            return PostgresNotifyBackend(engine, settings.realtime_channel)
+        logger.warning("REALTIME_BACKEND=postgres cần PostgreSQL, dùng backend memory")
+    return MemoryBackend()
+
+
+backend = create_backend()
@@ -0,0 +1,86 @@
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_
+from starlette.concurrency import run_in_threadpool
+
+from app.auth.jwt_handler import TokenExpiredError, TokenInvalidError, verify_token
+from app.core.config import settings
+from app.database import SessionLocal
+from app.realtime.events import TOPICS
+from app.realtime.hub import hub
+from app.users.models import User
+
+router = APIRouter(
+    prefix="/realtime",
+    tags=["realtime"],
+)
+
+RETRY_FRAME = b"retry: 3000\n\n"   # EventSource tự kết nối lại sau 3 giây
+PING_FRAME = b": ping\n\n"
+
+
+def _load_user_id(user_id) -> Optional[str]:
+    # Session ngắn chỉ để kiểm tra user: stream giữ kết nối lâu, không được giữ connection DB
+    with SessionLocal() as db:
+        return db.query(User.id).filter(and_(User.id == user_id, User.deleted_at.is_(None))).scalar()
+
+
+async def _authenticate(request: Request, access_token: Optional[str]) -> None:
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        token = access_token
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Thiếu token")
+    try:
+        payload = verify_token(token)
+    except TokenExpiredError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
+    except TokenInvalidError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token invalid")
+    if await run_in_threadpool(_load_user_id, payload.get("id")) is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+
+
+@router.get("/events")
+async def stream_events(
+    request: Request,
+    topics: Optional[str] = Query(None, description="Các topic cần nhận, cách nhau bởi dấu phẩy: appointments,medical_records,invoices"),
+    access_token: Optional[str] = Query(None, description="JWT cho EventSource (không gửi được header Authorization)"),
+):
+    """
+    Stream Server-Sent Events thay đổi trạng thái lịch hẹn, phiên khám, hóa đơn (thay cho polling danh sách)
+    - Xác thực bằng header Authorization hoặc query access_token
+    - Mỗi event: `event: <loại>` (ví dụ appointment.updated), `data: {"topic", "type", "data"}`
+    - Event `resync`: client bị chậm hoặc server vừa kết nối lại backend, có thể đã lỡ event -> tải lại danh sách
+    """
+    await _authenticate(request, access_token)
+    selected = None
+    if topics:
+        selected = frozenset(topic.strip() for topic in topics.split(",") if topic.strip())
+        unknown = selected - TOPICS
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Topic không hợp lệ: {', '.join(sorted(unknown))}")
+
+    async def frames():
+        subscription = hub.subscribe(selected)  # Đăng ký khi stream bắt đầu: response không được gửi thì không để lại subscription
+        try:
+            yield RETRY_FRAME
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscription.queue.get(), settings.realtime_keepalive_seconds)
+                except asyncio.TimeoutError:
+                    frame = PING_FRAME  # Giữ kết nối qua proxy khi không có event
+                if frame is None:
+                    return  # App đang tắt
+                yield frame
+        finally:
+            hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},  # Tắt buffer của nginx
+    )
@@ -0,0 +1,90 @@
+"""
+Phát event khi trạng thái lịch hẹn / phiên khám / hóa đơn thay đổi.
+
+Service gọi emit_*() trong transaction ghi dữ liệu; event được giữ trong session.info và chỉ phát khi commit
+(rollback thì bỏ), nên client không bao giờ thấy thay đổi chưa được lưu.
+"""
+import asyncio
+from typing import Any, Dict, List
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.realtime.backends import RealtimeEvent, backend
+from app.realtime.hub import hub
+
+TOPIC_APPOINTMENTS = "appointments"
+TOPIC_MEDICAL_RECORDS = "medical_records"
+TOPIC_INVOICES = "invoices"
+TOPICS = frozenset({TOPIC_APPOINTMENTS, TOPIC_MEDICAL_RECORDS, TOPIC_INVOICES})
+
+_PENDING_KEY = "realtime_events"
+
+
+def emit(db: Session, topic: str, event_type: str, data: Dict[str, Any]) -> None:
+    """Ghi nhận event trong transaction hiện tại (phát khi commit)"""
+    db.info.setdefault(_PENDING_KEY, []).append(RealtimeEvent(topic, event_type, data))
+
+
+def emit_appointment(db: Session, appointment, action: str = "updated", status=None) -> None:
+    """appointment: ORM object hoặc Row có các cột tương ứng; status: trạng thái mới khi cập nhật bằng UPDATE trực tiếp"""
+    emit(db, TOPIC_APPOINTMENTS, f"appointment.{action}", {
+        "id": appointment.id,
+        "status": appointment.status if status is None else status,
+        "patient_id": appointment.patient_id,
+        "doctor_id": appointment.doctor_id,
+        "appointment_date": appointment.appointment_date,
+        "time_slot": appointment.time_slot,
+    })
+
+
+def emit_medical_record(db: Session, medical_record, action: str = "updated") -> None:
+    emit(db, TOPIC_MEDICAL_RECORDS, f"medical_record.{action}", {
+        "id": medical_record.id,
+        "status": medical_record.status,
+        "patient_id": medical_record.patient_id,
+        "doctor_id": medical_record.doctor_id,
+        "appointment_id": medical_record.appointment_id,
+    })
+
+
+def emit_invoice(db: Session, invoice, action: str = "created") -> None:
+    emit(db, TOPIC_INVOICES, f"invoice.{action}", {
+        "id": invoice.id,
+        "medical_record_id": invoice.medical_record_id,
+        "patient_id": invoice.patient_id,
+        "doctor_id": invoice.doctor_id,
+        "final_amount": invoice.final_amount,
+    })
+
+
+@event.listens_for(Session, "before_commit")
+def _publish_in_transaction(session: Session) -> None:
+    if backend.in_transaction:
+        events: List[RealtimeEvent] = session.info.pop(_PENDING_KEY, None)
+        if events:
+            backend.publish(session, events)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(session: Session) -> None:
+    events: List[RealtimeEvent] = session.info.pop(_PENDING_KEY, None)
+    if events:
+        backend.publish(session, events)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+async def start_realtime() -> None:
+    """Gắn hub vào event loop và khởi động backend (gọi trong lifespan)"""
+    hub.bind(asyncio.get_running_loop())
+    await run_in_threadpool(backend.start, hub)
+
+
+async def stop_realtime() -> None:
+    hub.close()
+    await run_in_threadpool(backend.stop)
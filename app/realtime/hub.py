@@ -0,0 +1,102 @@
+"""
+Hub phân phối event realtime trong một process (fan-out tới các client SSE đang kết nối).
+
+- Mỗi client là một Subscription với hàng đợi giới hạn; event được encode thành frame SSE MỘT lần
+  rồi đưa vào hàng đợi của mọi client quan tâm topic đó
+- Event có thể đến từ thread khác (session commit trong threadpool, thread LISTEN của Postgres):
+  publish() chuyển việc phân phối về event loop bằng call_soon_threadsafe
+- Client chậm làm đầy hàng đợi: bỏ các event cũ, gửi event "resync" để client tải lại danh sách
+"""
+import asyncio
+from typing import FrozenSet, Optional, Set
+
+from app.core.config import settings
+from app.monitoring.metrics import REALTIME_EVENTS_PUBLISHED, REALTIME_SUBSCRIBER_OVERFLOWS, REALTIME_SUBSCRIBERS
+
+RESYNC_FRAME = b"event: resync\ndata: {}\n\n"
+
+
+def sse_frame(event_type: str, payload: str) -> bytes:
+    """Frame SSE cho một event (payload là JSON một dòng)"""
+    return f"event: {event_type}\ndata: {payload}\n\n".encode()
+
+
+class Subscription:
+    """Một client đang nhận event; topics=None: nhận mọi topic"""
+
+    def __init__(self, topics: Optional[FrozenSet[str]], maxsize: int):
+        self.topics = topics
+        self.queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(maxsize)
+
+    def wants(self, topic: str) -> bool:
+        return self.topics is None or topic in self.topics
+
+    def offer(self, frame: Optional[bytes]) -> None:
+        """Đưa frame vào hàng đợi; đầy thì bỏ event cũ và yêu cầu client tải lại"""
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            REALTIME_SUBSCRIBER_OVERFLOWS.inc()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_FRAME if frame is not None else None)
+
+
+class EventHub:
+    """Tập client đang kết nối của process, chỉ được truy cập từ event loop"""
+
+    def __init__(self):
+        self._subscriptions: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Gắn hub vào event loop của app (gọi khi app khởi động)"""
+        self._loop = loop
+
+    def subscribe(self, topics: Optional[FrozenSet[str]] = None) -> Subscription:
+        subscription = Subscription(topics, settings.realtime_queue_size)
+        self._subscriptions.add(subscription)
+        REALTIME_SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        if subscription in self._subscriptions:
+            self._subscriptions.discard(subscription)
+            REALTIME_SUBSCRIBERS.dec()
+
+    def publish(self, topic: str, event_type: str, payload: str) -> None:
+        """Phát event từ bất kỳ thread nào; hub chưa gắn event loop (ví dụ script CLI) thì bỏ qua"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self.dispatch, topic, event_type, payload)
+
+    def dispatch(self, topic: str, event_type: str, payload: str) -> None:
+        """Phân phối event tới các client (chạy trên event loop)"""
+        REALTIME_EVENTS_PUBLISHED.inc()
+        frame = None
+        for subscription in self._subscriptions:
+            if subscription.wants(topic):
+                if frame is None:
+                    frame = sse_frame(event_type, payload)
+                subscription.offer(frame)
+
+    def request_resync(self) -> None:
+        """Yêu cầu mọi client tải lại (ví dụ backend vừa kết nối lại, có thể đã lỡ event) - gọi được từ thread khác"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._resync)
+
+    def _resync(self) -> None:
+        for subscription in self._subscriptions:
+            subscription.offer(RESYNC_FRAME)
+
+    def close(self) -> None:
+        """Báo mọi client kết thúc stream (app đang tắt)"""
+        for subscription in list(self._subscriptions):
+            subscription.offer(None)
+        self._loop = None
+
+
+hub = EventHub()
@@ -0,0 +1,76 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from uuid import UUID
+from datetime import date
+from app.core.dependencies import AuthCredentialDepend
+from app.database import get_db, get_read_db
+from app.core.authentication import protected_route
+from app.users.models import UserRoleEnum as RoleEnum
+from app.core.response import ResponseBase
+from app.reports.schemas import DoctorRevenue, RevenueGroupByEnum, RevenueReport
+from app.reports.services import ReportService
+from app.core.routing import EnvelopeRoute
+
+router = APIRouter(
+    route_class=EnvelopeRoute,  # Serialize nhanh envelope ResponseBase
+    prefix="/reports",
+    tags=["reports"],
+    responses={404: {"description": "Not found"}}
+)
+
+@router.get("/revenue", response_model=ResponseBase[RevenueReport])
+@protected_route([RoleEnum.ADMIN])
+def read_revenue(
+    CREDENTIALS: AuthCredentialDepend,
+    start_date: date = Query(..., description="Từ ngày (YYYY-MM-DD)"),
+    end_date: date = Query(..., description="Đến ngày (YYYY-MM-DD)"),
+    group_by: RevenueGroupByEnum = Query(RevenueGroupByEnum.DAY, description="Gộp theo day/week/month"),
+    doctor_id: Optional[UUID] = Query(None, description="ID bác sĩ (user_id) để lọc"),
+    DB: Session = Depends(get_read_db),
+    CURRENT_USER = None,
+):
+    """
+    Doanh thu theo ngày/tuần/tháng (tách tiền dịch vụ và tiền thuốc)
+    - Chỉ ADMIN mới có quyền xem báo cáo
+    - Đọc từ bảng rollup daily_revenue, không quét invoices
+    - Ngày của hóa đơn tính theo múi giờ phòng khám (CLINIC_TIMEZONE)
+    """
+    repo = ReportService(DB)
+    report = repo.get_revenue(start_date, end_date, group_by=group_by, doctor_id=doctor_id)
+    return ResponseBase(message="Lấy báo cáo doanh thu thành công", data=report)
+
+@router.get("/revenue/by-doctor", response_model=ResponseBase[List[DoctorRevenue]])
+@protected_route([RoleEnum.ADMIN])
+def read_revenue_by_doctor(
+    CREDENTIALS: AuthCredentialDepend,
+    start_date: date = Query(..., description="Từ ngày (YYYY-MM-DD)"),
+    end_date: date = Query(..., description="Đến ngày (YYYY-MM-DD)"),
+    DB: Session = Depends(get_read_db),
+    CURRENT_USER = None,
+):
+    """
+    Doanh thu theo bác sĩ trong khoảng ngày
+    - Chỉ ADMIN mới có quyền xem báo cáo
+    """
+    repo = ReportService(DB)
+    records = repo.get_revenue_by_doctor(start_date, end_date)
+    return ResponseBase(message="Lấy báo cáo doanh thu theo bác sĩ thành công", data=records)
+
+@router.post("/revenue/rebuild", response_model=ResponseBase[dict])
+@protected_route([RoleEnum.ADMIN])
+def rebuild_revenue(
+    CREDENTIALS: AuthCredentialDepend,
+    start_date: date = Query(..., description="Từ ngày (YYYY-MM-DD)"),
+    end_date: date = Query(..., description="Đến ngày (YYYY-MM-DD)"),
+    DB: Session = Depends(get_db),
+    CURRENT_USER = None,
+):
+    """
+    Tính lại rollup doanh thu từ hóa đơn trong khoảng ngày
+    - Chỉ ADMIN mới có quyền
+    - Dùng khi backfill hóa đơn có từ trước khi có rollup
+    """
+    repo = ReportService(DB)
+    rows = repo.rebuild_daily_revenue(start_date, end_date)
+    return ResponseBase(message="Tính lại doanh thu thành công", data={"rows": rows})
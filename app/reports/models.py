@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Date, DateTime, Double, ForeignKey, Integer
+from sqlalchemy.sql import func
+from app.database import Base
+from app.core.types import UUID
+
+class DailyRevenue(Base):
+    """
+    Model cho bảng DAILY_REVENUE - Doanh thu tổng hợp theo ngày và bác sĩ.
+    Cập nhật cộng dồn khi tạo hóa đơn (cùng transaction), báo cáo chỉ đọc bảng này thay vì quét invoices.
+    """
+    __tablename__ = "daily_revenue"
+
+    # Khóa chính kép: ngày + bác sĩ
+    day = Column(Date, primary_key=True)
+    doctor_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+
+    # Số liệu tổng hợp
+    invoice_count = Column(Integer, nullable=False, default=0)         # Số hóa đơn
+    service_revenue = Column(Double, nullable=False, default=0)        # Tiền dịch vụ
+    medication_revenue = Column(Double, nullable=False, default=0)     # Tiền thuốc
+    discount_amount = Column(Double, nullable=False, default=0)        # Giảm giá
+    total_amount = Column(Double, nullable=False, default=0)           # Tổng cộng
+    final_amount = Column(Double, nullable=False, default=0)           # Thực thu
+
+    # Timestamps
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
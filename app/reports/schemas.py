@@ -0,0 +1,46 @@
+from pydantic import BaseModel
+from typing import Optional, List
+from datetime import date
+from uuid import UUID
+import enum
+
+from app.users.schemas import UserForeignKeyResponse
+
+class BaseSchema(BaseModel):
+    """Base schema cho tất cả các schema khác"""
+    class Config:
+        from_attributes = True
+        use_enum_values = True
+
+class RevenueGroupByEnum(str, enum.Enum):
+    """Cách gộp doanh thu theo thời gian"""
+    DAY = "day"
+    WEEK = "week"       # Tuần bắt đầu từ thứ Hai
+    MONTH = "month"
+
+class RevenueTotals(BaseSchema):
+    """Số liệu doanh thu"""
+    invoice_count: int = 0
+    service_revenue: float = 0              # Tiền dịch vụ
+    medication_revenue: float = 0           # Tiền thuốc
+    discount_amount: float = 0              # Giảm giá
+    total_amount: float = 0                 # Tổng cộng (dịch vụ + thuốc)
+    final_amount: float = 0                 # Thực thu
+
+class RevenuePeriod(RevenueTotals):
+    """Doanh thu của một kỳ (ngày/tuần/tháng)"""
+    period_start: date
+
+class RevenueReport(BaseSchema):
+    """Báo cáo doanh thu theo thời gian"""
+    start_date: date
+    end_date: date
+    group_by: RevenueGroupByEnum
+    doctor_id: Optional[UUID] = None
+    totals: RevenueTotals
+    periods: List[RevenuePeriod] = []
+
+class DoctorRevenue(RevenueTotals):
+    """Doanh thu của một bác sĩ"""
+    doctor_id: UUID
+    doctor: Optional[UserForeignKeyResponse] = None
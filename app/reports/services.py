@@ -0,0 +1,177 @@
+from sqlalchemy.orm import Session
+from collections import defaultdict
+from sqlalchemy import delete, func, insert, select
+from uuid import UUID
+from typing import Dict, List, Optional
+from datetime import date, timedelta
+from fastapi import HTTPException
+from app.invoices.models import Invoice
+from app.reports.models import DailyRevenue
+from app.reports.schemas import DoctorRevenue, RevenueGroupByEnum, RevenuePeriod, RevenueReport, RevenueTotals
+from app.users.services import UserService
+from app.utils.helper import clinic_day_bounds, dialect_insert, to_clinic_date
+
+# Giới hạn khoảng thời gian của một báo cáo (số dòng rollup = số ngày x số bác sĩ)
+MAX_REPORT_DAYS = 366 * 3
+
+# Các cột số liệu của rollup, cùng tên với RevenueTotals
+METRIC_COLUMNS = (
+    "invoice_count", "service_revenue", "medication_revenue",
+    "discount_amount", "total_amount", "final_amount",
+)
+
+
+def _period_start(day: date, group_by: RevenueGroupByEnum) -> date:
+    if group_by == RevenueGroupByEnum.WEEK:
+        return day - timedelta(days=day.weekday())
+    if group_by == RevenueGroupByEnum.MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def _metrics_select():
+    """SUM từng cột số liệu của rollup"""
+    return [func.coalesce(func.sum(getattr(DailyRevenue, name)), 0).label(name) for name in METRIC_COLUMNS]
+
+
+class ReportService:
+    """Service class để xử lý logic liên quan đến báo cáo doanh thu"""
+    def __init__(self, db: Session):
+        self.db = db
+
+    def record_invoice(self, invoice: Invoice) -> None:
+        """
+        Cộng hóa đơn vừa tạo (đã flush) vào rollup ngày (UPSERT một dòng, không commit).
+        Ngày lấy từ created_at theo múi giờ phòng khám - giống rebuild_daily_revenue, backfill không làm lệch báo cáo.
+        Gọi trong transaction tạo hóa đơn: rollback hóa đơn thì rollup cũng rollback.
+        """
+        service = invoice.service_subtotal or 0
+        medication = invoice.medication_subtotal or 0
+        values = {
+            "day": to_clinic_date(invoice.created_at),
+            "doctor_id": invoice.doctor_id,
+            "invoice_count": 1,
+            "service_revenue": service,
+            "medication_revenue": medication,
+            "discount_amount": invoice.discount_amount or 0,
+            "total_amount": invoice.total_amount if invoice.total_amount is not None else service + medication,
+            "final_amount": invoice.final_amount or 0,
+        }
+        stmt = dialect_insert(self.db, DailyRevenue).values(**values)
+        columns = DailyRevenue.__table__.c
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[columns.day, columns.doctor_id],
+            set_={
+                **{name: columns[name] + stmt.excluded[name] for name in METRIC_COLUMNS},
+                "updated_at": func.now(),
+            },
+        )
+        self.db.execute(stmt)
+
+    def rebuild_daily_revenue(self, start_date: date, end_date: date) -> int:
+        """
+        Tính lại rollup từ bảng invoices cho khoảng ngày (backfill dữ liệu cũ / sửa lệch).
+        Trả về số dòng rollup đã ghi.
+        """
+        self._validate_range(start_date, end_date)
+        # Ngày của hóa đơn tính theo múi giờ phòng khám như record_invoice (không dùng DATE() của DB: phụ thuộc
+        # múi giờ của DB/session) -> lọc theo khoảng thời điểm, gộp theo ngày trong Python
+        start_at, end_at = clinic_day_bounds(start_date, end_date)
+        rows = self.db.execute(
+            select(
+                Invoice.created_at,
+                Invoice.doctor_id,
+                Invoice.service_subtotal,
+                Invoice.medication_subtotal,
+                Invoice.discount_amount,
+                Invoice.total_amount,
+                Invoice.final_amount,
+            )
+            .where(Invoice.created_at >= start_at, Invoice.created_at < end_at)
+            .execution_options(yield_per=1000)
+        )
+        rollup = defaultdict(lambda: dict.fromkeys(METRIC_COLUMNS, 0))
+        for row in rows:
+            metrics = rollup[(to_clinic_date(row.created_at), row.doctor_id)]
+            service = row.service_subtotal or 0
+            medication = row.medication_subtotal or 0
+            metrics["invoice_count"] += 1
+            metrics["service_revenue"] += service
+            metrics["medication_revenue"] += medication
+            metrics["discount_amount"] += row.discount_amount or 0
+            metrics["total_amount"] += row.total_amount if row.total_amount is not None else service + medication
+            metrics["final_amount"] += row.final_amount or 0
+        values = [{"day": day, "doctor_id": doctor_id, **metrics} for (day, doctor_id), metrics in rollup.items()]
+        try:
+            self.db.execute(delete(DailyRevenue).where(DailyRevenue.day >= start_date, DailyRevenue.day <= end_date))
+            if values:
+                self.db.execute(insert(DailyRevenue), values)
+            self.db.commit()
+            return len(values)
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def get_revenue(
+        self,
+        start_date: date,
+        end_date: date,
+        group_by: RevenueGroupByEnum = RevenueGroupByEnum.DAY,
+        doctor_id: Optional[UUID] = None,
+    ) -> RevenueReport:
+        """Doanh thu theo ngày/tuần/tháng: SQL gộp theo ngày, Python gộp tiếp theo tuần/tháng"""
+        self._validate_range(start_date, end_date)
+        query = (
+            select(DailyRevenue.day, *_metrics_select())
+            .where(DailyRevenue.day >= start_date, DailyRevenue.day <= end_date)
+            .group_by(DailyRevenue.day)
+            .order_by(DailyRevenue.day)
+        )
+        if doctor_id:
+            query = query.where(DailyRevenue.doctor_id == doctor_id)
+
+        periods: Dict[date, RevenuePeriod] = {}
+        totals = RevenueTotals()
+        for row in self.db.execute(query):
+            key = _period_start(row.day, group_by)
+            period = periods.get(key)
+            if period is None:
+                period = periods[key] = RevenuePeriod(period_start=key)
+            for name in METRIC_COLUMNS:
+                value = getattr(row, name)
+                setattr(period, name, getattr(period, name) + value)
+                setattr(totals, name, getattr(totals, name) + value)
+        return RevenueReport(
+            start_date=start_date,
+            end_date=end_date,
+            group_by=group_by,
+            doctor_id=doctor_id,
+            totals=totals,
+            periods=list(periods.values()),
+        )
+
+    def get_revenue_by_doctor(self, start_date: date, end_date: date) -> List[DoctorRevenue]:
+        """Doanh thu theo bác sĩ trong khoảng ngày, sắp xếp theo thực thu giảm dần"""
+        self._validate_range(start_date, end_date)
+        rows = self.db.execute(
+            select(DailyRevenue.doctor_id, *_metrics_select())
+            .where(DailyRevenue.day >= start_date, DailyRevenue.day <= end_date)
+            .group_by(DailyRevenue.doctor_id)
+            .order_by(func.sum(DailyRevenue.final_amount).desc())
+        ).all()
+        doctors = UserService(self.db).get_users_by_ids(row.doctor_id for row in rows)
+        return [
+            DoctorRevenue(
+                doctor_id=row.doctor_id,
+                doctor=doctors.get(row.doctor_id),
+                **{name: getattr(row, name) for name in METRIC_COLUMNS},
+            )
+            for row in rows
+        ]
+
+    @staticmethod
+    def _validate_range(start_date: date, end_date: date) -> None:
+        if start_date > end_date:
+            raise HTTPException(status_code=400, detail="Ngày bắt đầu phải trước hoặc bằng ngày kết thúc")
+        if (end_date - start_date).days >= MAX_REPORT_DAYS:
+            raise HTTPException(status_code=400, detail=f"Khoảng thời gian báo cáo tối đa {MAX_REPORT_DAYS} ngày")
@@ -4,14 +4,16 @@ from typing import List, Optional
 from uuid import UUID
 from datetime import date
 from app.core.dependencies import AuthCredentialDepend
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.core.authentication import protected_route
 from app.users.models import UserRoleEnum as RoleEnum
 from app.core.response import PaginationMeta, ResponseBase, PaginatedResponse
 from app.service_indications.schemas import ServiceIndicationCreate, ServiceIndicationDetailCreate, ServiceIndicationResponse, ServiceIndicationDetailResponse, ServiceIndicationFullResponse, ServiceIndicationUpdate
 from app.service_indications.services import ServiceIndicationService
+from app.core.routing import EnvelopeRoute
 
 router = APIRouter(
+    route_class=EnvelopeRoute,  # Serialize nhanh envelope ResponseBase
     prefix="/service-indications",
     tags=["service-indications"],
     responses={404: {"description": "Not found"}}
@@ -55,7 +57,7 @@ def create_service_indication(
 def read_service_indication(
     CREDENTIALS: AuthCredentialDepend,
     service_indication_id: UUID,
-    DB: Session = Depends(get_db),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     """
@@ -75,7 +77,7 @@ def read_service_indications(
     # doctor_id: Optional[UUID] = Query(None, description="ID bác sĩ (user_id) để lọc"),
     skip: int = Query(0, ge=0, description="Số bản ghi bỏ qua"),
     limit: int = Query(10, ge=1, le=100, description="Số bản ghi lấy về"),
-    DB: Session = Depends(get_db),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     """
@@ -3,7 +3,7 @@ from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
 import uuid
-from sqlalchemy.dialects.postgresql import UUID
+from app.core.types import UUID
 
 class ServiceIndication(Base):
     """Model cho bảng SERVICE_INDICATION - Phiếu chỉ định dịch vụ"""
@@ -13,7 +13,7 @@ class ServiceIndication(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     
     # Khóa ngoại - không được null
-    medical_record_id = Column(UUID(as_uuid=True), ForeignKey("medical_records.id"), nullable=False)
+    medical_record_id = Column(UUID(as_uuid=True), ForeignKey("medical_records.id"), nullable=False, index=True)
     
     # Thông tin phiếu chỉ định dịch vụ
     notes = Column(Text)                                           # Ghi chú cho phiếu chỉ định dịch vụ
@@ -34,7 +34,7 @@ class ServiceIndicationDetail(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     
     # Khóa ngoại - không được null
-    service_indication_id = Column(UUID(as_uuid=True), ForeignKey("service_indications.id"), nullable=False)
+    service_indication_id = Column(UUID(as_uuid=True), ForeignKey("service_indications.id"), nullable=False, index=True)
     service_id = Column(UUID(as_uuid=True), ForeignKey("services.id"), nullable=False)
     
     # Thông tin chi tiết
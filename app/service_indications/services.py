@@ -1,3 +1,4 @@
+from functools import cached_property
 from sqlalchemy.orm import Session, joinedload
 from app.service_indications.models import ServiceIndication, ServiceIndicationDetail
 from app.service_indications.schemas import ServiceIndicationCreate, ServiceIndicationUpdate, ServiceIndicationResponse, ServiceIndicationDetailCreate, ServiceIndicationDetailUpdate, ServiceIndicationDetailResponse, ServiceIndicationFullResponse
@@ -10,7 +11,11 @@ from app.services.services import ServiceService
 class ServiceIndicationService:
     def __init__(self, db: Session):
         self.db = db
-        self.service_service = ServiceService(db)
+
+    @cached_property
+    def service_service(self) -> ServiceService:
+        """Service phụ khởi tạo khi dùng lần đầu"""
+        return ServiceService(self.db)
     
     def create_service_indication(self, service_indication_in: ServiceIndicationCreate) -> ServiceIndication:
         """Tạo một ServiceIndication mới  với transaction built-in"""
@@ -4,14 +4,16 @@ from typing import List, Optional
 from uuid import UUID
 from datetime import date
 from app.core.dependencies import AuthCredentialDepend
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.core.authentication import protected_route
 from app.users.models import UserRoleEnum as RoleEnum
 from app.core.response import PaginationMeta, ResponseBase, PaginatedResponse
 from app.services.schemas import ServiceCreate, ServiceUpdate, ServiceResponse
 from app.services.services import ServiceService
+from app.core.routing import EnvelopeRoute
 
 router = APIRouter(
+    route_class=EnvelopeRoute,  # Serialize nhanh envelope ResponseBase
     prefix="/services",
     tags=["services"],
     responses={404: {"description": "Not found"}}
@@ -38,7 +40,7 @@ def create_service(
 def read_service(
     CREDENTIALS: AuthCredentialDepend,
     service_id: UUID,
-    DB: Session = Depends(get_db),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     """
@@ -57,7 +59,7 @@ def read_services(
     skip: int = Query(0, ge=0, description="Số bản ghi bỏ qua"),
     limit: int = Query(10, ge=1, le=100, description="Số bản ghi lấy về"),
     q: Optional[str] = Query(None, description="Từ khoá tìm kiếm theo tên dịch vụ"),
-    DB: Session = Depends(get_db),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     """
@@ -3,7 +3,7 @@ from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
 import uuid
-from sqlalchemy.dialects.postgresql import UUID
+from app.core.types import UUID
 
 class Service(Base):
     """Model cho bảng SERVICE - Quản lý dịch vụ"""
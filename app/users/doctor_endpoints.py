@@ -3,14 +3,16 @@ from sqlalchemy.orm import Session
 from typing import List
 from uuid import UUID
 from app.core.dependencies import AuthCredentialDepend
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.users.schemas import UserCreate, UserUpdate, DoctorUpdate, DoctorResponse, DoctorCombinedCreate, DoctorCombinedUpdate
 from app.users.services import UserService, DoctorService
 from app.core.authentication import protected_route
 from app.users.models import UserRoleEnum as RoleEnum
 from app.core.response import PaginationMeta, ResponseBase, PaginatedResponse
+from app.core.routing import EnvelopeRoute
 
 router = APIRouter(
+    route_class=EnvelopeRoute,  # Serialize nhanh envelope ResponseBase
     prefix="/doctors",    # Tất cả endpoint sẽ có prefix /doctors
     tags=["doctors"],      # Nhóm trong Swagger docs
     responses={404: {"description": "Not found"}}  # Response chung cho 404
@@ -55,7 +57,7 @@ def create_doctor(
 def read_doctor(
     CREDENTIALS: AuthCredentialDepend,
     doctor_id: UUID,
-    DB: Session = Depends(get_db),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     """
@@ -75,7 +77,7 @@ def read_doctors(
     CREDENTIALS: AuthCredentialDepend,
     skip: int = Query(0, ge=0, description="Số bản ghi bỏ qua"),
     limit: int = Query(100, ge=1, le=100, description="Số bản ghi tối đa"),
-    DB: Session = Depends(get_db),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     """
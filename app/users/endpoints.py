@@ -5,12 +5,13 @@ from typing import List, Optional
 from uuid import UUID
 from datetime import datetime, date
 from app.core.dependencies import AuthCredentialDepend
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.users.schemas import UserCreate, UserUpdate, UserResponse
 from app.users.services import UserService
 from app.core.authentication import protected_route
 from app.users.models import GenderEnum, UserRoleEnum as RoleEnum
 from app.core.response import PaginationMeta, ResponseBase, PaginatedResponse
+from app.core.routing import EnvelopeRoute
 from app.users.validators import (
     validate_dob_at_least_18_form_data,
     validate_phone_number_form_data,
@@ -18,6 +19,7 @@ from app.users.validators import (
 )
 
 router = APIRouter(
+    route_class=EnvelopeRoute,  # Serialize nhanh envelope ResponseBase
     prefix="/users",    # Tất cả endpoint sẽ có prefix /users
     tags=["users"],      # Nhóm trong Swagger docs
     responses={404: {"description": "Not found"}}  # Response chung cho 404
@@ -121,7 +123,7 @@ async def create_user_with_avatar(
 def read_user(
     CREDENTIALS: AuthCredentialDepend,
     user_id: UUID, 
-    DB: Session = Depends(get_db),
+    DB: Session = Depends(get_read_db),
     CURRENT_USER = None,
 ):
     repo = UserService(DB)
@@ -138,7 +140,7 @@ def read_users(
 	skip: int = Query(0, ge=0, description="Số bản ghi bỏ qua"),
 	limit: int = Query(100, ge=1, le=100, description="Số bản ghi tối đa"),
 	q: Optional[str] = Query(None, description="Search query: tìm theo full_name (không phân biệt hoa thường) hoặc username hoặc phone_number"),
-	DB: Session = Depends(get_db),
+	DB: Session = Depends(get_read_db),
 	CURRENT_USER = None,
 ):
     """
@@ -5,7 +5,7 @@ from app.appointments.models import Appointment
 from app.database import Base
 import enum
 import uuid
-from sqlalchemy.dialects.postgresql import UUID
+from app.core.types import UUID
 
 class GenderEnum(enum.Enum):
     """Enum cho giới tính"""
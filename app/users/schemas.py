@@ -111,7 +111,7 @@ class UserResponse(BaseSchema):
     dob: Optional[date] = None              # Ngày sinh (không bắt buộc)
     gender: Optional[GenderEnum] = None     # Giới tính (không bắt buộc)
     phone_number: str                       # Số điện thoại (bắt buộc)
-    email: EmailStr                         # Email với validation tự động
+    email: str                              # Email (đã validate khi ghi, không validate lại khi trả về)
     role: Optional[UserRoleEnum] = None     # Vai trò (không bắt buộc)
     avatar: Optional[str] = None
     is_active: bool                         # Trạng thái hoạt động
@@ -136,7 +136,7 @@ class UserTokenData(BaseSchema):
     id: UUID
     username: str
     full_name: Optional[str] = None
-    email: EmailStr
+    email: str
     phone_number: str
     role: UserRoleEnum
 
@@ -1,6 +1,7 @@
+from functools import cached_property
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional
 from uuid import UUID
 from datetime import datetime
 import bcrypt
@@ -9,6 +10,8 @@ from app.users.schemas import UserCreate, UserUpdate, UserTokenData, UserRespons
 from fastapi import HTTPException, UploadFile
 from app.core.response import ErrorResponse
 from app.utils.file_handler import file_handler
+from app.utils.helper import get_many_by_ids
+from app.monitoring.metrics import BCRYPT_IN_PROGRESS
 
 class UserService:
     """Service class để xử lý logic liên quan đến User"""
@@ -19,13 +22,15 @@ class UserService:
     def get_password_hash(password: str) -> str:
         """Mã hóa password"""
         # Chuyển password thành bytes và hash với bcrypt
-        hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        with BCRYPT_IN_PROGRESS.track_inprogress():
+            hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
         return hashed.decode('utf-8')
     
     @staticmethod
     def verify_password(plain_password: str, hashed_password: str) -> bool:
         """Xác thực password"""
-        return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+        with BCRYPT_IN_PROGRESS.track_inprogress():
+            return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
     def validate_login(self, user_in: dict) -> Optional[User]:
         # user = (
@@ -106,19 +111,19 @@ class UserService:
 
     # @staticmethod
     def get_user_by_id(self, user_id: UUID) -> Optional[User]:
-        """Lấy user theo ID"""
-        db_user = self.db.query(User).filter(and_(User.id == user_id, User.deleted_at.is_(None))).first()
-        if not db_user:
+        """
+        Lấy user theo ID
+        - Dùng Session.get: user đã load trong request (ví dụ CURRENT_USER) được lấy từ identity map, không query lại
+        """
+        db_user = self.db.get(User, user_id)
+        if not db_user or db_user.deleted_at is not None:
             return None
         return db_user
 
-    # @staticmethod
-    def get_user_by_id(self, user_id: UUID) -> Optional[User]:
-        """Lấy user theo ID"""
-        db_user = self.db.query(User).filter(and_(User.id == user_id, User.deleted_at.is_(None))).first()
-        if not db_user:
-            return None
-        return db_user
+    def get_users_by_ids(self, user_ids: Iterable[UUID]) -> Dict[UUID, User]:
+        """Lấy nhiều user theo ID trong một query (bỏ qua user đã có trong session, user đã xóa)"""
+        users = get_many_by_ids(self.db, User, user_ids)
+        return {user_id: user for user_id, user in users.items() if user.deleted_at is None}
     
     def get_user_by_email(self, email: str) -> Optional[User]:
         """Lấy user theo email"""
@@ -195,7 +200,11 @@ class DoctorService:
     """Service class để xử lý logic liên quan đến Doctor"""
     def __init__(self, db: Session):
         self.db = db
-        self.user_service = UserService(db)
+
+    @cached_property
+    def user_service(self) -> UserService:
+        """Service phụ khởi tạo khi dùng lần đầu"""
+        return UserService(self.db)
 
     def create_doctor(self, doctor_in: DoctorCombinedCreate) -> DoctorResponse:
         """Tạo bác sĩ mới (bao gồm cả User và Doctor) từ schema gộp"""
@@ -257,9 +266,11 @@ class DoctorService:
     def get_doctors(self, skip: int = 0, limit: int = 10) -> list[Doctor]:
         """Lấy danh sách bác sĩ với phân trang"""
         doctors = self.db.query(Doctor).offset(skip).limit(limit).all()
+        # Lấy user của cả trang bằng một query thay vì một query mỗi bác sĩ
+        users = self.user_service.get_users_by_ids(d.user_id for d in doctors)
         result = []
         for doctor in doctors:
-            user = self.user_service.get_user_by_id(doctor.user_id)
+            user = users.get(doctor.user_id)
             if user:
                 doctor_response = DoctorResponse(
                     id=doctor.id,
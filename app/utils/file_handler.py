@@ -7,6 +7,7 @@ from fastapi import UploadFile, HTTPException, status
 from PIL import Image
 import shutil
 from datetime import datetime
+from app.monitoring.metrics import UPLOADS_IN_PROGRESS
 
 class FileHandler:
     """Class xử lý upload và lưu trữ file ảnh"""
@@ -124,6 +125,11 @@ class FileHandler:
         Returns:
             URL đường dẫn đến file ảnh (ví dụ: /uploads/avatars/abc123.jpg)
         """
+        with UPLOADS_IN_PROGRESS.track_inprogress():
+            return self._save_upload_file(file)
+
+    def _save_upload_file(self, file: UploadFile) -> str:
+        """Phần ghi file của save_upload_file (tách ra để đếm số upload đang xử lý)"""
         # Bước 1: Validate file
         self.validate_image(file)
         
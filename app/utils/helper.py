@@ -1,6 +1,17 @@
+import base64
+import json
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+from fastapi import HTTPException
 from fastapi.exceptions import RequestValidationError
 from pydantic import ValidationError
-from typing import Any, List
+from pydantic_core import to_json
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+from typing import Any, Dict, Iterable, List, Tuple, Type
+from app.core.config import settings
 
 def raise_validation_error(field: str, message: str, type: str = "value_error"):
     """
@@ -13,4 +24,73 @@ def raise_validation_error(field: str, message: str, type: str = "value_error"):
         "input": None,
         "ctx": {"error": {}}  # có thể thêm ctx nếu cần
     }
-    raise RequestValidationError([error])
\ No newline at end of file
+    raise RequestValidationError([error])
+
+
+def get_many_by_ids(db: Session, model: Type[Any], ids: Iterable[Any], options: Iterable[Any] = ()) -> Dict[Any, Any]:
+    """
+    Lấy nhiều bản ghi theo primary key, dùng identity map của session làm cache trong request:
+    - Object đã load trong session (và chưa bị expire) được dùng lại, không query
+    - Các id còn thiếu được lấy trong MỘT query IN (...)
+    Trả về dict id -> object (id không tồn tại sẽ không có trong dict).
+    """
+    found: Dict[Any, Any] = {}
+    missing = []
+    for id_ in {id_ for id_ in ids if id_ is not None}:
+        obj = db.identity_map.get(identity_key(model, id_))
+        if obj is not None and not inspect(obj).expired_attributes:
+            found[id_] = obj
+        else:
+            missing.append(id_)
+    if missing:
+        for obj in db.query(model).options(*options).filter(model.id.in_(missing)):
+            found[obj.id] = obj
+    return found
+
+
+def dialect_insert(db: Session, model: Type[Any]):
+    """
+    INSERT hỗ trợ ON CONFLICT (upsert) theo dialect của session: Postgres hoặc SQLite
+    (cả hai có cùng API on_conflict_do_update / on_conflict_do_nothing).
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+
+def encode_cursor(*values: Any) -> str:
+    """Cursor phân trang (keyset): các giá trị sắp xếp của bản ghi cuối trang, dạng chuỗi an toàn cho URL"""
+    return base64.urlsafe_b64encode(to_json(list(values))).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Giải mã cursor từ encode_cursor (giá trị ở dạng JSON: datetime/UUID là chuỗi), cursor sai -> 400"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Cursor không hợp lệ")
+    return values
+
+
+@lru_cache(maxsize=None)
+def clinic_timezone() -> ZoneInfo:
+    return ZoneInfo(settings.clinic_timezone)
+
+
+def to_clinic_date(value: datetime) -> date:
+    """Ngày theo múi giờ phòng khám của một thời điểm (datetime không có múi giờ - SQLite - được coi là UTC)"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(clinic_timezone()).date()
+
+
+def clinic_day_bounds(start_date: date, end_date: date) -> Tuple[datetime, datetime]:
+    """Khoảng thời điểm (UTC) [0h ngày start_date, 0h ngày sau end_date) theo múi giờ phòng khám"""
+    tz = clinic_timezone()
+    start = datetime.combine(start_date, time.min, tzinfo=tz)
+    end = datetime.combine(end_date + timedelta(days=1), time.min, tzinfo=tz)
+    return start.astimezone(timezone.utc), end.astimezone(timezone.utc)
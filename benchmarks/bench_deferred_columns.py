@@ -0,0 +1,165 @@
+"""
+Benchmark deferred loading các cột lâm sàng của Patient / MedicalRecord.
+
+So sánh trên dataset seed (SQLite in-memory):
+- eager:    cách cũ - cột lâm sàng luôn được SELECT khi nhúng patient/record (undefer_group)
+- deferred: mặc định mới - cột lâm sàng chỉ load khi được yêu cầu
+
+Các chỉ số:
+- db bytes/page: tổng kích thước giá trị các cột DB trả về cho một trang
+- rows/s: số dòng/giây khi query + dựng object ORM
+- payload bytes/page: kích thước JSON invoice list (PatientResponse cũ vs PatientSummary)
+
+Chạy: python -m benchmarks.bench_deferred_columns [--patients 2000] [--page 100] [--iterations 50]
+"""
+import argparse
+import random
+import uuid
+from datetime import date, time, timedelta
+
+from benchmarks.common import Timer
+
+from pydantic_core import to_json
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, joinedload, undefer_group
+
+import app.models  # noqa: F401  - đăng ký toàn bộ model
+from app.appointments.models import Appointment
+from app.database import Base, create_test_engine
+from app.invoices.models import Invoice
+from app.invoices.schemas import InvoiceResponse
+from app.medical_records.models import MedicalRecord
+from app.patients.models import CLINICAL_COLUMNS_GROUP, Patient
+from app.patients.schemas import PatientResponse
+from app.users.models import User, UserRoleEnum
+
+LOREM = (
+    "Bệnh nhân có tiền sử viêm da cơ địa, đã điều trị corticoid bôi nhiều đợt, "
+    "tái phát theo mùa, kèm mụn trứng cá vùng má và trán. "
+)
+
+
+def seed(db: Session, patients: int, rng: random.Random) -> None:
+    """Seed dữ liệu: mỗi bệnh nhân có 2 lịch hẹn, 1 hồ sơ, 1 hóa đơn"""
+    doctors = [
+        User(id=uuid.UUID(int=rng.getrandbits(128)), username=f"doctor{i}", password="x", full_name=f"Bác sĩ {i}",
+             phone_number=f"09000000{i:02d}", email=f"doctor{i}@clinic.vn", role=UserRoleEnum.DOCTOR)
+        for i in range(10)
+    ]
+    db.add_all(doctors)
+    today = date(2025, 1, 1)
+    for i in range(patients):
+        patient = Patient(
+            id=uuid.UUID(int=rng.getrandbits(128)), full_name=f"Bệnh nhân {i}", phone_number=f"09{i:08d}",
+            dob=date(1980 + i % 30, 1 + i % 12, 1 + i % 28), email=f"patient{i}@example.com",
+            medical_history=LOREM * rng.randint(2, 6), allergies=LOREM, current_medications=LOREM,
+            current_condition=LOREM * 2, notes=LOREM * rng.randint(1, 4),
+        )
+        doctor = rng.choice(doctors)
+        appointments = [
+            Appointment(id=uuid.UUID(int=rng.getrandbits(128)), patient_id=patient.id, doctor_id=doctor.id,
+                        created_by=doctor.id, appointment_date=today + timedelta(days=rng.randint(0, 90)),
+                        appointment_time=time(8 + rng.randint(0, 9), 0), time_slot="30 phút", status="SCHEDULED")
+            for _ in range(2)
+        ]
+        record = MedicalRecord(id=uuid.UUID(int=rng.getrandbits(128)), patient_id=patient.id, doctor_id=doctor.id,
+                               appointment_id=appointments[0].id, symptoms=LOREM * 2, diagnosis=LOREM,
+                               notes=LOREM, status="PAID")
+        invoice = Invoice(id=uuid.UUID(int=rng.getrandbits(128)), medical_record_id=record.id, patient_id=patient.id,
+                          doctor_id=doctor.id, created_by=doctor.id, service_subtotal=300000.0,
+                          medication_subtotal=150000.0, total_amount=450000.0, discount_amount=0.0,
+                          final_amount=450000.0)
+        db.add_all([patient, *appointments, record, invoice])
+    db.commit()
+
+
+class FetchedBytes:
+    """Đo tổng kích thước giá trị các cột DB trả về bằng cách chạy lại câu SQL đã capture"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+        event.listen(engine, "before_cursor_execute", self._capture)
+
+    def _capture(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((statement, parameters))
+
+    def measure(self) -> int:
+        statements, self.statements = self.statements, []
+        total = 0
+        with self.engine.connect() as conn:
+            for statement, parameters in statements:
+                for row in conn.exec_driver_sql(statement, parameters):
+                    total += sum(len(str(value)) for value in row if value is not None)
+        self.statements.clear()  # Bỏ các câu SQL vừa chạy để đo
+        return total
+
+
+class InvoiceResponseBefore(InvoiceResponse):
+    """InvoiceResponse trước thay đổi: nhúng đầy đủ PatientResponse"""
+    patient: PatientResponse = None
+
+
+SCENARIOS = {
+    # tên: builder(eager) -> statement; eager=True là cách load cũ (SELECT cả cột lâm sàng)
+    "appointments": lambda eager: select(Appointment).options(
+        joinedload(Appointment.patient).undefer_group(CLINICAL_COLUMNS_GROUP) if eager
+        else joinedload(Appointment.patient)
+    ),
+    "invoices": lambda eager: select(Invoice).options(
+        joinedload(Invoice.patient).undefer_group(CLINICAL_COLUMNS_GROUP) if eager
+        else joinedload(Invoice.patient)
+    ),
+    # Load hồ sơ để kiểm tra trạng thái (luồng tạo hóa đơn) - không cần symptoms/diagnosis/notes
+    "medical_records": lambda eager: select(MedicalRecord).options(
+        *([undefer_group(CLINICAL_COLUMNS_GROUP)] if eager else [])
+    ),
+}
+
+
+def run(patients: int, page: int, iterations: int) -> None:
+    engine = create_test_engine()
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        seed(db, patients, random.Random(42))
+
+    fetched = FetchedBytes(engine)
+    print(f"patients={patients} page={page} iterations={iterations}")
+    print(f"{'scenario':<24}{'mode':<10}{'db bytes/page':>15}{'rows/s':>12}")
+    for name, build in SCENARIOS.items():
+        for mode in ("eager", "deferred"):
+            stmt = build(mode == "eager").limit(page)
+            with Session(engine) as db:
+                db.execute(stmt).unique().scalars().all()
+            db_bytes = fetched.measure()
+
+            with Timer() as t:
+                for _ in range(iterations):
+                    with Session(engine) as db:
+                        db.execute(stmt).unique().scalars().all()
+            fetched.statements.clear()
+            rows_per_sec = page * iterations / (t.elapsed_ms / 1000)
+            print(f"{name:<24}{mode:<10}{db_bytes:>15}{rows_per_sec:>12.0f}")
+
+    # Payload JSON của invoice list: PatientResponse (cũ) vs PatientSummary (mới)
+    print()
+    with Session(engine) as db:
+        invoices = db.execute(
+            select(Invoice).options(joinedload(Invoice.patient).undefer_group(CLINICAL_COLUMNS_GROUP)).limit(page)
+        ).unique().scalars().all()
+        for label, schema in (("PatientResponse", InvoiceResponseBefore), ("PatientSummary", InvoiceResponse)):
+            payload = to_json([schema.model_validate(i, from_attributes=True) for i in invoices])
+            print(f"invoice list payload/page with {label:<16}{len(payload):>10} bytes")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+    run(args.patients, args.page, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Micro-benchmark đường serialize response của các list endpoint chính.
+
+So sánh cùng một payload (trang 100 bản ghi, có object lồng patient/doctor) qua:
+- default: APIRoute + JSONResponse của FastAPI (validate lại + jsonable + json.dumps)
+- fast:    EnvelopeRoute + FastJSONResponse (validate một lần + pydantic-core)
+
+Không cần database: dữ liệu là object giả lập ORM (đọc qua from_attributes).
+
+Chạy: python -m benchmarks.bench_serialization [--rows 100] [--iterations 300]
+"""
+import argparse
+import asyncio
+import uuid
+from datetime import date, datetime, time, timezone
+from types import SimpleNamespace
+
+from benchmarks.common import Timer, asgi_request, percentiles
+
+from fastapi import APIRouter, FastAPI
+from fastapi.routing import APIRoute
+
+from app.appointments.schemas import AppointmentResponse
+from app.core.response import FastJSONResponse, PaginatedResponse, PaginationMeta
+from app.core.routing import EnvelopeRoute
+from app.invoices.schemas import InvoiceResponse
+from app.medical_records.schemas import MedicalRecordResponse
+from app.patients.schemas import PatientResponse
+
+
+def make_patient(i: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=uuid.uuid4(), full_name=f"Bệnh nhân {i}", dob=date(1990, 1, 1), gender="FEMALE",
+        phone_number="0912345678", email=f"patient{i}@example.com", address="12 Nguyễn Trãi, Hà Nội",
+        medical_history="Viêm da cơ địa từ nhỏ, đã điều trị nhiều đợt" * 3, allergies="Penicillin",
+        current_medications="Isotretinoin 10mg", current_condition="Mụn trứng cá mức độ vừa",
+        notes="Tái khám định kỳ", created_at=datetime.now(timezone.utc), deleted_at=None,
+    )
+
+
+def make_user(i: int) -> SimpleNamespace:
+    return SimpleNamespace(id=uuid.uuid4(), full_name=f"Bác sĩ {i}")
+
+
+def make_appointment(i: int) -> SimpleNamespace:
+    patient, doctor = make_patient(i), make_user(i)
+    return SimpleNamespace(
+        id=uuid.uuid4(), patient_id=patient.id, doctor_id=doctor.id, created_by=doctor.id,
+        appointment_date=date.today(), appointment_time=time(17, 30), time_slot="30 phút",
+        status="SCHEDULED", notes="Khám lần đầu", created_at=datetime.now(timezone.utc),
+        patient=patient, doctor=doctor,
+    )
+
+
+def make_medical_record(i: int) -> SimpleNamespace:
+    patient, doctor = make_patient(i), make_user(i)
+    return SimpleNamespace(
+        id=uuid.uuid4(), patient_id=patient.id, doctor_id=doctor.id, appointment_id=uuid.uuid4(),
+        symptoms="Mụn viêm vùng má", diagnosis="Acne vulgaris", status="COMPLETED", notes=None,
+        created_at=datetime.now(timezone.utc), patient=patient, doctor=doctor,
+    )
+
+
+def make_invoice(i: int) -> SimpleNamespace:
+    patient, doctor = make_patient(i), make_user(i)
+    return SimpleNamespace(
+        id=uuid.uuid4(), medical_record_id=uuid.uuid4(), patient_id=patient.id, doctor_id=doctor.id,
+        created_by=doctor.id, service_subtotal=300000.0, medication_subtotal=150000.0, total_amount=450000.0,
+        discount_amount=0.0, final_amount=450000.0, notes=None, created_at=datetime.now(timezone.utc),
+        patient=patient, doctor=doctor, created_by_user=doctor,
+    )
+
+
+SCENARIOS = {
+    "appointments": (AppointmentResponse, make_appointment),
+    "medical_records": (MedicalRecordResponse, make_medical_record),
+    "invoices": (InvoiceResponse, make_invoice),
+    "patients": (PatientResponse, make_patient),
+}
+
+
+def make_endpoint(data: list, rows: int):
+    meta = PaginationMeta(total=rows * 10, page=1, limit=rows, total_pages=10)
+
+    def endpoint():
+        return PaginatedResponse(message="ok", data=data, meta=meta)
+    return endpoint
+
+
+def build_app(rows: int) -> FastAPI:
+    """App có mỗi scenario 2 route: /default/<name> và /fast/<name>"""
+    app = FastAPI(default_response_class=FastJSONResponse)
+    default_router = APIRouter(prefix="/default", route_class=APIRoute)
+    fast_router = APIRouter(prefix="/fast", route_class=EnvelopeRoute)
+
+    for name, (schema, factory) in SCENARIOS.items():
+        endpoint = make_endpoint([factory(i) for i in range(rows)], rows)
+        for router in (default_router, fast_router):
+            router.add_api_route(f"/{name}", endpoint, methods=["GET"], response_model=PaginatedResponse[schema])
+
+    app.include_router(default_router)
+    app.include_router(fast_router)
+    return app
+
+
+async def run(rows: int, iterations: int) -> None:
+    app = build_app(rows)
+    print(f"rows/page={rows} iterations={iterations}")
+    print(f"{'endpoint':<16}{'path':<9}{'mean ms':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'bytes':>9}")
+    for name in SCENARIOS:
+        results = {}
+        for variant in ("default", "fast"):
+            url = f"/{variant}/{name}"
+            _, _, body = await asgi_request(app, "GET", url)  # warm-up
+            samples = []
+            for _ in range(iterations):
+                with Timer() as t:
+                    status, _, body = await asgi_request(app, "GET", url)
+                assert status == 200, (url, status, body[:200])
+                samples.append(t.elapsed_ms)
+            stats = percentiles(samples)
+            results[variant] = stats
+            print(f"{name:<16}{variant:<9}{stats['mean']:>10.3f}{stats['p50']:>9.3f}{stats['p95']:>9.3f}{stats['p99']:>9.3f}{len(body):>9}")
+        print(f"{'':<16}speedup  {results['default']['mean'] / results['fast']['mean']:>9.2f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=300)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+"""
+Sinh dữ liệu benchmark cho một phòng khám lớn (deterministic: cùng seed + scale -> cùng dữ liệu).
+
+Quy mô (--scale):
+- small:  2k bệnh nhân,   20k lịch hẹn,  10k hồ sơ khám
+- medium: 20k bệnh nhân,  200k lịch hẹn, 100k hồ sơ khám
+- large:  200k bệnh nhân, 2M lịch hẹn,   1M hồ sơ khám
+
+Mỗi hồ sơ khám gắn với một lịch hẹn đã hoàn thành, có đơn thuốc + phiếu chỉ định dịch vụ.
+~90% hồ sơ đã thanh toán (có hóa đơn), phần còn lại ở trạng thái COMPLETED chờ thanh toán
+(dùng cho kịch bản checkout).
+Ledger tồn kho: mỗi thuốc một dòng nhập kho ban đầu + một dòng xuất thuốc cho mỗi thuốc của hóa đơn,
+medications.stock_quantity khớp với tổng ledger (kiểm tra bằng python -m app.medications.reconcile).
+
+Dữ liệu được insert bằng Core executemany theo lô, không qua ORM, để seed quy mô large trong vài phút.
+Mật khẩu của mọi user là BENCH_PASSWORD (hash bcrypt tính một lần).
+
+Chạy riêng: python -m benchmarks.dataset --database-url sqlite:////tmp/dcm-bench.db --scale small
+"""
+import argparse
+import random
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterator, List
+
+from benchmarks.common import Timer
+
+from sqlalchemy import Engine, bindparam, create_engine, func, insert, select, update
+
+import app.models  # noqa: F401  - đăng ký toàn bộ model
+from app.appointments.models import Appointment
+from app.database import Base, create_test_engine
+from app.invoices.models import Invoice
+from app.medical_records.models import MedicalRecord
+from app.medications.models import Medication, StockMovement
+from app.patients.models import Patient
+from app.prescriptions.models import Prescription, PrescriptionDetail
+from app.service_indications.models import ServiceIndication, ServiceIndicationDetail
+from app.services.models import Service
+from app.users.models import Doctor, User
+from app.users.services import UserService
+
+BENCH_PASSWORD = "benchmark123"
+# Ngày cuối của dữ liệu: lịch hẹn trải đều trong DAYS ngày tính ngược từ ngày này
+REFERENCE_DATE = date(2025, 6, 30)
+DAYS = 365
+BATCH_SIZE = 10_000
+INITIAL_STOCK = 10_000_000
+
+FIRST_NAMES = ["An", "Bình", "Chi", "Dũng", "Giang", "Hà", "Hải", "Hạnh", "Hoa", "Hùng", "Lan", "Linh",
+               "Long", "Mai", "Minh", "Nam", "Ngọc", "Phương", "Quân", "Sơn", "Thảo", "Trang", "Tuấn", "Vy"]
+LAST_NAMES = ["Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Huỳnh", "Phan", "Vũ", "Võ", "Đặng", "Bùi", "Đỗ"]
+MIDDLE_NAMES = ["Văn", "Thị", "Minh", "Ngọc", "Thanh", "Đức", "Hoài", "Gia"]
+DIAGNOSES = ["Viêm da cơ địa", "Mụn trứng cá", "Nấm da", "Vảy nến", "Mề đay", "Nám da", "Viêm nang lông",
+             "Chàm tiếp xúc", "Zona thần kinh", "Rụng tóc từng vùng"]
+SYMPTOMS = ["Ngứa nhiều về đêm", "Mẩn đỏ vùng mặt", "Da bong vảy", "Nổi mụn mủ", "Rát khi tiếp xúc nắng",
+            "Mảng da dày sừng", "Sẩn phù từng đợt"]
+DOSAGE_FORMS = ["Viên", "Tuýp", "Chai", "Gói", "Lọ"]
+TIME_SLOTS = ["30 phút", "45 phút", "60 phút"]
+
+
+@dataclass(frozen=True)
+class Scale:
+    patients: int
+    appointments: int
+    medical_records: int
+    doctors: int
+    staff: int
+    services: int = 60
+    medications: int = 400
+
+
+SCALES: Dict[str, Scale] = {
+    "small": Scale(patients=2_000, appointments=20_000, medical_records=10_000, doctors=10, staff=5),
+    "medium": Scale(patients=20_000, appointments=200_000, medical_records=100_000, doctors=40, staff=15),
+    "large": Scale(patients=200_000, appointments=2_000_000, medical_records=1_000_000, doctors=120, staff=40),
+}
+
+
+def _uuid(rng: random.Random) -> uuid.UUID:
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def _name(rng: random.Random) -> str:
+    return f"{rng.choice(LAST_NAMES)} {rng.choice(MIDDLE_NAMES)} {rng.choice(FIRST_NAMES)}"
+
+
+def _batches(rows: Iterator[dict], size: int = BATCH_SIZE) -> Iterator[List[dict]]:
+    batch: List[dict] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class DatasetGenerator:
+    """
+    Sinh và insert dữ liệu. Thứ tự gọi rng cố định nên dữ liệu chỉ phụ thuộc (seed, scale).
+    Sau khi seed, các id cần cho kịch bản benchmark được giữ lại trong thuộc tính của generator.
+    """
+
+    def __init__(self, engine: Engine, scale: Scale, seed: int = 42):
+        self.engine = engine
+        self.scale = scale
+        self.rng = random.Random(seed)
+        self.password_hash = UserService.get_password_hash(BENCH_PASSWORD)
+        self.admin_id = None
+        self.staff_ids: List[uuid.UUID] = []
+        self.doctor_ids: List[uuid.UUID] = []
+        self.patient_ids: List[uuid.UUID] = []
+        self.services: List[dict] = []
+        self.medications: List[dict] = []
+        self.dispensed: Dict[uuid.UUID, int] = {}
+
+    def _insert(self, conn, table, rows: Iterator[dict]) -> int:
+        count = 0
+        for batch in _batches(rows):
+            conn.execute(insert(table), batch)
+            count += len(batch)
+        return count
+
+    def seed(self) -> Dict[str, int]:
+        """Tạo bảng (nếu chưa có) và insert toàn bộ dữ liệu, trả về số dòng theo bảng"""
+        Base.metadata.create_all(self.engine)
+        counts: Dict[str, int] = {}
+        with self.engine.begin() as conn:
+            counts["users"] = self._insert(conn, User.__table__, self._users())
+            counts["doctors"] = self._insert(conn, Doctor.__table__, self._doctors())
+            counts["services"] = self._insert(conn, Service.__table__, self._services())
+            counts["medications"] = self._insert(conn, Medication.__table__, self._medications())
+            opening_movements = self._insert(conn, StockMovement.__table__, self._opening_stock())
+            counts["patients"] = self._insert(conn, Patient.__table__, self._patients())
+            # Lịch hẹn, hồ sơ, đơn thuốc, chỉ định, hóa đơn sinh cùng lúc theo từng lịch hẹn
+            tables = {
+                "appointments": Appointment.__table__,
+                "medical_records": MedicalRecord.__table__,
+                "prescriptions": Prescription.__table__,
+                "prescription_details": PrescriptionDetail.__table__,
+                "service_indications": ServiceIndication.__table__,
+                "service_indication_details": ServiceIndicationDetail.__table__,
+                "invoices": Invoice.__table__,
+                "stock_movements": StockMovement.__table__,
+            }
+            pending: Dict[str, List[dict]] = {name: [] for name in tables}
+            counts.update({name: 0 for name in tables})
+            for name, row in self._visits():
+                pending[name].append(row)
+                if len(pending[name]) >= BATCH_SIZE:
+                    self._flush(conn, tables, pending, counts)
+            self._flush(conn, tables, pending, counts)
+            counts["stock_movements"] += opening_movements
+            # Tồn kho = nhập ban đầu - đã xuất theo hóa đơn (khớp ledger)
+            conn.execute(
+                update(Medication.__table__)
+                .where(Medication.__table__.c.id == bindparam("b_id"))
+                .values(stock_quantity=INITIAL_STOCK - bindparam("b_dispensed")),
+                [{"b_id": medication_id, "b_dispensed": quantity} for medication_id, quantity in self.dispensed.items()],
+            )
+        return counts
+
+    @staticmethod
+    def _flush(conn, tables, pending, counts) -> None:
+        # Insert theo thứ tự khóa ngoại: bảng cha trước bảng con
+        for name, table in tables.items():
+            if pending[name]:
+                conn.execute(insert(table), pending[name])
+                counts[name] += len(pending[name])
+                pending[name] = []
+
+    def _users(self) -> Iterator[dict]:
+        rng = self.rng
+        roles = ["ADMIN"] + ["STAFF"] * self.scale.staff + ["DOCTOR"] * self.scale.doctors
+        for i, role in enumerate(roles):
+            user_id = _uuid(rng)
+            if role == "ADMIN":
+                self.admin_id = user_id
+            elif role == "STAFF":
+                self.staff_ids.append(user_id)
+            else:
+                self.doctor_ids.append(user_id)
+            yield {
+                "id": user_id, "username": f"{role.lower()}{i}", "password": self.password_hash,
+                "full_name": _name(rng), "dob": date(1970 + rng.randint(0, 30), rng.randint(1, 12), rng.randint(1, 28)),
+                "gender": rng.choice(["MALE", "FEMALE"]), "phone_number": f"08{i:08d}",
+                "email": f"{role.lower()}{i}@clinic.vn", "role": role, "is_active": True,
+            }
+
+    def _doctors(self) -> Iterator[dict]:
+        for user_id in self.doctor_ids:
+            yield {"id": _uuid(self.rng), "user_id": user_id, "specialization": "Da liễu"}
+
+    def _services(self) -> Iterator[dict]:
+        for i in range(self.scale.services):
+            row = {"id": _uuid(self.rng), "name": f"Dịch vụ {i}", "price": float(self.rng.randint(1, 50) * 10_000),
+                   "description": "Dịch vụ điều trị da"}
+            self.services.append(row)
+            yield row
+
+    def _medications(self) -> Iterator[dict]:
+        for i in range(self.scale.medications):
+            row = {"id": _uuid(self.rng), "name": f"Thuốc {i}", "dosage_form": self.rng.choice(DOSAGE_FORMS),
+                   "price": float(self.rng.randint(1, 40) * 5_000), "stock_quantity": INITIAL_STOCK,
+                   "description": "Thuốc da liễu"}
+            self.medications.append(row)
+            yield row
+
+    def _opening_stock(self) -> Iterator[dict]:
+        for medication in self.medications:
+            yield {"medication_id": medication["id"], "movement_type": "RECEIPT", "quantity": INITIAL_STOCK,
+                   "note": "Tồn kho ban đầu", "created_at": datetime.combine(REFERENCE_DATE - timedelta(days=DAYS),
+                                                                             time(7), tzinfo=timezone.utc)}
+
+    def _patients(self) -> Iterator[dict]:
+        rng = self.rng
+        for i in range(self.scale.patients):
+            patient_id = _uuid(rng)
+            self.patient_ids.append(patient_id)
+            yield {
+                "id": patient_id, "full_name": _name(rng),
+                "dob": date(1950 + rng.randint(0, 60), rng.randint(1, 12), rng.randint(1, 28)),
+                "gender": rng.choice(["MALE", "FEMALE"]), "phone_number": f"09{i:08d}",
+                "email": f"patient{i}@example.com", "address": f"{rng.randint(1, 500)} Lê Lợi, Quận {rng.randint(1, 12)}",
+                "medical_history": rng.choice(DIAGNOSES), "allergies": rng.choice(["Không", "Penicillin", "Hải sản"]),
+                "current_medications": None, "current_condition": rng.choice(SYMPTOMS), "notes": None,
+            }
+
+    def _visits(self) -> Iterator[tuple]:
+        """
+        Sinh lịch hẹn theo thứ tự ngày. Lịch hẹn đã qua được gắn hồ sơ khám cho tới khi đủ số hồ sơ,
+        trải đều trên toàn khoảng thời gian (không dồn vào đầu).
+        """
+        rng = self.rng
+        scale = self.scale
+        start = REFERENCE_DATE - timedelta(days=DAYS - 1)
+        per_day = scale.appointments / DAYS
+        # Tỉ lệ lịch hẹn có hồ sơ khám (lịch hẹn 14 ngày cuối coi như còn ở tương lai)
+        past_appointments = scale.appointments * (DAYS - 14) / DAYS
+        record_ratio = min(1.0, scale.medical_records / past_appointments)
+        records = 0
+        booked = set()  # (bác sĩ, giờ) đã có lịch hẹn còn hiệu lực trong ngày đang sinh (unique index chống trùng lịch)
+        booked_day = None
+        for n in range(scale.appointments):
+            day = start + timedelta(days=int(n / per_day))
+            if day != booked_day:
+                booked, booked_day = set(), day
+            appointment_id = _uuid(rng)
+            patient_id = rng.choice(self.patient_ids)
+            doctor_id = rng.choice(self.doctor_ids)
+            staff_id = rng.choice(self.staff_ids)
+            slot = rng.randint(0, 19)
+            is_past = day <= REFERENCE_DATE - timedelta(days=14)
+            has_record = is_past and records < scale.medical_records and rng.random() < record_ratio
+            if is_past:
+                status = "COMPLETED" if has_record else rng.choice(["COMPLETED", "CANCELLED"])
+            else:
+                status = rng.choice(["SCHEDULED", "SCHEDULED", "SCHEDULED", "WAITING"])
+            if status != "CANCELLED":
+                # Khung giờ đã có người: lấy khung giờ trống kế tiếp của bác sĩ, hết khung giờ thì coi như lịch đã hủy
+                free = next(((slot + k) % 20 for k in range(20) if (doctor_id, (slot + k) % 20) not in booked), None)
+                if free is None:
+                    status, has_record = "CANCELLED", False
+                else:
+                    slot = free
+                    booked.add((doctor_id, slot))
+            appointment_time = time(8 + slot // 2, 30 * (slot % 2))
+            created_at = datetime.combine(day, appointment_time, tzinfo=timezone.utc)
+            yield "appointments", {
+                "id": appointment_id, "patient_id": patient_id, "doctor_id": doctor_id, "created_by": staff_id,
+                "appointment_date": day, "appointment_time": appointment_time,
+                "time_slot": rng.choice(TIME_SLOTS), "status": status, "notes": None,
+                "created_at": created_at - timedelta(days=rng.randint(1, 20)),
+            }
+            if not has_record:
+                continue
+            records += 1
+            yield from self._record(appointment_id, patient_id, doctor_id, staff_id, created_at)
+
+    def _record(self, appointment_id, patient_id, doctor_id, staff_id, created_at) -> Iterator[tuple]:
+        """Hồ sơ khám + đơn thuốc + chỉ định dịch vụ (+ hóa đơn nếu đã thanh toán)"""
+        rng = self.rng
+        record_id = _uuid(rng)
+        paid = rng.random() < 0.9
+        yield "medical_records", {
+            "id": record_id, "patient_id": patient_id, "doctor_id": doctor_id, "appointment_id": appointment_id,
+            "symptoms": rng.choice(SYMPTOMS), "diagnosis": rng.choice(DIAGNOSES),
+            "status": "PAID" if paid else "COMPLETED", "notes": None, "created_at": created_at,
+        }
+
+        prescription_id = _uuid(rng)
+        yield "prescriptions", {"id": prescription_id, "medical_record_id": record_id,
+                                "notes": "Tái khám sau 2 tuần", "created_at": created_at}
+        medication_subtotal = 0.0
+        prescribed = []
+        for medication in rng.sample(self.medications, rng.randint(1, 4)):
+            quantity = rng.randint(1, 5)
+            prescribed.append((medication["id"], quantity))
+            total = medication["price"] * quantity
+            medication_subtotal += total
+            yield "prescription_details", {
+                "id": _uuid(rng), "prescription_id": prescription_id, "medication_id": medication["id"],
+                "name": medication["name"], "dosage_form": medication["dosage_form"], "quantity": quantity,
+                "dosage": "1 lần x 2 lần/ngày", "unit_price": medication["price"], "total_price": total,
+            }
+
+        indication_id = _uuid(rng)
+        yield "service_indications", {"id": indication_id, "medical_record_id": record_id,
+                                      "notes": None, "created_at": created_at}
+        service_subtotal = 0.0
+        for service in rng.sample(self.services, rng.randint(1, 3)):
+            service_subtotal += service["price"]
+            yield "service_indication_details", {
+                "id": _uuid(rng), "service_indication_id": indication_id, "service_id": service["id"],
+                "name": service["name"], "quantity": 1, "unit_price": service["price"],
+                "total_price": service["price"],
+            }
+
+        if paid:
+            total = service_subtotal + medication_subtotal
+            invoice_id = _uuid(rng)
+            paid_at = created_at + timedelta(minutes=30)
+            yield "invoices", {
+                "id": invoice_id, "medical_record_id": record_id, "patient_id": patient_id,
+                "doctor_id": doctor_id, "created_by": staff_id, "service_subtotal": service_subtotal,
+                "medication_subtotal": medication_subtotal, "total_amount": total, "discount_amount": 0.0,
+                "final_amount": total, "notes": None, "created_at": paid_at,
+            }
+            for medication_id, quantity in prescribed:
+                self.dispensed[medication_id] = self.dispensed.get(medication_id, 0) + quantity
+                yield "stock_movements", {
+                    "medication_id": medication_id, "movement_type": "DISPENSE", "quantity": -quantity,
+                    "reference_id": invoice_id, "note": None, "created_by": staff_id, "created_at": paid_at,
+                }
+
+
+def is_seeded(engine: Engine) -> bool:
+    """Database đã có dữ liệu benchmark chưa"""
+    Base.metadata.create_all(engine)
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(Patient.__table__)).scalar() > 0
+
+
+def create_bench_engine(database_url: str) -> Engine:
+    """Engine cho benchmark: SQLite (kể cả in-memory) dùng cấu hình test engine của app"""
+    if database_url.startswith("sqlite"):
+        return create_test_engine(database_url)
+    return create_engine(database_url)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True, help="Database trống dùng riêng cho benchmark")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    engine = create_bench_engine(args.database_url)
+    if is_seeded(engine):
+        parser.error("Database đã có dữ liệu, hãy dùng database trống")
+    with Timer() as t:
+        counts = DatasetGenerator(engine, SCALES[args.scale], args.seed).seed()
+    for name, count in counts.items():
+        print(f"{name:<28}{count:>12}")
+    print(f"Seed xong trong {t.elapsed_ms / 1000:.1f}s")
+
+
+if __name__ == "__main__":
+    main()